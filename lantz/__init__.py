@@ -10,23 +10,28 @@
     :license: BSD, see LICENSE for more details.
 """
 
-import pkg_resources
-
-try:
-    __version__ = pkg_resources.get_distribution('lantz').version
-except:
-    __version__ = "unknown"
-
-from pint import UnitRegistry
-ureg = UnitRegistry()
-Q_ = ureg.Quantity
+from .units import ureg, Q_
 
 from .log import LOGGER
-from .driver import Driver, Feat, DictFeat, Action, initialize_many, finalize_many
+from .driver import (Driver, Feat, DictFeat, Action, initialize_many, finalize_many,
+                     ainitialize_many, afinalize_many, refresh_many)
 
 __all__ = ['Driver', 'Action', 'Feat', 'DictFeat', 'Q_']
 
 
+def __getattr__(name):
+    # The version is looked up on first use as it is slow.
+    if name == '__version__':
+        global __version__
+        try:
+            from importlib.metadata import version
+            __version__ = version('lantz')
+        except Exception:
+            __version__ = "unknown"
+        return __version__
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
 def _run_pyroma(data):   # pragma: no cover
     """Run pyroma (used to perform checks before releasing a new version).
     """
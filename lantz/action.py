@@ -21,6 +21,7 @@ from .processors import (Processor, FromQuantityProcessor,
                          MapProcessor, RangeProcessor)
 
 from .feat import MISSING
+from . import trace
 
 
 def _dget(adict, instance=MISSING):
@@ -101,7 +102,8 @@ class Action(object):
 
         # This part calls to the underlying function wrapping
         # and timing, logging and error handling
-        with instance._lock:
+        summary = (args, kwargs) if args or kwargs else None
+        with trace.span(instance, 'call', name, summary), instance._lock:
             if args or kwargs:
                 instance.log_info('Calling {} with ({}, {}))', name, args, kwargs)
             else:
@@ -117,6 +119,7 @@ class Action(object):
                     t_values = self.pre_action(values, instance)
             except Exception as e:
                 instance.log_error('While pre-processing ({}, {}) for {}: {}', args, kwargs, name, e)
+                instance.counters['error_' + name] += 1
                 raise e
 
             if args or kwargs:
@@ -131,6 +134,7 @@ class Action(object):
                 return out
             except Exception as e:
                 instance.log_error('While calling {} with {}. {}', name, t_values, e)
+                instance.counters['error_' + name] += 1
                 raise e
 
     def pre_action(self, value, instance=None):
@@ -8,22 +8,66 @@
     :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
     :license: BSD, see LICENSE for more details.
 """
+import sys
 import copy
+import time
+import queue
 import atexit
+import asyncio
 import logging
+import weakref
 import threading
-from functools import wraps
+from functools import wraps, partial
 from concurrent import futures
-from collections import defaultdict
+from collections import defaultdict, Counter
 
-from .utils.qt import MetaQObject, SuperQObject, QtCore
-from .feat import Feat, DictFeat, MISSING, FeatProxy
+from .utils.headless import use_headless
+
+#: True if drivers are plain Python objects with pure Python signals
+#: (see lantz.utils.headless), False if they are QObjects.
+HEADLESS = use_headless()
+
+if HEADLESS:
+    from .utils.headless import MetaQObject, SuperQObject, Signal
+else:
+    from .utils.qt import MetaQObject, SuperQObject, QtCore
+    Signal = QtCore.Signal
+
+from .feat import Feat, DictFeat, MISSING, FeatProxy, _equal
 from .action import Action, ActionProxy
 from .stats import RunningStats
+from .executor import Strand, in_task
+from . import metrics
 from .log import get_logger
+from . import units as lantz_units
 
 logger = get_logger('lantz.driver', False)
 
+def _identity(value):
+    return value
+
+
+def _to_serializable(value):
+    """Convert a feat value to plain python types (e.g. for JSON).
+    Quantities are converted to a dict with magnitude and units.
+    """
+    if isinstance(value, lantz_units.Q_):
+        return {'magnitude': _to_serializable(value.magnitude),
+                'units': str(value.units)}
+    if hasattr(value, 'tolist'):
+        # numpy arrays and scalars
+        return value.tolist()
+    return value
+
+
+def _from_serializable(value):
+    """Inverse of _to_serializable.
+    """
+    if isinstance(value, dict) and set(value.keys()) == {'magnitude', 'units'}:
+        return lantz_units.Q_(value['magnitude'], value['units'])
+    return value
+
+
 def _merge_dicts(*args):
     """ _merge_dicts(dict1, [dict2 [...]]) -> dict1.update(dict2);dict1.update ...
 
@@ -126,7 +170,7 @@ class _DriverType(MetaQObject):
     def __new__(cls, classname, bases, class_dict):
 
 
-        # Qt Signals need to be added to the class before it is created.
+        # Signals need to be added to the class before it is created.
         # We loop through all members of the class and add a changed event
         # for each Feat/DictFeat.
 
@@ -141,10 +185,10 @@ class _DriverType(MetaQObject):
             for feat_name, feat in d.items():
                 if isinstance(feat, DictFeat):
                     # The signature is new value, old value, dictionary of other stuff such as keys
-                    signals[feat_name + '_changed'] = QtCore.Signal(object, object, dict)
+                    signals[feat_name + '_changed'] = Signal(object, object, dict)
                 else:
                     # The signature is new value, old value
-                    signals[feat_name + '_changed'] = QtCore.Signal(object, object)
+                    signals[feat_name + '_changed'] = Signal(object, object)
 
         class_dict.update(signals)
 
@@ -161,6 +205,9 @@ class _DriverType(MetaQObject):
         for d in [class_dict] + [b.__dict__ for b in bases
                                  if not hasattr(b, '_lantz_features')]:
             for key, value in d.items():
+                if key in feats or key in actions:
+                    # Already defined in the class (or a previous base).
+                    continue
                 if isinstance(value, (Feat, DictFeat)):
                     value.name = key
                     feats[key] = value
@@ -187,8 +234,21 @@ class _DriverType(MetaQObject):
                 if isinstance(value, Action) and key not in actions:
                     actions[key] = value
 
+        # Feats whose modifiers depend on the value of other feats (see Self)
+        # must be set after them.
+
+        dependencies = {}
+        for base in bases:
+            dependencies.update(getattr(base, '_lantz_dependencies', {}))
+        for key, feat in feats.items():
+            depends_on = tuple(value.item for value in feat.modifiers[MISSING][MISSING].values()
+                               if isinstance(value, Self))
+            if depends_on:
+                dependencies[key] = depends_on
+
         self._lantz_features = feats
         self._lantz_actions = actions
+        self._lantz_dependencies = dependencies
 
 
 _REGISTERED = defaultdict(int)
@@ -205,15 +265,190 @@ def _raise_must_change(dependent, feat_name, operation):
     return _inner
 
 
+def _holder_member(frame):
+    """Return the name of the driver member that is acquiring the lock,
+    taken from the `name` local of the calling frame (Feat.get, Feat.set,
+    Action.call) or, if not available, from the name of the function.
+    """
+    name = frame.f_locals.get('name')
+    if isinstance(name, str):
+        return name
+    return frame.f_code.co_name
+
+
+class InstrumentedLock(object):
+    """Reentrant lock that records in the driver statistics the time spent
+    waiting for it (`lock_wait_<member>`) and holding it (`lock_hold_<member>`)
+    and flags holds longer than a threshold (see Driver.instrument_lock).
+
+    Only the outermost acquisition of each thread is measured.
+
+    :param driver: driver instance.
+    :param threshold: holds longer than this (in seconds) are logged as warnings
+                      and counted in `driver.counters['lock_long_hold_<member>']`.
+                      None to disable.
+    :param lock: underlying reentrant lock. Default None, a new one.
+    """
+
+    def __init__(self, driver, threshold=.1, lock=None):
+        self._driver = weakref.ref(driver)
+        self.threshold = threshold
+        self.lock = threading.RLock() if lock is None else lock
+        self._depth = 0
+        self._holder = None
+        self._acquired = 0.
+
+    @property
+    def holder(self):
+        """(thread name, member) currently holding the lock or None.
+        """
+        return self._holder
+
+    def acquire(self, blocking=True, timeout=-1, member=None):
+        tic = time.perf_counter()
+        if not self.lock.acquire(blocking, timeout):
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            self._acquired = time.perf_counter()
+            if member is None:
+                member = _holder_member(sys._getframe(1))
+            self._holder = (threading.current_thread().name, member)
+            driver = self._driver()
+            if driver is not None:
+                driver.timing.add('lock_wait_' + member, self._acquired - tic)
+        return True
+
+    def release(self):
+        if self._depth == 1:
+            held = time.perf_counter() - self._acquired
+            thread, member = self._holder
+            self._holder = None
+            driver = self._driver()
+            if driver is not None:
+                driver.timing.add('lock_hold_' + member, held)
+                if self.threshold is not None and held > self.threshold:
+                    driver.counters['lock_long_hold_' + member] += 1
+                    driver.log_warning('{} held the lock for {:.3f} s in {} (threshold {} s)',
+                                       member, held, thread, self.threshold)
+        self._depth -= 1
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire(member=_holder_member(sys._getframe(1)))
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class Batch(object):
+    """Collects the values set on a driver from the current thread to write
+    them all at once on exit (see Driver.batch).
+
+    Before anything is written, every value is pre-processed so that an
+    invalid value aborts the whole batch. The pre-processed values are
+    then given to `Driver.set_batch` and only if it succeeds the cache
+    is updated and the `<feat>_changed` signals emitted.
+
+    :param driver: driver instance.
+    :param force: apply all changes even when the cache says it is not necessary.
+    """
+
+    def __init__(self, driver, force=False):
+        self.driver = driver
+        self.force = force
+        self.thread = threading.get_ident()
+        #: (feat, key): (value, force) in the order in which they were first set.
+        self.pending = {}
+        self._depth = 0
+
+    def add(self, feat, key, value, force=False):
+        """Add a value to be set. A later value for the same feat and key
+        replaces the previous one.
+        """
+        self.pending[(feat, key)] = (value, force or self.force)
+
+    def __enter__(self):
+        if self._depth == 0:
+            self.driver._batches[self.thread] = self
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth:
+            return
+        del self.driver._batches[self.thread]
+        if exc_type is None:
+            self.commit()
+        else:
+            self.pending.clear()
+
+    def commit(self):
+        """Pre-process and write all pending values.
+        """
+        driver = self.driver
+        with driver._lock:
+            pending, self.pending = self.pending, {}
+            items = []
+            for (feat, key), (value, force) in pending.items():
+                name = feat.name if key is MISSING else '{}[{!r}]'.format(feat.name, key)
+                current_value = feat.get_cache(driver, key)
+                if feat._unchanged(driver, name, value, current_value, force, key):
+                    continue
+
+                driver.log_info('Setting {} = {} (current={}, force={})', name, value, current_value, force)
+
+                try:
+                    t_value = feat.pre_set(value, driver, key)
+                except Exception as e:
+                    driver.log_error('While pre-processing {} for {}: {}', value, name, e)
+                    driver.counters['error_set_' + name] += 1
+                    raise e
+
+                items.append((feat, key, name, value, t_value))
+
+            if not items:
+                return
+
+            names = [name for _, _, name, _, _ in items]
+            driver.log_debug('(raw) Setting {}', ', '.join('{} = {}'.format(name, t_value)
+                                                           for _, _, name, _, t_value in items))
+
+            try:
+                tic = time.time()
+                driver.set_batch([(feat, key, t_value) for feat, key, _, _, t_value in items])
+            except Exception as e:
+                driver.log_error('While setting {}. {}', names, e)
+                for name in names:
+                    driver.counters['error_set_' + name] += 1
+                raise e
+
+            elapsed = (time.time() - tic) / len(items)
+
+            for feat, key, name, value, _ in items:
+                driver.timing.add('set_' + name, elapsed)
+                driver.log_info('{} was set to {}', name, value, lantz_feat=(name, str(value)))
+                if feat._throttled:
+                    feat._last_set.setdefault(driver, {})[key] = time.monotonic()
+                    feat._deferred.get(driver, {}).pop(key, None)
+                feat.set_cache(driver, value, key)
+
+
 class Driver(SuperQObject, metaclass=_DriverType):
     """Base class for all drivers.
 
     :params name: easy to remember identifier given to the instance for logging
                   purposes
+    :params executor: executor in which the asynchronous tasks of this driver
+                      run (e.g. `update_async`). None (default) means the
+                      process wide one (see lantz.executor).
     """
 
     _lantz_features = {}
     _lantz_actions = {}
+    _lantz_dependencies = {}
 
     __name = ''
 
@@ -221,10 +456,14 @@ class Driver(SuperQObject, metaclass=_DriverType):
         inst = SuperQObject.__new__(cls)
         name = kwargs.pop('name', None)
 
-        inst._executor = None
+        inst._executor = kwargs.pop('executor', None)
+        inst._strand = None
         inst._lock = threading.RLock()
+        inst._batches = {}
         inst.__unfinished_tasks = 0
         inst.timing = RunningStats()
+        inst.counters = Counter()
+        metrics.register(inst)
 
         if hasattr(inst, 'name') and inst.name:
             pass
@@ -246,6 +485,7 @@ class Driver(SuperQObject, metaclass=_DriverType):
                 if attr_value.default is MISSING:
                     feat.get_processors[MISSING][MISSING] = (_raise_must_change(attr_value.item, feat_name, 'get'), )
                     feat.set_processors[MISSING][MISSING] = (_raise_must_change(attr_value.item, feat_name, 'set'), )
+                    feat._clear_pipelines()
                 else:
                     feat.modifiers[MISSING][MISSING][attr_name] = attr_value.default
                     feat.rebuild(build_doc=False, store=True)
@@ -261,17 +501,33 @@ class Driver(SuperQObject, metaclass=_DriverType):
     def name(self, value):
         self.__name = value
 
+    @property
+    def executor(self):
+        """Executor in which the asynchronous tasks of this driver run
+        (None means the process wide one).
+        """
+        return self._executor
+
+    @executor.setter
+    def executor(self, value):
+        # Pending tasks are moved to the new executor, keeping their order.
+        self._executor = value
+        if self._strand is not None:
+            self._strand.executor = value
+
     def __submit_by_name(self, fname, *args, **kwargs):
         return self._submit(getattr(self, fname), *args, **kwargs)
 
     def _first_submit(self, fn, *args, **kwargs):
-        self._executor = futures.ThreadPoolExecutor(max_workers=1)
+        # Tasks run one at a time, in order, in the executor given
+        # to this driver or (if None) in the process wide one.
+        self._strand = Strand(self._executor)
         self._submit = self._notfirst_submit
         return self._notfirst_submit(fn, *args, **kwargs)
 
     def _notfirst_submit(self, fn, *args, **kwargs):
         self.__unfinished_tasks += 1
-        fut = self._executor.submit(fn, *args, **kwargs)
+        fut = self._strand.submit(fn, *args, **kwargs)
         fut.add_done_callback(self._decrease_unfinished_tasks)
         return fut
 
@@ -354,6 +610,62 @@ class Driver(SuperQObject, metaclass=_DriverType):
     def __exit__(self, *args):
         self.finalize()
 
+    async def __aenter__(self):
+        await self.acall('initialize')
+        return self
+
+    async def __aexit__(self, *args):
+        await self.acall('finalize')
+
+    def _await(self, fn, *args, loop=None, **kwargs):
+        """Submit a task to this driver and return an asyncio future
+        bound to the given (or running) loop.
+
+        Cancelling the asyncio future cancels the task if it has not started.
+        """
+        return asyncio.wrap_future(self._submit(fn, *args, **kwargs),
+                                   loop=loop or asyncio.get_event_loop())
+
+    def _get_feat(self, feat_name, key=MISSING):
+        feat = self._lantz_features[feat_name]
+        if isinstance(feat, DictFeat):
+            return feat.getitem(self, key)
+        return feat.get(self)
+
+    def _set_feat(self, feat_name, value, key=MISSING, force=False):
+        feat = self._lantz_features[feat_name]
+        if isinstance(feat, DictFeat):
+            return feat.setitem(self, key, value, force)
+        return feat.set(self, value, force)
+
+    async def aget(self, feat_name, key=MISSING, *, loop=None):
+        """Get the value of a feat (asyncio coroutine).
+
+        :param feat_name: name of the feat.
+        :param key: key (only for DictFeat).
+        :param loop: asyncio event loop. Default None, the running loop.
+        """
+        return await self._await(self._get_feat, feat_name, key, loop=loop)
+
+    async def aset(self, feat_name, value, key=MISSING, *, force=False, loop=None):
+        """Set the value of a feat (asyncio coroutine).
+
+        :param feat_name: name of the feat.
+        :param value: new value.
+        :param key: key (only for DictFeat).
+        :param force: apply change even when the cache says it is not necessary.
+        :param loop: asyncio event loop. Default None, the running loop.
+        """
+        await self._await(self._set_feat, feat_name, value, key, force, loop=loop)
+
+    async def acall(self, action_name, *args, loop=None, **kwargs):
+        """Call an action (asyncio coroutine).
+
+        :param action_name: name of the action.
+        :param loop: asyncio event loop. Default None, the running loop.
+        """
+        return await self._await(getattr(self, action_name), *args, loop=loop, **kwargs)
+
     @Action()
     def initialize(self):
         pass
@@ -365,6 +677,9 @@ class Driver(SuperQObject, metaclass=_DriverType):
     def update(self, newstate=None, *, force=False, **kwargs):
         """Update driver.
 
+        Feats are written in batches (see `batch`), each one after the feats
+        on which its modifiers depend (see Self).
+
         :param newstate: a dictionary containing the new driver state.
         :type newstate: dict.
         :param force: apply change even when the cache says it is not necessary.
@@ -377,8 +692,91 @@ class Driver(SuperQObject, metaclass=_DriverType):
         if not newstate:
             raise ValueError("update() called with an empty dictionary")
 
-        for key, value in newstate.items():
-            self._lantz_features[key].set(self, value, force)
+        # As in restore, feats are written in batches, each one
+        # after the feats on which its modifiers depend.
+        with self._lock:
+            for names in self._restore_order(newstate.keys()):
+                with self.batch(force):
+                    for key in names:
+                        feat = self._lantz_features[key]
+                        if isinstance(feat, DictFeat):
+                            feat.set_many(self, newstate[key], force)
+                        else:
+                            feat.set(self, newstate[key], force)
+
+    def batch(self, force=False):
+        """Return a context manager that collects the values set on this
+        driver from the current thread and writes them together on exit::
+
+            >>> with inst.batch():
+            ...     inst.frequency = 1 * kHz
+            ...     inst.amplitude = 2 * V
+
+        All values are pre-processed before anything is written, so a
+        value that fails validation aborts the whole batch. The values are
+        then written by `set_batch` (which drivers can override to send them
+        in a single message) and the cache is updated and the signals
+        emitted only after it succeeds. Nothing is written if an exception
+        is raised inside the block.
+
+        Within the block, reading a feat returns the instrument (or cached)
+        value and not the pending one. Nested batches are merged into the
+        outermost one.
+
+        :param force: apply all changes even when the cache says it is not necessary.
+        :type force: boolean.
+        """
+        return self._batches.get(threading.get_ident()) or Batch(self, force)
+
+    def instrument_lock(self, enabled=True, threshold=.1):
+        """Replace the driver lock by an InstrumentedLock (or restore the
+        plain lock) to measure the contention between threads.
+
+        The time spent waiting for and holding the lock is recorded in
+        `timing` as `lock_wait_<member>` and `lock_hold_<member>` and holds
+        longer than threshold are logged as warnings.
+
+        It can be called while the lock is held.
+
+        :param enabled: if False, restore the plain lock.
+        :param threshold: holds longer than this (in seconds) are flagged.
+        :return: the lock in use.
+        """
+        if isinstance(self._lock, InstrumentedLock):
+            if enabled:
+                self._lock.threshold = threshold
+            else:
+                self._lock = self._lock.lock
+        elif enabled:
+            self._lock = InstrumentedLock(self, threshold, self._lock)
+        return self._lock
+
+    def set_batch(self, items):
+        """Write several pre-processed values to the instrument.
+
+        Called when a batch is committed. Drivers can override it to
+        write all the values in a single operation. The default
+        implementation calls the setter of each feat in order, using
+        `fset_many` for DictFeats that provide it.
+
+        :param items: (feat, key, raw value) tuples, key is MISSING for Feats.
+        :type items: list
+        """
+        many = defaultdict(dict)
+        for feat, key, value in items:
+            if key is not MISSING and getattr(feat, 'fset_many', None) is not None:
+                many[feat][key] = value
+
+        for feat, key, value in items:
+            if feat in many:
+                values = many[feat]
+                if values:
+                    feat.fset_many(self, values)
+                    many[feat] = None
+            elif key is MISSING:
+                feat.fset(self, value)
+            else:
+                feat.fset(self, key, value)
 
     def update_async(self, newstate=None, *, force=False, callback=None, **kwargs):
         """Asynchronous update driver.
@@ -403,7 +801,7 @@ class Driver(SuperQObject, metaclass=_DriverType):
             fut.add_done_callback(callback)
         return fut
 
-    def refresh(self, keys=None):
+    def refresh(self, keys=None, *, max_age=None, callback=None):
         """Refresh cache by reading values from the instrument.
 
         :param keys: a string or list of strings with the properties to refresh.
@@ -412,19 +810,81 @@ class Driver(SuperQObject, metaclass=_DriverType):
                      If keys is a list/tuple, returns a tuple.
                      If keys is a dict, returns a dict.
         :type keys: str or list or tuple or dict
+        :param max_age: cached values younger than this (in seconds) are
+                        returned without reading from the instrument.
+                        Default None, meaning each feat `max_age` modifier.
+        :type max_age: float
+        :param callback: called with the name and the value of each feat
+                         as soon as it is read.
+        :type callback: callable
+
+        When refreshing all properties, write-only feats are skipped,
+        read_once feats already read are taken from the cache and DictFeats
+        with declared keys are read with a single `get_many` call
+        (returning a dict).
         """
+        if max_age is None:
+            _get = lambda key: getattr(self, key)
+        else:
+            def _get(key):
+                feat = self._lantz_features[key]
+                if isinstance(feat, DictFeat):
+                    return getattr(self, key)
+                return feat.get(self, max_age=max_age)
+
+        if callback is not None:
+            _plain_get = _get
+
+            def _get(key):
+                value = _plain_get(key)
+                callback(key, value)
+                return value
+
         if keys:
             if isinstance(keys, (list, tuple)):
-                return tuple(getattr(self, key) for key in keys)
+                return tuple(_get(key) for key in keys)
             elif isinstance(keys, dict):
-                return {key: getattr(self, key) for key in keys.keys()}
+                return {key: _get(key) for key in keys.keys()}
             elif isinstance(keys, str):
-                return getattr(self, keys)
+                return _get(keys)
             else:
                 raise ValueError('keys must be a (str, list, tuple or dict)')
-        return {key: getattr(self, key) for key in self._lantz_features}
 
-    def refresh_async(self, keys=None, *, callback=None):
+        out = {}
+        with self._lock:
+            for name, getter in self._refresh_plan(max_age):
+                out[name] = value = getter()
+                if callback is not None:
+                    callback(name, value)
+        return out
+
+    def _refresh_plan(self, max_age=None):
+        """Return a list of (feat name, callable) to read all feats
+        with the minimum number of instrument calls.
+        """
+        if max_age is None:
+            max_age = MISSING
+
+        plan = []
+        for name, feat in self._lantz_features.items():
+            if feat.fget is None or feat.fget is MISSING:
+                continue
+            if isinstance(feat, DictFeat):
+                keys = self.feats[name].keys
+                if keys:
+                    plan.append((name, partial(feat.get_many, self, list(keys), max_age)))
+                else:
+                    plan.append((name, partial(getattr, self, name)))
+                continue
+            if feat.read_once:
+                cached = feat.get_cache(self)
+                if cached is not MISSING:
+                    plan.append((name, partial(_identity, cached)))
+                    continue
+            plan.append((name, partial(feat.get, self, max_age=max_age)))
+        return plan
+
+    def refresh_async(self, keys=None, *, max_age=None, callback=None, on_value=None):
         """Asynchronous refresh cache by reading values from the instrument.
 
         :param keys: a string or list of strings with the properties to refresh
@@ -432,17 +892,25 @@ class Driver(SuperQObject, metaclass=_DriverType):
                      If keys is a string, returns the value.
                      If keys is a list, returns a dictionary.
         :type keys: str or list or tuple or dict
+        :param max_age: cached values younger than this (in seconds) are
+                        returned without reading from the instrument.
+        :type max_age: float
+        :param callback: Called when the refresh finishes.
+        :type callback: callable.
+        :param on_value: called with the name and the value of each feat
+                         as soon as it is read.
+        :type on_value: callable.
 
         :return type: concurrent.future.
 
 
         """
-        fut = self._submit(self.refresh, keys=keys)
+        fut = self._submit(self.refresh, keys=keys, max_age=max_age, callback=on_value)
         if not callback is None:
             fut.add_done_callback(callback)
         return fut
 
-    def recall(self, keys=None):
+    def recall(self, keys=None, *, max_age=None):
         """Return the last value seen for a feat or a collection of feats.
 
         :param keys: a string or list of strings with the properties to refresh.
@@ -450,13 +918,158 @@ class Driver(SuperQObject, metaclass=_DriverType):
                      If keys is a string, returns the value.
                      If keys is a list, returns a dictionary.
         :type keys: str, list, tuple, dict.
+        :param max_age: if given, cached values older than this (in seconds)
+                        are reported as MISSING.
+        :type max_age: float
         """
 
+        def _recall(key):
+            feat = self._lantz_features[key]
+            value = feat.get_cache(self)
+            if max_age is None:
+                return value
+            if isinstance(feat, DictFeat):
+                return {item: item_value for item, item_value in value.items()
+                        if feat.cache_age(self, item) <= max_age}
+            if feat.cache_age(self) > max_age:
+                return MISSING
+            return value
+
         if keys:
             if isinstance(keys, (list, tuple, set)):
-                return {key: self._lantz_features[key].get_cache(self) for key in keys}
-            return self._lantz_features[keys].get_cache(self)
-        return {key: value.get_cache(self) for key, value in self._lantz_features.keys()}
+                return {key: _recall(key) for key in keys}
+            return _recall(keys)
+        return {key: _recall(key) for key in self._lantz_features.keys()}
+
+    def snapshot(self, keys=None, *, max_age=None):
+        """Return the configuration of the driver as a serializable dict
+        that can be given to `restore`.
+
+        :param keys: a list of feat names to include.
+                     Default None, meaning all the feats that can be set.
+        :type keys: list or tuple
+        :param max_age: cached values older than this (in seconds) are read
+                        again from the instrument. Default None, meaning that
+                        the cached value is used if available.
+        :type max_age: float
+
+        Values that are not cached are read from the instrument, write-only
+        feats without a cached value are omitted. Quantities are stored as a
+        dict with magnitude and units, and DictFeats as a list of [key, value]
+        pairs.
+        """
+        if max_age is None:
+            max_age = float('inf')
+
+        if keys is None:
+            keys = [name for name, feat in self._lantz_features.items() if feat.fset is not None]
+
+        feats = {}
+        dictfeats = {}
+        with self._lock:
+            for name in keys:
+                feat = self._lantz_features[name]
+                readable = feat.fget is not None and feat.fget is not MISSING
+                if isinstance(feat, DictFeat):
+                    cached = feat.get_cache(self)
+                    declared = self.feats[name].keys
+                    if isinstance(declared, dict):
+                        items = list(declared.items())
+                    elif declared:
+                        items = [(key, key) for key in declared]
+                    else:
+                        items = [(key, key) for key in cached.keys()]
+                    if readable:
+                        values = feat.get_many(self, [key for key, _ in items], max_age)
+                    else:
+                        values = {key: cached[ikey] for key, ikey in items if ikey in cached}
+                    dictfeats[name] = [[key, _to_serializable(value)]
+                                       for key, value in values.items()]
+                elif readable:
+                    feats[name] = _to_serializable(feat.get(self, max_age=max_age))
+                else:
+                    value = feat.get_cache(self)
+                    if value is not MISSING:
+                        feats[name] = _to_serializable(value)
+
+        return {'driver': self.__class__.__name__,
+                'name': self.name,
+                'feats': feats,
+                'dictfeats': dictfeats}
+
+    def restore(self, snapshot, *, force=False):
+        """Apply a configuration obtained from `snapshot`.
+
+        Only the feats (and DictFeat keys) that differ from the cache are
+        written (unless force is True). Feats are written in batches
+        (see `batch`), each one after the feats on which its modifiers
+        depend (see Self).
+
+        :param snapshot: the dict returned by `snapshot`.
+        :type snapshot: dict
+        :param force: write all the values even when the cache says it is not necessary.
+        :type force: boolean
+
+        :return: the values that were written. For DictFeats, a dict
+                 with the keys that were written.
+        :rtype: dict
+        """
+        newstate = {name: _from_serializable(value)
+                    for name, value in snapshot.get('feats', {}).items()}
+        for name, items in snapshot.get('dictfeats', {}).items():
+            newstate[name] = {key: _from_serializable(value) for key, value in items}
+
+        with self._lock:
+            changed = {}
+            for name, value in newstate.items():
+                feat = self._lantz_features[name]
+                if isinstance(feat, DictFeat):
+                    value = {key: item for key, item in value.items()
+                             if force or not _equal(item, feat.get_cache(self, feat._check_key(self, key)))}
+                    if value:
+                        changed[name] = value
+                elif force or not _equal(value, feat.get_cache(self)):
+                    changed[name] = value
+
+            for names in self._restore_order(changed.keys()):
+                # The cache comparison was already done, so the values
+                # are forced to skip deadbands.
+                with self.batch(force=True):
+                    for name in names:
+                        feat = self._lantz_features[name]
+                        if isinstance(feat, DictFeat):
+                            feat.set_many(self, changed[name], True)
+                        else:
+                            feat.set(self, changed[name], True)
+
+        return changed
+
+    def _restore_order(self, names):
+        """Group feat names in levels such that each feat comes
+        after those on which it depends.
+        """
+        pending = list(names)
+        done = set()
+        levels = []
+        while pending:
+            level = [name for name in pending
+                     if all(dep in done or dep not in pending
+                            for dep in self._lantz_dependencies.get(name, ()))]
+            if not level:
+                raise ValueError('Circular dependency among {}'.format(pending))
+            levels.append(level)
+            done.update(level)
+            pending = [name for name in pending if name not in done]
+        return levels
+
+    def history(self, feat_name, key=MISSING):
+        """Return the recorded values of a feat with the history modifier.
+
+        :param feat_name: name of the feat.
+        :param key: key (only for DictFeat).
+        :return: (timestamps, values) numpy views in chronological order.
+        """
+        return self._lantz_features[feat_name].history(self, key)
 
     @property
     def feats(self):
@@ -467,36 +1080,252 @@ class Driver(SuperQObject, metaclass=_DriverType):
         return Proxy(self, self._lantz_actions, ActionProxy)
 
 
-def _solve_dependencies(dependencies, all_members=None):
-    """Solve a dependency graph.
+def refresh_many(drivers, keys=None, *, max_age=None, on_value=None, concurrent=True):
+    """Refresh a group of drivers.
+
+    :param drivers: an iterable of drivers.
+    :param keys: feats to refresh in each driver (see `Driver.refresh`).
+                 Default None, meaning all feats.
+    :param max_age: cached values younger than this (in seconds) are
+                    returned without reading from the instrument.
+    :param on_value: a callable to be executed as soon as a value is read.
+                     It takes the driver, the feat name and the value.
+    :param concurrent: indicates that drivers should be refreshed concurrently.
+    :return: a dictionary mapping each driver name to its refresh result.
+    """
+
+    def _on_value(driver):
+        if on_value is None:
+            return None
+        return partial(on_value, driver)
+
+    # Waiting from a task could exhaust the workers of the executor.
+    if not concurrent or in_task():
+        return {driver.name: driver.refresh(keys, max_age=max_age, callback=_on_value(driver))
+                for driver in drivers}
+
+    futs = {driver.name: driver.refresh_async(keys, max_age=max_age, on_value=_on_value(driver))
+            for driver in drivers}
+    return {name: fut.result() for name, fut in futs.items()}
+
+
+def _build_graph(dependencies, all_members=None):
+    """Return the prerequisites and the dependents of each member
+    of a dependency graph.
+
+    :return: two dicts mapping each member to a set.
+    """
+    prerequisites = {key: set() for key in all_members or ()}
+    for key, value in (dependencies or {}).items():
+        prerequisites.setdefault(key, set()).update(value)
+        for dep in value:
+            prerequisites.setdefault(dep, set())
+    dependents = {key: set() for key in prerequisites}
+    for key, value in prerequisites.items():
+        for dep in value:
+            dependents[dep].add(key)
+    return prerequisites, dependents
+
+
+class RunReport(object):
+    """Report of an action (e.g. initialize) run in a group of drivers
+    by `initialize_many` or `finalize_many`.
+
+    Times are in seconds since the start of the group.
+    """
+
+    def __init__(self, action, prerequisites):
+        self.action = action
+        #: name: set of names that had to finish before it.
+        self.prerequisites = prerequisites
+        #: name: (start, end)
+        self.times = {}
+        #: name: exception
+        self.errors = {}
+        #: names not run because a prerequisite failed or the group was stopped.
+        self.skipped = []
+        #: total time in seconds.
+        self.elapsed = 0.
+
+    @property
+    def critical_path(self):
+        """The chain of drivers that determined the total time,
+        starting with the first one.
+        """
+        if not self.times:
+            return []
+        path = [max(self.times, key=lambda name: self.times[name][1])]
+        while True:
+            previous = [name for name in self.prerequisites.get(path[-1], ())
+                        if name in self.times]
+            if not previous:
+                break
+            path.append(max(previous, key=lambda name: self.times[name][1]))
+        return path[::-1]
+
+    def __str__(self):
+        lines = ['{} of {} drivers took {:.3f} s'.format(self.action, len(self.prerequisites),
+                                                          self.elapsed)]
+        for name in self.critical_path:
+            start, end = self.times[name]
+            lines.append('  {}: {:.3f} s -> {:.3f} s ({:.3f} s)'.format(name, start, end, end - start))
+        for name, ex in self.errors.items():
+            lines.append('  {} failed: {}'.format(name, ex))
+        if self.skipped:
+            lines.append('  skipped: {}'.format(', '.join(self.skipped)))
+        return '\n'.join(lines)
+
+
+class _Schedule(object):
+    """Keep track of the drivers of a group that are ready, running or
+    skipped while an action is run in each one as soon as its prerequisites
+    have finished. Used by both the thread and the asyncio runners.
+    """
+
+    def __init__(self, drivers, action, prerequisites, dependents,
+                 on_starting, on_done, on_exception, policy):
+        self.names = names = {driver.name: driver for driver in drivers}
+        if policy is None:
+            policy = 'continue' if on_exception else 'fail_fast'
+        if policy not in ('continue', 'fail_fast'):
+            raise ValueError("policy must be 'continue' or 'fail_fast', not {!r}".format(policy))
+
+        self.action = action
+        self.policy = policy
+        self.on_starting = on_starting
+        self.on_done = on_done
+        self.on_exception = on_exception
+
+        prerequisites = {name: set(prerequisites.get(name, ())) & set(names) for name in names}
+        self.dependents = {name: set(dependents.get(name, ())) & set(names) for name in names}
+        self.report = RunReport(action, prerequisites)
+        self.waiting = {name: len(value) for name, value in prerequisites.items()}
+        self.ready = [name for name in names if not self.waiting[name]]
+        if not self.ready and names:
+            raise ValueError('Circular dependency among {}'.format(sorted(names)))
+
+        self.running = set()
+        self.failed = False
+        self.tic = time.monotonic()
+
+    @property
+    def can_start(self):
+        return bool(self.ready) and not (self.failed and self.policy == 'fail_fast')
+
+    def start(self):
+        """Return the next driver to run, marking it as running.
+        """
+        name = self.ready.pop(0)
+        driver = self.names[name]
+        if self.on_starting:
+            self.on_starting(driver)
+        self.report.times[name] = (time.monotonic() - self.tic, None)
+        self.running.add(name)
+        return driver
+
+    def finish(self, name, ex):
+        """Mark a driver as finished (with an exception or None),
+        making ready the drivers that were waiting for it.
+        """
+        report = self.report
+        self.running.discard(name)
+        report.times[name] = (report.times[name][0], time.monotonic() - self.tic)
+        driver = self.names[name]
+        if ex:
+            report.errors[name] = ex
+            self.failed = True
+            if self.on_exception:
+                self.on_exception(driver, ex)
+            for dependent in self.dependents[name]:
+                self._skip(dependent)
+            return
+
+        if self.on_done:
+            self.on_done(driver)
+
+        for dependent in self.dependents[name]:
+            self.waiting[dependent] -= 1
+            if not self.waiting[dependent] and dependent not in report.skipped:
+                self.ready.append(dependent)
+
+    def _skip(self, name):
+        if name in self.report.skipped:
+            return
+        self.report.skipped.append(name)
+        for dependent in self.dependents[name]:
+            self._skip(dependent)
+
+    def timeout(self):
+        self.report.skipped.extend(self.ready)
+        self.report.elapsed = time.monotonic() - self.tic
+        raise futures.TimeoutError('Timeout while running {} in {}. '
+                                   'Still running {}'.format(self.action, sorted(self.names),
+                                                             sorted(self.running)))
+
+    def close(self):
+        """Return the report, or raise the first exception if no
+        on_exception was given.
+        """
+        report = self.report
+        not_run = [name for name in self.names
+                   if name not in report.times and name not in report.skipped]
+        if not_run and not self.failed:
+            raise ValueError('Circular dependency among {}'.format(sorted(not_run)))
+        report.skipped.extend(not_run)
+
+        report.elapsed = time.monotonic() - self.tic
+
+        if report.errors and not self.on_exception:
+            raise next(iter(report.errors.values()))
 
-    :param dependencies: dependency dictionary. For each key, the value is
-                         an iterable indicating its dependencies.
-    :param all_members: If provided
-    :return: list of sets, each containing independent task only dependent of the
-             previous set in the list.
+        return report
 
+
+def _run_graph(drivers, action, prerequisites, dependents,
+               on_starting, on_done, on_exception,
+               concurrent, timeout, policy):
+    """Run an action in each driver as soon as its prerequisites have finished.
+
+    :return: RunReport
     """
-    d = dict((key, set(value)) for key, value in dependencies.items())
-    if all_members:
-        d.update({key: set() for key in all_members if key not in d})
-    r = []
-    while d:
-        # values not in keys (items without dep)
-        t = set(i for v in d.values() for i in v) - set(d.keys())
-        # and keys without value (items without dep)
-        t.update(k for k, v in d.items() if not v)
-        # can be done right away
-        r.append(t)
-        # and cleaned up
-        d = dict(((k, v - t) for k, v in d.items() if v))
-
-    return r
+    # Waiting from a task could exhaust the workers of the executor.
+    concurrent = concurrent and not in_task()
+    schedule = _Schedule(drivers, action, prerequisites, dependents,
+                         on_starting, on_done, on_exception, policy)
+    finished = queue.Queue()
+    deadline = None if timeout is None else schedule.tic + timeout
+
+    while schedule.running or schedule.can_start:
+        while schedule.can_start:
+            if deadline is not None and time.monotonic() > deadline:
+                schedule.timeout()
+            driver = schedule.start()
+            if concurrent:
+                fut = getattr(driver, action + '_async')()
+            else:
+                fut = futures.Future()
+                try:
+                    fut.set_result(getattr(driver, action)())
+                except Exception as ex:
+                    fut.set_exception(ex)
+            fut.add_done_callback(lambda f, name=driver.name: finished.put((name, f)))
+            if not concurrent:
+                break
+
+        try:
+            wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+            name, fut = finished.get(timeout=wait)
+        except queue.Empty:
+            schedule.timeout()
+
+        schedule.finish(name, fut.exception())
+
+    return schedule.close()
 
 
 def initialize_many(drivers, register_finalizer=True,
                     on_initializing=None, on_initialized=None, on_exception=None,
-                    concurrent=False, dependencies=None):
+                    concurrent=False, dependencies=None, timeout=None, policy=None):
     """Initialize a group of drivers.
 
     :param drivers: an iterable of drivers.
@@ -513,69 +1342,119 @@ def initialize_many(drivers, register_finalizer=True,
     :param dependencies: indicates which drivers depend on others to be initialized.
                          each key is a driver name, and the corresponding
                          value is an iterable with its dependencies.
+    :param timeout: maximum time in seconds to initialize all drivers.
+                    If exceeded, no more drivers are initialized and
+                    a concurrent.futures.TimeoutError is raised.
+    :param policy: what to do when a driver fails. 'fail_fast' stops
+                   initializing drivers, 'continue' initializes all drivers
+                   except those depending on the failed one.
+                   Default None, meaning 'continue' if on_exception is given
+                   and 'fail_fast' otherwise.
+    :return: a report with the time taken by each driver and the critical path.
+    :rtype: RunReport
+
+    Each driver is initialized as soon as the drivers it depends on have been
+    initialized. If no on_exception is given, the first exception is raised
+    after the drivers being initialized finish.
     """
+    if register_finalizer:
+        _on_initializing = on_initializing
 
-    if dependencies:
-        names = {driver.name: driver for driver in drivers}
-
-        groups = _solve_dependencies(dependencies, set(names.keys()))
-        drivers = tuple(tuple(names[name] for name in group) for group in groups)
-        for subset in drivers:
-            initialize_many(subset, register_finalizer,
-                            on_initializing, on_initialized, on_exception,
-                            concurrent)
-        return
-
-    if concurrent:
-        def _finalize(d):
-            def _inner_finalize(f):
-                atexit.register(d.finalize)
-            return _inner_finalize
-
-        def _done(d):
-            def _inner(f):
-                ex = f.exception()
-                if ex:
-                    if not on_exception:
-                        raise ex
-                    on_exception(d, ex)
-                else:
-                    if on_initialized:
-                        on_initialized(d)
-            return _inner
-
-        futs = []
-        for driver in drivers:
-            if on_initializing:
-                on_initializing(driver)
-            fut = driver.initialize_async()
-            if register_finalizer:
-                fut.add_done_callback(_finalize(driver))
-            fut.add_done_callback(_done(driver))
-            futs.append(fut)
-
-        futures.wait(futs)
-    else:
-        for driver in drivers:
-            if on_initializing:
-                on_initializing(driver)
-            try:
-                driver.initialize()
-            except Exception as ex:
-                if not on_exception:
-                    raise ex
-                on_exception(driver, ex)
-            else:
-                if on_initialized:
-                    on_initialized(driver)
+        def on_initializing(driver):
+            atexit.register(driver.finalize)
+            if _on_initializing:
+                _on_initializing(driver)
+
+    drivers = tuple(drivers)
+    prerequisites, dependents = _build_graph(dependencies, [driver.name for driver in drivers])
+    return _run_graph(drivers, 'initialize', prerequisites, dependents,
+                      on_initializing, on_initialized, on_exception,
+                      concurrent, timeout, policy)
+
+
+async def _arun_graph(drivers, action, prerequisites, dependents,
+                      on_starting, on_done, on_exception,
+                      timeout, policy, loop):
+    """Run an action in each driver as soon as its prerequisites
+    have finished (asyncio coroutine, see `_run_graph`).
+
+    :return: RunReport
+    """
+    schedule = _Schedule(drivers, action, prerequisites, dependents,
+                         on_starting, on_done, on_exception, policy)
+    loop = loop or asyncio.get_event_loop()
+    deadline = None if timeout is None else schedule.tic + timeout
+    tasks = {}
+
+    while schedule.running or schedule.can_start:
+        while schedule.can_start:
+            if deadline is not None and time.monotonic() > deadline:
+                schedule.timeout()
+            driver = schedule.start()
+            tasks[loop.create_task(driver.acall(action, loop=loop))] = driver.name
+
+        wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+        done, _ = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            for task in tasks:
+                task.cancel()
+            schedule.timeout()
+
+        for task in done:
+            schedule.finish(tasks.pop(task), task.exception())
+
+    return schedule.close()
+
+
+async def ainitialize_many(drivers, register_finalizer=True,
+                           on_initializing=None, on_initialized=None, on_exception=None,
+                           dependencies=None, timeout=None, policy=None, loop=None):
+    """Initialize a group of drivers concurrently (asyncio coroutine).
+
+    Each driver is initialized as soon as its dependencies are initialized.
+    See `initialize_many` for the meaning of the arguments.
+
+    :param loop: asyncio event loop. Default None, the running loop.
+    :return: a report with the time taken by each driver and the critical path.
+    :rtype: RunReport
+    """
+    if register_finalizer:
+        _on_initializing = on_initializing
 
-            if register_finalizer:
-                atexit.register(driver.finalize)
+        def on_initializing(driver):
+            atexit.register(driver.finalize)
+            if _on_initializing:
+                _on_initializing(driver)
+
+    drivers = tuple(drivers)
+    prerequisites, dependents = _build_graph(dependencies, [driver.name for driver in drivers])
+    return await _arun_graph(drivers, 'initialize', prerequisites, dependents,
+                             on_initializing, on_initialized, on_exception,
+                             timeout, policy, loop)
+
+
+async def afinalize_many(drivers,
+                         on_finalizing=None, on_finalized=None, on_exception=None,
+                         dependencies=None, timeout=None, policy=None, loop=None):
+    """Finalize a group of drivers concurrently (asyncio coroutine).
+
+    Each driver is finalized as soon as all the drivers that depend on it
+    are finalized. See `finalize_many` for the meaning of the arguments.
+
+    :param loop: asyncio event loop. Default None, the running loop.
+    :return: a report with the time taken by each driver and the critical path.
+    :rtype: RunReport
+    """
+    drivers = tuple(drivers)
+    prerequisites, dependents = _build_graph(dependencies, [driver.name for driver in drivers])
+    return await _arun_graph(drivers, 'finalize', dependents, prerequisites,
+                             on_finalizing, on_finalized, on_exception,
+                             timeout, policy, loop)
 
 
 def finalize_many(drivers,
                   on_finalizing=None, on_finalized=None, on_exception=None,
-                  concurrent=False, dependencies=None):
+                  concurrent=False, dependencies=None, timeout=None, policy=None):
     """Finalize a group of drivers.
 
     :param drivers: an iterable of drivers.
@@ -592,49 +1471,17 @@ def finalize_many(drivers,
                          each key is a driver name, and the corresponding
                          value is an iterable with its dependencies.
                          The dependencies are used in reverse.
+    :param timeout: maximum time in seconds to finalize all drivers.
+    :param policy: what to do when a driver fails ('fail_fast' or 'continue').
+                   See `initialize_many`.
+    :return: a report with the time taken by each driver and the critical path.
+    :rtype: RunReport
+
+    Each driver is finalized as soon as all the drivers that depend on it
+    have been finalized.
     """
-
-    if dependencies:
-        names = {driver.name: driver for driver in drivers}
-
-        groups = _solve_dependencies(dependencies, set(names.keys()))
-        drivers = tuple(tuple(names[name] for name in group) for group in groups)
-        for subset in reversed(drivers):
-            finalize_many(subset, on_finalizing, on_finalized, on_exception, concurrent)
-        return
-
-    if concurrent:
-        def _done(d):
-            def _inner(f):
-                ex = f.exception()
-                if ex:
-                    if not on_exception:
-                        raise ex
-                    on_exception(d, ex)
-                else:
-                    if on_finalized:
-                        on_finalized(d)
-            return _inner
-
-        futs = []
-        for driver in drivers:
-            if on_finalizing:
-                on_finalizing(driver)
-            fut = driver.finalize_async()
-            fut.add_done_callback(_done(driver))
-            futs.append(fut)
-
-        futures.wait(futs)
-    else:
-        for driver in drivers:
-            if on_finalizing:
-                on_finalizing(driver)
-            try:
-                driver.finalize()
-            except Exception as ex:
-                if not on_exception:
-                    raise ex
-                on_exception(driver, ex)
-            else:
-                if on_finalized:
-                    on_finalized(driver)
+    drivers = tuple(drivers)
+    prerequisites, dependents = _build_graph(dependencies, [driver.name for driver in drivers])
+    return _run_graph(drivers, 'finalize', dependents, prerequisites,
+                      on_finalizing, on_finalized, on_exception,
+                      concurrent, timeout, policy)
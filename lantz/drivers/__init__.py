@@ -5,6 +5,42 @@
 
     Legacy drivers for different companies.
 
+    Drivers can be found without importing them using the catalog
+    (see lantz.drivers.catalog)::
+
+        >>> from lantz import drivers
+        >>> drivers.find(idn='Stanford_Research_Systems,SR830,s/n12345,ver1.07')
+
+    and driver classes are imported on first access (e.g. drivers.SR830).
+
     :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
     :license: BSD, see LICENSE for more details.
 """
+
+import os as _os
+import importlib as _importlib
+
+from .catalog import find, get, load
+
+
+def __getattr__(name):
+    # Subpackages and driver classes are imported on first use,
+    # e.g. lantz.drivers.SR830 imports only lantz.drivers.stanford
+    if name.startswith('__'):
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+    folder = _os.path.dirname(__file__)
+    if (_os.path.exists(_os.path.join(folder, name, '__init__.py')) or
+            _os.path.exists(_os.path.join(folder, name + '.py'))):
+        return _importlib.import_module('.' + name, __name__)
+
+    paths = sorted(set(info.path for info in load() if info.name == name))
+    if len(paths) == 1:
+        return get(paths[0])
+    elif paths:
+        raise AttributeError('{!r} is ambiguous in {}: {}'.format(name, __name__, ', '.join(paths)))
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(info.name for info in load()))
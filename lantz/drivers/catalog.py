@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.catalog
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Implements a catalog of the drivers in lantz.drivers built by parsing
+    (not importing) their source code, so that drivers can be listed and
+    found without importing the vendor packages and their dependencies.
+
+    For each driver class the catalog stores its module, the name of its
+    bases, `MANUFACTURER_ID`, `MODEL_CODE`, the interface types in `DEFAULTS`,
+    its feats and actions (including inherited ones) and the first line
+    of its docstring.
+
+    The catalog is stored in an index file in the cache folder of the user
+    (or in the file given by the LANTZ_CATALOG environment variable) and
+    only the files that changed since it was written are parsed again.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import re
+import sys
+import ast
+import json
+import hashlib
+import importlib
+from collections import namedtuple, defaultdict
+
+#: Name of the base classes that make a class a driver.
+#: (USBDriver is defined in the legacy package, which is not scanned).
+_ROOTS = frozenset(['Driver', 'MessageBasedDriver', 'LibraryDriver', 'RemoteDriver', 'USBDriver'])
+
+#: Folders not scanned.
+_EXCLUDED = frozenset(['legacy', '__pycache__'])
+
+_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def _cache_folder():
+    """Return the folder in which lantz caches files for the current user.
+    """
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser(os.path.join('~', 'Library', 'Caches'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache'))
+    return os.path.join(base, 'lantz')
+
+
+#: Default location of the index file. The package folder is not used
+#: as it might not be writable, and each installation has its own index.
+INDEX = (os.environ.get('LANTZ_CATALOG') or
+         os.path.join(_cache_folder(),
+                      'catalog-{}.json'.format(hashlib.sha1(_FOLDER.encode('utf-8')).hexdigest()[:12])))
+
+_INDEX_VERSION = 1
+
+#: Catalog of the default index, loaded on first use.
+_CATALOG = None
+
+DriverInfo = namedtuple('DriverInfo', 'name module path bases manufacturer_id model_code '
+                                      'interfaces feats actions doc')
+
+
+def _name(node):
+    """Return the last component of a (possibly dotted) name or None.
+    """
+    if isinstance(node, ast.Call):
+        node = node.func
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        return None
+
+
+def _member_kind(node):
+    """Return 'feat', 'action' or None for a decorator or a value.
+    """
+    name = _name(node)
+    if name in ('Feat', 'DictFeat'):
+        return 'feat'
+    if name == 'Action':
+        return 'action'
+    return None
+
+
+def _parse_class(node, module):
+    info = {'name': node.name, 'module': module,
+            'bases': [name for name in map(_name, node.bases) if name],
+            'manufacturer_id': None, 'model_code': None, 'interfaces': None,
+            'feats': [], 'actions': [],
+            'doc': (ast.get_docstring(node) or '').strip().split('\n')[0]}
+
+    for item in node.body:
+        if isinstance(item, ast.Assign) and len(item.targets) == 1 and isinstance(item.targets[0], ast.Name):
+            target = item.targets[0].id
+            if target == 'MANUFACTURER_ID':
+                value = _literal(item.value)
+                info['manufacturer_id'] = None if value is None else str(value)
+            elif target == 'MODEL_CODE':
+                value = _literal(item.value)
+                if isinstance(value, (list, tuple)):
+                    info['model_code'] = [str(code) for code in value]
+                elif value is not None:
+                    info['model_code'] = [str(value)]
+            elif target == 'DEFAULTS' and isinstance(item.value, ast.Dict):
+                info['interfaces'] = [key.value for key in item.value.keys
+                                      if isinstance(key, ast.Constant) and isinstance(key.value, str)]
+            else:
+                kind = _member_kind(item.value)
+                if kind:
+                    info[kind + 's'].append(target)
+        elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for decorator in item.decorator_list:
+                # Setters (e.g. @eggs.setter) are not new members.
+                kind = _member_kind(decorator)
+                if kind and item.name not in info[kind + 's']:
+                    info[kind + 's'].append(item.name)
+
+    return info
+
+
+def _parse(module, filename):
+    """Return the classes defined at the top level of a module.
+    """
+    try:
+        with open(filename, 'rb') as fp:
+            tree = ast.parse(fp.read(), filename)
+    except (SyntaxError, ValueError):
+        return []
+    return [_parse_class(node, module) for node in tree.body
+            if isinstance(node, ast.ClassDef)]
+
+
+def _modules(folder=_FOLDER):
+    """Yield (relative filename, module name) for each module in lantz.drivers.
+    """
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(name for name in dirs
+                         if name not in _EXCLUDED and os.path.exists(os.path.join(root, name, '__init__.py')))
+        for filename in sorted(files):
+            if not filename.endswith('.py'):
+                continue
+            relative = os.path.relpath(os.path.join(root, filename), folder)
+            parts = relative[:-3].split(os.sep)
+            if parts[-1] == '__init__':
+                parts = parts[:-1]
+            yield relative, '.'.join([__package__] + parts)
+
+
+def _scan(previous, folder=_FOLDER):
+    """Return {relative filename: [mtime, size, classes]} parsing only
+    the files that are not in previous or have changed.
+    """
+    files = {}
+    for relative, module in _modules(folder):
+        stat = os.stat(os.path.join(folder, relative))
+        old = previous.get(relative)
+        if old and old[0] == stat.st_mtime and old[1] == stat.st_size:
+            files[relative] = old
+        else:
+            files[relative] = [stat.st_mtime, stat.st_size,
+                               _parse(module, os.path.join(folder, relative))]
+    return files
+
+
+def _resolve(files):
+    """Return the DriverInfo of each driver class.
+    """
+    classes = [info for _, _, infos in files.values() for info in infos]
+
+    by_name = defaultdict(list)
+    for info in classes:
+        by_name[info['name']].append(info)
+
+    def _candidates(info, base):
+        # Bases are matched by name, preferring classes of the same module.
+        same = [other for other in by_name[base] if other['module'] == info['module']]
+        return same or by_name[base]
+
+    # A class is a driver if one of its bases is a driver.
+    drivers = set()
+    changed = True
+    while changed:
+        changed = False
+        for info in classes:
+            path = info['module'] + '.' + info['name']
+            if path in drivers:
+                continue
+            if any(base in _ROOTS or any(other['module'] + '.' + base in drivers
+                                         for other in _candidates(info, base))
+                   for base in info['bases']):
+                drivers.add(path)
+                changed = True
+
+    def _members(info, kind, seen):
+        out = list(info[kind])
+        for base in info['bases']:
+            for other in _candidates(info, base):
+                if id(other) in seen:
+                    continue
+                seen.add(id(other))
+                out.extend(name for name in _members(other, kind, seen) if name not in out)
+        return out
+
+    def _attribute(info, key, seen):
+        # As class attributes, these are inherited if not defined.
+        if info[key] is not None:
+            return info[key]
+        for base in info['bases']:
+            for other in _candidates(info, base):
+                if id(other) in seen:
+                    continue
+                seen.add(id(other))
+                value = _attribute(other, key, seen)
+                if value is not None:
+                    return value
+        return None
+
+    out = []
+    for info in classes:
+        path = info['module'] + '.' + info['name']
+        if path not in drivers or info['name'].startswith('_'):
+            continue
+        out.append(DriverInfo(info['name'], info['module'], path, tuple(info['bases']),
+                              _attribute(info, 'manufacturer_id', {id(info)}),
+                              tuple(_attribute(info, 'model_code', {id(info)}) or ()),
+                              tuple(_attribute(info, 'interfaces', {id(info)}) or ()),
+                              tuple(_members(info, 'feats', {id(info)})),
+                              tuple(_members(info, 'actions', {id(info)})),
+                              info['doc']))
+    return sorted(out, key=lambda info: info.path)
+
+
+def load(index=INDEX, rebuild=False):
+    """Return the catalog (list of DriverInfo), updating the index file
+    if the source code changed since it was written.
+
+    :param index: index filename or None to build the catalog without index.
+    :param rebuild: parse all files even if they have not changed.
+    """
+    global _CATALOG
+    if index == INDEX and _CATALOG is not None and not rebuild:
+        return _CATALOG
+
+    previous = {}
+    if index and not rebuild:
+        try:
+            with open(index, encoding='utf-8') as fp:
+                content = json.load(fp)
+            if content.get('version') == _INDEX_VERSION:
+                previous = content['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    files = _scan(previous)
+
+    if index and files != previous:
+        # The index is written atomically and silently skipped
+        # if the folder is not writable.
+        tmp = '{}.{}.tmp'.format(index, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(index)), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as fp:
+                json.dump({'version': _INDEX_VERSION, 'files': files}, fp)
+            os.replace(tmp, index)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    catalog = _resolve(files)
+    if index == INDEX:
+        _CATALOG = catalog
+    return catalog
+
+
+def _normalize(text):
+    return re.sub('[^0-9a-z]', '', str(text).lower())
+
+
+def _hex(value):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value), 16)
+    except ValueError:
+        return None
+
+
+def find(idn=None, manufacturer_id=None, model_code=None, interface=None, resource_name=None,
+         catalog=None):
+    """Find the drivers that match the given criteria.
+
+        >>> find(idn='Stanford_Research_Systems,SR830,s/n12345,ver1.07')
+        [DriverInfo(name='SR830', module='lantz.drivers.stanford.sr830', ...)]
+
+    :param idn: identification string as returned by `*IDN?`
+                (manufacturer,model,serial,firmware). The model is compared
+                with the name of the driver class.
+    :param manufacturer_id: USB manufacturer id (hex string or int).
+    :param model_code: USB model code (hex string or int).
+    :param interface: VISA interface type (e.g. 'ASRL', 'USB', 'TCPIP', 'GPIB').
+                      Drivers with DEFAULTS for other interfaces only do not match.
+    :param resource_name: VISA resource name. The interface type, and for USB
+                          resources the manufacturer id and model code, are taken
+                          from it.
+    :param catalog: list of DriverInfo. Default None, the catalog of lantz.drivers.
+    :return: list of DriverInfo, best matches first.
+    """
+    if catalog is None:
+        catalog = load()
+
+    if resource_name:
+        parts = resource_name.split('::')
+        interface = interface or re.match('[A-Za-z]*', parts[0]).group(0).upper()
+        if interface == 'USB' and len(parts) > 2:
+            manufacturer_id = manufacturer_id or parts[1]
+            model_code = model_code or parts[2]
+
+    manufacturer_id, model_code = _hex(manufacturer_id), _hex(model_code)
+
+    exact, partial = [], []
+    for info in catalog:
+        if manufacturer_id is not None and _hex(info.manufacturer_id) != manufacturer_id:
+            continue
+        if model_code is not None and model_code not in [_hex(code) for code in info.model_code]:
+            continue
+        if (interface is not None and info.interfaces and
+                interface not in info.interfaces and 'COMMON' not in info.interfaces):
+            continue
+        if idn is None:
+            exact.append(info)
+            continue
+        fields = idn.split(',')
+        model = _normalize(fields[1] if len(fields) > 1 else fields[0])
+        name = _normalize(info.name)
+        if name == model:
+            exact.append(info)
+        elif len(name) > 2 and model.startswith(name):
+            partial.append(info)
+
+    return exact + partial
+
+
+def get(info):
+    """Import and return the driver class described by a DriverInfo
+    (or a class path).
+    """
+    path = info.path if isinstance(info, DriverInfo) else info
+    module, name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module), name)
+
+
+if __name__ == '__main__':
+    for info in load(rebuild=True):
+        print(info.path)
@@ -68,3 +68,22 @@ class SCPIDriver(IEEE4882Driver):
 
     You can use it as a mixin class.
     """
+
+    #: Commands written in a batch are sent as a single message.
+    #: After a bare ';' the header path of the previous command is kept,
+    #: so each command is restarted from the root with ';:'.
+    BATCH_SEPARATOR = ';:'
+
+    def _join_writes(self, commands):
+        # Commands that already start at the root are not given a second
+        # colon, and common commands (e.g. *CLS) are not given one at all.
+        out = ''
+        for command in commands:
+            command = command.lstrip(':')
+            if not out:
+                out = command
+            elif command.startswith('*'):
+                out += ';' + command
+            else:
+                out += self.BATCH_SEPARATOR + command
+        return out
@@ -469,6 +469,18 @@ class SR830(MessageBasedDriver):
         else:
             return self.query('OUTR? {}'.format(key))
 
+    @analog_value.getter_many
+    def analog_value(self, keys):
+        # SNAP? reads between 2 and 6 parameters simultaneously.
+        d = {'x': 1, 'y': 2, 'r': 3, 't': 4, 1: 10, 2: 11}
+        values = []
+        for start in range(0, len(keys), 6):
+            chunk = [str(d[key]) for key in keys[start:start + 6]]
+            params = chunk if len(chunk) > 1 else chunk * 2
+            answer = self.query('SNAP? {}'.format(','.join(params)))
+            values.extend(float(value) for value in answer.split(',')[:len(chunk)])
+        return values
+
     @Action()
     def measure(self, channels):
         d = {'x': '1', 'y': '2', 'r': '3', 't': '4',
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.executor
+    ~~~~~~~~~~~~~~
+
+    Implements a process wide executor shared by all drivers and strands
+    to run tasks for a given driver one at a time and in order.
+
+    The executor has a bounded number of workers (MAX_WORKERS), so a task
+    that blocks waiting for other tasks could wait forever for a free
+    worker. Functions that wait for a group of drivers (e.g.
+    `initialize_many` and `refresh_many`) check `in_task` and run the
+    group in the calling thread instead.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import threading
+from collections import deque
+from concurrent import futures
+
+#: Default maximum number of threads of the shared executor.
+MAX_WORKERS = 16
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+#: Marks the threads running a task of a strand.
+_LOCAL = threading.local()
+
+
+def in_task():
+    """Return True if called from a task run by a Strand,
+    which occupies a worker of its executor.
+    """
+    return getattr(_LOCAL, 'in_task', False)
+
+
+def get_executor():
+    """Return the process wide executor, creating it if necessary.
+
+    :rtype: concurrent.futures.Executor
+    """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    return _EXECUTOR
+
+
+def set_executor(executor=None, max_workers=None):
+    """Replace the process wide executor.
+
+    Strands created afterwards (and strands without their own executor)
+    submit their tasks to the new one. The previous executor is not shut
+    down as it might still be running tasks.
+
+    :param executor: a concurrent.futures.Executor. If None, a
+                     ThreadPoolExecutor is created on first use.
+    :param max_workers: maximum number of threads of the ThreadPoolExecutor
+                        created when executor is None.
+    """
+    global _EXECUTOR, MAX_WORKERS
+    with _EXECUTOR_LOCK:
+        if max_workers is not None:
+            MAX_WORKERS = max_workers
+        _EXECUTOR = executor
+
+
+class Strand(object):
+    """Run tasks in a shared executor one at a time, in submission order.
+
+    Tasks submitted to the same strand never overlap, but tasks of different
+    strands run concurrently in the executor.
+
+    :param executor: executor in which tasks are run.
+                     None (default) means the process wide executor.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._active = False
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) to be run after all previously
+        submitted tasks.
+
+        :rtype: concurrent.futures.Future
+        """
+        fut = futures.Future()
+        with self._lock:
+            self._queue.append((fut, fn, args, kwargs))
+            if self._active:
+                return fut
+            self._active = True
+        self._schedule()
+        return fut
+
+    def _schedule(self):
+        (self.executor or get_executor()).submit(self._run_next)
+
+    def _run_next(self):
+        with self._lock:
+            fut, fn, args, kwargs = self._queue.popleft()
+
+        if fut.set_running_or_notify_cancel():
+            _LOCAL.in_task = True
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                fut.set_exception(e)
+            else:
+                fut.set_result(result)
+            finally:
+                _LOCAL.in_task = False
+
+        with self._lock:
+            if not self._queue:
+                self._active = False
+                return
+        self._schedule()
+
+    def __len__(self):
+        return len(self._queue)
@@ -12,9 +12,12 @@
 
 import time
 import copy
+import threading
+from collections import namedtuple
 from weakref import WeakKeyDictionary
 
-from . import Q_
+from . import units as lantz_units
+from . import trace
 from .processors import (Processor, ToQuantityProcessor, FromQuantityProcessor,
                          MapProcessor, ReverseMapProcessor, RangeProcessor)
 
@@ -38,6 +41,10 @@ class _NamedObject(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # Unpickled as the module level sentinel with the same name.
+        return self.name
+
 MISSING = _NamedObject('MISSING')
 
 
@@ -65,6 +72,120 @@ def _dset(adict, value, instance=MISSING, key=MISSING):
         adict[instance][key] = value
 
 
+def _equal(value, other):
+    """Compare two values, also when they are numpy arrays
+    (or quantities wrapping them) which compare element-wise.
+    """
+    try:
+        return bool(value == other)
+    except ValueError:
+        try:
+            return bool((value == other).all())
+        except (ValueError, AttributeError):
+            return False
+
+
+def _receivers_counter(instance, signal, name):
+    """Return a function (instance, signal) -> number of slots connected
+    to the signal, or None if the signal backend cannot count them.
+
+    Headless signals count their own receivers. PyQt QObjects take the bound
+    signal and PySide QObjects the signature of the signal, which is looked
+    up by name in the meta object.
+    """
+    if hasattr(signal, 'receivers'):
+        return lambda instance, signal: signal.receivers()
+
+    try:
+        instance.receivers(signal)
+        return lambda instance, signal: instance.receivers(signal)
+    except Exception:
+        pass
+
+    try:
+        meta = instance.metaObject()
+        for index in range(meta.methodCount()):
+            method = meta.method(index)
+            try:
+                signature = method.signature()
+            except AttributeError:
+                signature = bytes(method.methodSignature()).decode('latin1')
+            if signature.startswith(name + '('):
+                signature = '2' + signature
+                instance.receivers(signature)
+                return lambda instance, signal: instance.receivers(signature)
+    except Exception:
+        pass
+
+    return None
+
+
+def _within_deadband(value, current, deadband, units=None):
+    """Return True if value differs from current by less than the deadband.
+
+    :param deadband: absolute (number or Quantity) or relative
+                     (string with a percentage, e.g. '0.5%') deadband.
+    :param units: units of a deadband given as a number (the units of the feat).
+                  If None, the units of the current value.
+    """
+    if current is MISSING:
+        return False
+    try:
+        diff = abs(value - current)
+        if isinstance(deadband, str):
+            limit = abs(current) * float(deadband.rstrip('%')) / 100.
+        else:
+            limit = deadband
+            if isinstance(diff, lantz_units.Q_) and not isinstance(deadband, lantz_units.Q_):
+                diff = diff.m_as(current.units if units is None else units)
+        inside = diff <= limit
+        try:
+            return bool(inside)
+        except ValueError:
+            return bool(inside.all())
+    except Exception:
+        return False
+
+
+def _identity(value):
+    return value
+
+
+def _compose(processors):
+    """Fuse a sequence of processors into a single callable that applies
+    them in order, skipping identities and avoiding a Python loop on every
+    call for short pipelines.
+    """
+    processors = tuple(processor for processor in processors
+                       if processor is not _identity)
+    if not processors:
+        return _identity
+    if len(processors) == 1:
+        return processors[0]
+    if len(processors) == 2:
+        first, second = processors
+
+        def _inner(value):
+            return second(first(value))
+        return _inner
+    if len(processors) == 3:
+        first, second, third = processors
+
+        def _inner(value):
+            return third(second(first(value)))
+        return _inner
+
+    def _inner(value):
+        for processor in processors:
+            value = processor(value)
+        return value
+    return _inner
+
+
+#: Modifiers used on every get/set, computed once per instance and key.
+_Settings = namedtuple('_Settings', 'max_age notify history deadband min_interval units keys')
+
+
 class Feat(object):
     """Pimped Python property for interfacing with instruments. Can be used as
     a decorator.
@@ -87,6 +208,26 @@ class Feat(object):
                    changed but only tested to belong to the container.
     :param units: `Quantity` or string that can be interpreted as units.
     :param procs: Other callables to be applied to input arguments.
+    :param read_once: if True, the value is read from the instrument only once
+                      and then taken from the cache.
+    :param max_age: maximum age (in seconds) of a cached value to be returned
+                    instead of reading from the instrument. None (default)
+                    means that the instrument is always read.
+    :param history: number of (timestamp, value) pairs to keep for each
+                    instance. None (default) means no history is kept.
+                    Requires numpy.
+    :param deadband: a new value that differs from the cached one less than
+                     this is not sent to the instrument. It can be absolute
+                     (a number in the feat units, or a Quantity) or relative
+                     (a string with a percentage, e.g. '0.5%').
+    :param min_interval: minimum time (in seconds) between writes. A value set
+                         sooner is deferred and written when the interval
+                         has elapsed (only the latest deferred value is written).
+    :param notify: policy to emit the `<name>_changed` signal.
+                   'immediate' (default) emits on every change,
+                   'off' never emits and a number indicates the maximum
+                   rate (in Hz) at which the signal is emitted, coalescing
+                   changes in between (the latest value wins).
 
     """
 
@@ -94,7 +235,8 @@ class Feat(object):
 
     def __init__(self, fget=MISSING, fset=None, doc=None, *,
                  values=None, units=None, limits=None, procs=None,
-                 read_once=False):
+                 read_once=False, max_age=None, history=None, notify='immediate',
+                 deadband=None, min_interval=None):
         self.fget = fget
         self.fset = fset
         self.__doc__ = doc
@@ -103,11 +245,37 @@ class Feat(object):
         #: instance: value
         self.value = WeakKeyDictionary()
 
+        #: instance: key: monotonic time at which the cached value was seen.
+        self.timestamps = WeakKeyDictionary()
+
+        #: instance: key: RingBuffer
+        self.histories = WeakKeyDictionary()
+        self._keeps_history = False
+
+        #: instance: key: monotonic time of the last write.
+        self._last_set = WeakKeyDictionary()
+        #: instance: key: value waiting for min_interval to elapse.
+        self._deferred = WeakKeyDictionary()
+        self._throttled = False
+
+        #: instance: key: coalesced notification state
+        self._notifications = WeakKeyDictionary()
+        self._notify_lock = threading.Lock()
+        #: function counting the receivers of the changed signal
+        #: (None if the backend cannot count them, MISSING if not known yet).
+        self._receivers = MISSING
+
         #: instance: key: value
         self.modifiers = WeakKeyDictionary()
         self.get_processors = WeakKeyDictionary()
         self.set_processors = WeakKeyDictionary()
 
+        #: instance: key: fused processor pipeline (built on demand)
+        self._get_pipelines = WeakKeyDictionary()
+        self._set_pipelines = WeakKeyDictionary()
+        #: instance: key: _Settings (built on demand)
+        self._settings = WeakKeyDictionary()
+
         # Take documentation from fget or fset
         # if not provided explicitly.
         if self.__doc__ is None:
@@ -119,7 +287,12 @@ class Feat(object):
         self.modifiers[MISSING] = {MISSING: {'values': values,
                                              'units': units,
                                              'limits': limits,
-                                             'processors': procs}}
+                                             'processors': procs,
+                                             'max_age': max_age,
+                                             'history': history,
+                                             'notify': notify,
+                                             'deadband': deadband,
+                                             'min_interval': min_interval}}
         self.get_processors[MISSING] = {MISSING: ()}
         self.set_processors[MISSING] = {MISSING: ()}
 
@@ -136,6 +309,11 @@ class Feat(object):
         limits = modifiers['limits']
         processors = modifiers['processors']
 
+        if modifiers.get('history'):
+            self._keeps_history = True
+        if modifiers.get('deadband') is not None or modifiers.get('min_interval'):
+            self._throttled = True
+
         get_processors = []
         set_processors = []
         if units:
@@ -162,9 +340,58 @@ class Feat(object):
         if store:
             _dset(self.get_processors, get_processors, instance, key)
             _dset(self.set_processors, set_processors, instance, key)
+            self._clear_pipelines(instance)
 
         return get_processors, set_processors
 
+    def _clear_pipelines(self, instance=MISSING):
+        """Invalidate the fused pipelines and settings of an instance,
+        or of all instances if MISSING is given.
+        """
+        if instance is MISSING:
+            self._get_pipelines.clear()
+            self._set_pipelines.clear()
+            self._settings.clear()
+        else:
+            self._get_pipelines.pop(instance, None)
+            self._set_pipelines.pop(instance, None)
+            self._settings.pop(instance, None)
+
+    def _settings_for(self, instance, key=MISSING):
+        """Return the _Settings for (instance, key), building them
+        from the modifiers if necessary.
+        """
+        try:
+            return self._settings[instance][key]
+        except (KeyError, TypeError):
+            pass
+        modifiers = _dget(self.modifiers, instance, key)
+        units = modifiers.get('units')
+        if not isinstance(units, str) and not hasattr(units, 'dimensionality'):
+            # e.g. a tuple of units or a Self object without default.
+            units = None
+        settings = _Settings(modifiers['max_age'], modifiers['notify'], modifiers['history'],
+                             modifiers['deadband'], modifiers['min_interval'],
+                             units, modifiers.get('keys'))
+        if instance is not None:
+            self._settings.setdefault(instance, {})[key] = settings
+        return settings
+
+    def _pipeline(self, pipelines, processors, instance, key, reverse=False):
+        """Return the fused pipeline for (instance, key), building it
+        from the stored processors if necessary.
+        """
+        if instance is None:
+            instance = MISSING
+        try:
+            return pipelines[instance][key]
+        except KeyError:
+            pass
+        procs = _dget(processors, instance, key)
+        pipeline = _compose(reversed(procs) if reverse else procs)
+        pipelines.setdefault(instance, {})[key] = pipeline
+        return pipeline
+
     def __call__(self, func):
         if self.fget is MISSING:
             return self.getter(func)
@@ -194,16 +421,22 @@ class Feat(object):
         return self
 
     def post_get(self, value, instance=None, key=MISSING):
-        for processor in reversed(_dget(self.get_processors, instance, key)):
-            value = processor(value)
-        return value
+        try:
+            pipeline = self._get_pipelines[instance][key]
+        except (KeyError, TypeError):
+            pipeline = self._pipeline(self._get_pipelines, self.get_processors,
+                                      instance, key, reverse=True)
+        return pipeline(value)
 
     def pre_set(self, value, instance=None, key=MISSING):
-        for processor in _dget(self.set_processors, instance, key):
-            value = processor(value)
-        return value
+        try:
+            pipeline = self._set_pipelines[instance][key]
+        except (KeyError, TypeError):
+            pipeline = self._pipeline(self._set_pipelines, self.set_processors,
+                                      instance, key)
+        return pipeline(value)
 
-    def get(self, instance, owner=None, key=MISSING):
+    def get(self, instance, owner=None, key=MISSING, max_age=MISSING):
         if instance is None:
             return self
 
@@ -212,12 +445,16 @@ class Feat(object):
             raise AttributeError('{} is a write-only feature'.format(name))
 
         current = self.get_cache(instance, key)
-        if self.read_once and current is not MISSING:
-            return current
+        if current is not MISSING:
+            if max_age is MISSING:
+                max_age = self._settings_for(instance, key).max_age
+            if self.read_once or (max_age is not None and self.cache_age(instance, key) <= max_age):
+                instance.counters['cache_hit_get_' + name] += 1
+                return current
 
         # This part calls to the underlying get function wrapping
         # and timing, caching, logging and error handling
-        with instance._lock:
+        with trace.span(instance, 'get', name), instance._lock:
             instance.log_info('Getting {}', name)
 
             try:
@@ -228,6 +465,7 @@ class Feat(object):
                     value = self.fget(instance, key)
             except Exception as e:
                 instance.log_error('While getting {}: {}', name, e)
+                instance.counters['error_get_' + name] += 1
                 raise e
 
             instance.timing.add('get_' + name, time.time() - tic)
@@ -237,6 +475,7 @@ class Feat(object):
                 value = self.post_get(value, instance, key)
             except Exception as e:
                 instance.log_error('While post-processing {} for {}: {}', value, name, e)
+                instance.counters['error_get_' + name] += 1
                 raise e
 
             instance.log_info('Got {} for {}', value, name, lantz_feat=(name, str(value)))
@@ -251,21 +490,42 @@ class Feat(object):
         if self.fset is None:
             raise AttributeError('{} is a read-only feature'.format(name))
 
+        batches = getattr(instance, '_batches', None)
+        if batches and threading.get_ident() in batches:
+            batches[threading.get_ident()].add(self, key, value, force)
+            return
+
         # This part calls to the underlying get function wrapping
         # and timing, caching, logging and error handling
-        with instance._lock:
+        with trace.span(instance, 'set', name, value), instance._lock:
             current_value = self.get_cache(instance, key)
-            if not force and value == current_value:
-                instance.log_info('No need to set {} = {} (current={}, force={})', name, value, current_value, force)
+            if self._unchanged(instance, name, value, current_value, force, key):
+                if self._throttled:
+                    # A deferred value is older than this one.
+                    self._deferred.get(instance, {}).pop(key, None)
                 return
 
+            if self._throttled and not force:
+                min_interval = self._settings_for(instance, key).min_interval
+            else:
+                min_interval = None
+
             instance.log_info('Setting {} = {} (current={}, force={})', name, value, current_value, force)
 
             try:
                 t_value = self.pre_set(value, instance, key)
             except Exception as e:
                 instance.log_error('While pre-processing {} for {}: {}', value, name, e)
+                instance.counters['error_set_' + name] += 1
                 raise e
+
+            if min_interval:
+                wait = min_interval - (time.monotonic() - self._last_set.get(instance, {}).get(key, float('-inf')))
+                if wait > 0:
+                    self._defer(instance, key, value, wait)
+                    instance.log_info('Deferred setting {} = {} by {:.3f} s (min_interval={})', name, value, wait, min_interval)
+                    return
+
             instance.log_debug('(raw) Setting {} = {}', name, t_value)
 
             try:
@@ -276,14 +536,61 @@ class Feat(object):
                     self.fset(instance, key, t_value)
             except Exception as e:
                 instance.log_error('While setting {} to {}. {}', name, value, e)
+                instance.counters['error_set_' + name] += 1
                 raise e
 
             instance.timing.add('set_' + name, time.time() - tic)
 
             instance.log_info('{} was set to {}', name, value, lantz_feat=(name, str(value)))
 
+            if self._throttled:
+                self._last_set.setdefault(instance, {})[key] = time.monotonic()
+                self._deferred.get(instance, {}).pop(key, None)
+
             self.set_cache(instance, value, key)
 
+    def _unchanged(self, instance, name, value, current_value, force, key=MISSING):
+        """Return True (and log it) if the cache indicates that setting
+        the value is not necessary, either because it is equal to the current
+        one or within the deadband.
+        """
+        if force:
+            return False
+        if _equal(value, current_value):
+            instance.log_info('No need to set {} = {} (current={}, force={})', name, value, current_value, force)
+            return True
+        if self._throttled:
+            settings = self._settings_for(instance, key)
+            deadband = settings.deadband
+            if deadband is not None and _within_deadband(value, current_value, deadband, settings.units):
+                instance.log_info('No need to set {} = {} (current={}, deadband={})', name, value, current_value, deadband)
+                return True
+        return False
+
+    def _defer(self, instance, key, value, wait):
+        """Store value to be written after wait seconds, scheduling the write
+        if not already scheduled. Must be called with the instance lock acquired.
+        """
+        deferred = self._deferred.setdefault(instance, {})
+        scheduled = key in deferred
+        deferred[key] = value
+        if not scheduled:
+            timer = threading.Timer(wait, self._set_deferred, (instance, key))
+            timer.daemon = True
+            timer.start()
+
+    def _set_deferred(self, instance, key):
+        with instance._lock:
+            try:
+                value = self._deferred[instance].pop(key)
+            except KeyError:
+                return
+            try:
+                self.set(instance, value, key=key)
+            except Exception:
+                # Already logged by set.
+                pass
+
     def __get__(self, instance, owner=None):
         return self.get(instance)
 
@@ -299,18 +606,116 @@ class Feat(object):
         except KeyError:
             return MISSING
 
+    def cache_age(self, instance, key=MISSING):
+        """Return the time in seconds since the cached value was last
+        read from or written to the instrument (inf if never).
+        """
+        try:
+            return time.monotonic() - self.timestamps[instance][key]
+        except KeyError:
+            return float('inf')
+
+    def _stamp(self, instance, key=MISSING):
+        self.timestamps.setdefault(instance, {})[key] = time.monotonic()
+
+    def _record(self, instance, value, key=MISSING):
+        """Append value to the history buffer of (instance, key)
+        if the history modifier is set.
+        """
+        size = self._settings_for(instance, key).history
+        buffers = self.histories.setdefault(instance, {})
+        buffer = buffers.get(key)
+        if not size:
+            if buffer is not None:
+                del buffers[key]
+            return
+        if buffer is None:
+            from .history import RingBuffer
+            buffer = buffers[key] = RingBuffer(size)
+        elif buffer.size != size:
+            buffer = buffers[key] = buffer.resized(size)
+        buffer.append(time.time(), value)
+
+    def history(self, instance, key=MISSING):
+        """Return the recorded history for an instance.
+
+        :return: (timestamps, values) numpy views in chronological order.
+        """
+        try:
+            buffer = self.histories[instance][key]
+        except KeyError:
+            raise ValueError('No history recorded for {}. '
+                             'Use the history modifier to enable it.'.format(self.name))
+        return buffer.view()
+
     def set_cache(self, instance, value, key=MISSING):
         old_value = self.get_cache(instance, key)
 
-        if value == old_value:
+        self._stamp(instance, key)
+        if self._keeps_history:
+            self._record(instance, value, key)
+
+        if _equal(value, old_value):
             return
 
-        if isinstance(value, Q_):
+        if isinstance(value, lantz_units.Q_):
             value = copy.copy(value)
 
         self.value[instance] = value
 
-        getattr(instance, self.name + '_changed').emit(value, old_value)
+        self._notify(instance, key, value, old_value)
+
+    def _notify(self, instance, key, *args):
+        """Emit the changed signal according to the notify modifier.
+        """
+        policy = self._settings_for(instance, key).notify
+        if not policy or policy == 'off':
+            return
+
+        signal = getattr(instance, self.name + '_changed')
+        if not self._has_receivers(instance, signal):
+            return
+
+        if policy == 'immediate':
+            signal.emit(*args)
+            return
+
+        period = 1. / policy
+        with self._notify_lock:
+            state = self._notifications.setdefault(instance, {}).setdefault(key, [float('-inf'), None])
+            last, pending = state
+            if pending is not None:
+                # A delayed emission is scheduled, replace the new value
+                # but keep the old value of the first coalesced change.
+                state[1] = (args[0], pending[1]) + args[2:]
+                return
+            now = time.monotonic()
+            if now - last < period:
+                state[1] = args
+                timer = threading.Timer(period - (now - last), self._flush, (instance, key, signal))
+                timer.daemon = True
+                timer.start()
+                return
+            state[0] = now
+
+        signal.emit(*args)
+
+    def _has_receivers(self, instance, signal):
+        """Return False if it is known that nothing is connected to the signal.
+        """
+        counter = self._receivers
+        if counter is MISSING:
+            counter = self._receivers = _receivers_counter(instance, signal, self.name + '_changed')
+        return counter is None or counter(instance, signal) > 0
+
+    def _flush(self, instance, key, signal):
+        with self._notify_lock:
+            state = self._notifications[instance][key]
+            args = state[1]
+            state[0] = time.monotonic()
+            state[1] = None
+        if args is not None:
+            signal.emit(*args)
 
 
 class DictFeat(Feat):
@@ -320,35 +725,227 @@ class DictFeat(Feat):
     Takes the same parameters as `Feat`, plus:
 
     :param keys: List/tuple restricts the keys to the specified ones.
+    :param fget_many: getter function for several keys at once. It takes
+                      a list of keys and returns a sequence of values in the
+                      same order (or a dict mapping keys to values).
+    :param fset_many: setter function for several keys at once. It takes
+                      a dict mapping keys to values.
 
     """
 
     def __init__(self, fget=MISSING, fset=None, doc=None, *,
-                 keys=None, **kwargs):
+                 keys=None, fget_many=None, fset_many=None, **kwargs):
         super().__init__(fget, fset, doc, **kwargs)
         self.modifiers[MISSING][MISSING]['keys'] = keys
+        self.fget_many = fget_many
+        self.fset_many = fset_many
 
+    def getter_many(self, func):
+        self.fget_many = func
+        return self
+
+    def setter_many(self, func):
+        self.fset_many = func
+        return self
 
-    def getitem(self, instance, key):
-        keys = _dget(self.modifiers, instance, key)['keys']
+    def _check_key(self, instance, key):
+        """Validate a key and return the one that is sent to the instrument.
+        """
+        keys = self._settings_for(instance, key).keys
         if keys and not key in keys:
             raise KeyError('{} is not valid key for {} {}'.format(key, self.name,
                                                                     keys))
         if isinstance(keys, dict):
             key = keys[key]
+        return key
 
-        return self.get(instance, instance.__class__, key)
+    def getitem(self, instance, key, max_age=MISSING):
+        key = self._check_key(instance, key)
+        return self.get(instance, instance.__class__, key, max_age)
 
     def setitem(self, instance, key, value, force=False):
-        keys = _dget(self.modifiers, instance, key)['keys']
-        if keys and not key in keys:
-            raise KeyError('{} is not valid key for {} {}'.format(key, self.name,
-                                                                    keys))
-        if isinstance(keys, dict):
-            key = keys[key]
-
+        key = self._check_key(instance, key)
         self.set(instance, value, force, key)
 
+    def history(self, instance, key=MISSING):
+        return super().history(instance, self._check_key(instance, key))
+
+    def get_many(self, instance, keys, max_age=MISSING):
+        """Get the values for several keys, using `fget_many` (if available)
+        to read all of them from the instrument in a single call.
+
+        Cached values are honored as in `get` (read_once and max_age).
+
+        :param keys: iterable of keys.
+        :return: dict mapping each key to its value.
+        """
+        keys = list(keys)
+        mapped = [self._check_key(instance, key) for key in keys]
+
+        if self.fget_many is None:
+            with instance._lock:
+                return {key: self.get(instance, instance.__class__, ikey, max_age)
+                        for key, ikey in zip(keys, mapped)}
+
+        if self.fget is None or self.fget is MISSING:
+            raise AttributeError('{} is a write-only feature'.format(self.name))
+
+        out = {}
+        pending = []
+        for key, ikey in zip(keys, mapped):
+            current = self.get_cache(instance, ikey)
+            if current is not MISSING:
+                age = max_age
+                if age is MISSING:
+                    age = self._settings_for(instance, ikey).max_age
+                if self.read_once or (age is not None and self.cache_age(instance, ikey) <= age):
+                    instance.counters['cache_hit_get_{}[{!r}]'.format(self.name, ikey)] += 1
+                    out[ikey] = current
+                    continue
+            if ikey not in pending:
+                pending.append(ikey)
+
+        if pending:
+            name = '{}{!r}'.format(self.name, pending)
+            with trace.span(instance, 'get', name), instance._lock:
+                instance.log_info('Getting {}', name)
+
+                try:
+                    tic = time.time()
+                    values = self.fget_many(instance, pending)
+                except Exception as e:
+                    instance.log_error('While getting {}: {}', name, e)
+                    for ikey in pending:
+                        instance.counters['error_get_{}[{!r}]'.format(self.name, ikey)] += 1
+                    raise e
+
+                elapsed = (time.time() - tic) / len(pending)
+
+                instance.log_debug('(raw) Got {} for {}', values, name)
+
+                try:
+                    values = self._check_many(pending, values)
+                except ValueError as e:
+                    instance.log_error('While getting {}: {}', name, e)
+                    for ikey in pending:
+                        instance.counters['error_get_{}[{!r}]'.format(self.name, ikey)] += 1
+                    raise e
+
+                for ikey in pending:
+                    iname = '{}[{!r}]'.format(self.name, ikey)
+                    instance.timing.add('get_' + iname, elapsed)
+                    try:
+                        value = self.post_get(values[ikey], instance, ikey)
+                    except Exception as e:
+                        instance.log_error('While post-processing {} for {}: {}', values.get(ikey), iname, e)
+                        instance.counters['error_get_' + iname] += 1
+                        raise e
+                    instance.log_info('Got {} for {}', value, iname, lantz_feat=(iname, str(value)))
+                    self.set_cache(instance, value, ikey)
+                    out[ikey] = value
+
+        return {key: out[ikey] for key, ikey in zip(keys, mapped)}
+
+    def _check_many(self, keys, values):
+        """Return the values returned by fget_many as a dict, checking that
+        there is one for each requested key.
+
+        :raises ValueError: if a value is missing or the number of values
+                            does not match the number of keys.
+        """
+        if isinstance(values, dict):
+            missing = [key for key in keys if key not in values]
+            if missing:
+                raise ValueError('The getter of {} did not return a value for {!r}'.format(self.name, missing))
+            return values
+        values = list(values)
+        if len(values) != len(keys):
+            raise ValueError('The getter of {} returned {} values for {} keys'.format(self.name, len(values), len(keys)))
+        return dict(zip(keys, values))
+
+    def set_many(self, instance, mapping, force=False):
+        """Set the values for several keys, using `fset_many` (if available)
+        to write all of them to the instrument in a single call.
+
+        Keys for which the cache indicates that no change is needed are
+        skipped (unless force is True). Keys set less than `min_interval`
+        ago are deferred as in `set`.
+
+        :param mapping: dict mapping keys to values.
+        """
+        if self.fset is None:
+            raise AttributeError('{} is a read-only feature'.format(self.name))
+
+        mapped = [(self._check_key(instance, key), value)
+                  for key, value in mapping.items()]
+
+        batches = getattr(instance, '_batches', None)
+        if self.fset_many is None or (batches and threading.get_ident() in batches):
+            with instance._lock:
+                for ikey, value in mapped:
+                    self.set(instance, value, force, ikey)
+            return
+
+        with trace.span(instance, 'set', self.name, mapping), instance._lock:
+            values = {}
+            raw = {}
+            for ikey, value in mapped:
+                iname = '{}[{!r}]'.format(self.name, ikey)
+                current_value = self.get_cache(instance, ikey)
+                if self._unchanged(instance, iname, value, current_value, force, ikey):
+                    if self._throttled:
+                        self._deferred.get(instance, {}).pop(ikey, None)
+                    continue
+
+                instance.log_info('Setting {} = {} (current={}, force={})', iname, value, current_value, force)
+
+                try:
+                    raw[ikey] = self.pre_set(value, instance, ikey)
+                except Exception as e:
+                    instance.log_error('While pre-processing {} for {}: {}', value, iname, e)
+                    instance.counters['error_set_' + iname] += 1
+                    raise e
+
+                if self._throttled and not force:
+                    min_interval = self._settings_for(instance, ikey).min_interval
+                    if min_interval:
+                        wait = min_interval - (time.monotonic() -
+                                               self._last_set.get(instance, {}).get(ikey, float('-inf')))
+                        if wait > 0:
+                            del raw[ikey]
+                            self._defer(instance, ikey, value, wait)
+                            instance.log_info('Deferred setting {} = {} by {:.3f} s (min_interval={})',
+                                              iname, value, wait, min_interval)
+                            continue
+
+                values[ikey] = value
+
+            if not raw:
+                return
+
+            name = '{}{!r}'.format(self.name, list(raw.keys()))
+            instance.log_debug('(raw) Setting {} = {}', name, raw)
+
+            try:
+                tic = time.time()
+                self.fset_many(instance, raw)
+            except Exception as e:
+                instance.log_error('While setting {} to {}. {}', name, values, e)
+                for ikey in raw:
+                    instance.counters['error_set_{}[{!r}]'.format(self.name, ikey)] += 1
+                raise e
+
+            elapsed = (time.time() - tic) / len(raw)
+
+            for ikey, value in values.items():
+                iname = '{}[{!r}]'.format(self.name, ikey)
+                instance.timing.add('set_' + iname, elapsed)
+                instance.log_info('{} was set to {}', iname, value, lantz_feat=(iname, str(value)))
+                if self._throttled:
+                    self._last_set.setdefault(instance, {})[ikey] = time.monotonic()
+                    self._deferred.get(instance, {}).pop(ikey, None)
+                self.set_cache(instance, value, ikey)
+
     def __get__(self, instance, owner=None):
         if not instance:
             return self
@@ -360,19 +957,18 @@ class DictFeat(Feat):
                                  'You probably want to do something like:'
                                  'obj.prop[index] = value or obj.prop = dict')
 
-        for key, value in value.items():
-            self.setitem(instance, key, value)
+        self.set_many(instance, value)
 
     def __delete__(self, instance):
         raise AttributeError('{} is a permanent attribute from {}', self.name, instance.__class__.__name__)
 
     def get_cache(self, instance, key=MISSING):
-        keys = _dget(self.modifiers, instance, key)['keys']
+        keys = self._settings_for(instance, key).keys
         if instance not in self.value:
             self.value[instance] = dict()
         if isinstance(keys, dict):
             keys = keys.values()
-        if keys and key not in keys:
+        if key is not MISSING and keys and key not in keys:
             raise KeyError('{} is not valid key for {} {}'.format(key, self.name,
                                                                   keys))
         if key is MISSING:
@@ -383,7 +979,17 @@ class DictFeat(Feat):
     def set_cache(self, instance, value, key=MISSING):
         old_value = self.get_cache(instance, key)
 
-        if value == old_value:
+        if key is MISSING:
+            for item, item_value in value.items():
+                self._stamp(instance, item)
+                if self._keeps_history:
+                    self._record(instance, item_value, item)
+        else:
+            self._stamp(instance, key)
+            if self._keeps_history:
+                self._record(instance, value, key)
+
+        if _equal(value, old_value):
             return
 
         if key is MISSING:
@@ -392,7 +998,7 @@ class DictFeat(Feat):
         else:
             self.value[instance][key] = value
 
-        getattr(instance, self.name + '_changed').emit(value, old_value, {'key': key})
+        self._notify(instance, key, value, old_value, {'key': key})
 
 
 def _dochelper(feat):
@@ -414,6 +1020,16 @@ def _dochelper(feat):
         doc += ':units: {}\n'.format(modifiers['units'])
     if modifiers['limits']:
         doc += ':limits: {}\n'.format(modifiers['limits'])
+    if modifiers['history']:
+        doc += ':history: {}\n'.format(modifiers['history'])
+    if modifiers['notify'] != 'immediate':
+        doc += ':notify: {}\n'.format(modifiers['notify'])
+    if modifiers['deadband'] is not None:
+        doc += ':deadband: {}\n'.format(modifiers['deadband'])
+    if modifiers['min_interval']:
+        doc += ':min interval: {} s\n'.format(modifiers['min_interval'])
+    if modifiers['max_age'] is not None:
+        doc += ':max age: {} s\n'.format(modifiers['max_age'])
     if modifiers['processors']:
         docpg = []
         docps = []
@@ -483,5 +1099,11 @@ class _DictFeatAccesor(object):
     def __setitem__(self, key, value):
         DictFeat.setitem(self.df, self.instance, key, value)
 
+    def get_many(self, keys):
+        return DictFeat.get_many(self.df, self.instance, keys)
+
+    def set_many(self, mapping, force=False):
+        DictFeat.set_many(self.df, self.instance, mapping, force)
+
     def __repr__(self):
         return repr(self.df.value[self.instance])
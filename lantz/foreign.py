@@ -12,9 +12,22 @@
 import os
 import ctypes
 import inspect
+import weakref
+import threading
+import multiprocessing
 from ctypes.util import find_library
 from itertools import chain
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from lantz import Driver
 
 
@@ -166,33 +179,338 @@ class RetTuple(object):
         return tuple(self.buffer[:])
 
 
+class RetArray(object):
+    """Output array for bulk data (e.g. camera frames or acquired samples).
+
+    The buffer is allocated in shared memory, so when the library runs in a
+    worker process (see LibraryDriver `isolated`) the data is written
+    directly where the caller reads it. The same RetArray can be given
+    to several calls to avoid allocating a new buffer each time.
+
+    :param type: type code of the elements (see TYPES).
+    :param length: number of elements.
+    """
+
+    def __init__(self, type, length):
+        try:
+            ctype = TYPES[type]
+        except KeyError:
+            raise KeyError('The type {} is not defined ()'.format(type, TYPES.keys()))
+        self.type = type
+        self.length = length
+        self.shm = shared_memory.SharedMemory(create=True, size=max(ctypes.sizeof(ctype) * length, 1))
+        self.buffer = _shared_array(self.shm, type, length)
+        _SHARED[id(self.buffer)] = self
+        weakref.finalize(self.buffer, _release_shared, self.shm)
+
+    def __iter__(self):
+        yield self
+        yield self.length
+
+    @property
+    def value(self):
+        """The buffer as a numpy array (or a memoryview if numpy
+        is not available) sharing its memory.
+        """
+        if np is not None:
+            return np.ctypeslib.as_array(self.buffer)
+        return memoryview(self.buffer)
+
+
+#: id(buffer): RetArray, to send shared buffers by name to worker processes.
+_SHARED = weakref.WeakValueDictionary()
+
+
+def _shared_array(shm, type, length):
+    """Return a ctypes array using the memory of a SharedMemory.
+
+    The array is created from the address (instead of using from_buffer)
+    so that the shared memory can be closed without waiting for the
+    array to be garbage collected.
+    """
+    view = ctypes.c_char.from_buffer(shm.buf)
+    address = ctypes.addressof(view)
+    del view
+    buffer = (TYPES[type] * length).from_address(address)
+    # Keeps the memory mapped while the array is alive.
+    buffer._shm = shm
+    return buffer
+
+
+def _release_shared(shm):
+    shm.close()
+    shm.unlink()
+
+
+def _attach_shared(name, type, length):
+    shm = shared_memory.SharedMemory(name)
+    return shm, _shared_array(shm, type, length)
+
+
+def _encode_type(ctype):
+    """Return a picklable description of a ctypes type.
+
+    Pointer and array types (e.g. POINTER(c_int), c_double * 3) are
+    created on demand and cannot be pickled by reference.
+    """
+    if isinstance(ctype, type) and issubclass(ctype, ctypes._Pointer):
+        return ('pointer', _encode_type(ctype._type_))
+    if isinstance(ctype, type) and issubclass(ctype, ctypes.Array):
+        return ('array', _encode_type(ctype._type_), ctype._length_)
+    return ('type', ctype)
+
+
+def _decode_type(description):
+    """Return the ctypes type of a description made by _encode_type.
+    """
+    kind = description[0]
+    if kind == 'pointer':
+        return ctypes.POINTER(_decode_type(description[1]))
+    if kind == 'array':
+        return _decode_type(description[1]) * description[2]
+    return description[1]
+
+
+def _serve(conn):
+    """Load a library and call its functions as requested through
+    a multiprocessing connection. Runs in the worker process of an
+    IsolatedLibrary.
+    """
+    library = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        op = message[0]
+        if op == 'close':
+            break
+        try:
+            if op == 'load':
+                _, names, prefix = message
+                for name in names:
+                    try:
+                        library = Library(name, prefix)
+                        break
+                    except OSError:
+                        pass
+                else:
+                    raise OSError('library not found (tried {})'.format(names))
+                out = name
+
+            elif op == 'set':
+                _, func_name, attr, value = message
+                if attr == 'argtypes' and value is not None:
+                    value = [_decode_type(item) for item in value]
+                elif attr == 'restype':
+                    value = _decode_type(value)
+                setattr(getattr(library, func_name), attr, value)
+                out = None
+
+            elif op == 'call':
+                _, func_name, payload = message
+                args = []
+                attached = []
+                for kind, value in payload:
+                    if kind == 'shared':
+                        shm, buffer = _attach_shared(*value)
+                        attached.append(shm)
+                        args.append(buffer)
+                        del buffer
+                    elif kind == 'buffer':
+                        ctype, length, data = value
+                        args.append((ctype * length).from_buffer_copy(data))
+                    else:
+                        args.append(value)
+
+                ret = getattr(library, func_name)(*args)
+                returned = [bytes(arg) if kind == 'buffer' else None
+                            for (kind, _), arg in zip(payload, args)]
+                del args
+                for shm in attached:
+                    shm.close()
+                out = (ret, returned)
+
+            else:
+                raise ValueError('Unknown operation {!r}'.format(op))
+
+        except Exception as e:
+            try:
+                conn.send(('error', e))
+            except Exception:
+                conn.send(('error', OSError(repr(e))))
+        else:
+            conn.send(('ok', out))
+
+
+class IsolatedFunction(object):
+    """Function of a library loaded in a worker process.
+    """
+
+    def __init__(self, library, name):
+        self.library = library
+        self.name = name
+        self._argtypes = None
+        self._restype = ctypes.c_int
+
+    def __call__(self, *args):
+        return self.library._call(self.name, args)
+
+    @property
+    def argtypes(self):
+        return self._argtypes
+
+    @argtypes.setter
+    def argtypes(self, value):
+        encoded = None if value is None else [_encode_type(item) for item in value]
+        self.library._request('set', self.name, 'argtypes', encoded)
+        self._argtypes = value
+
+    @property
+    def restype(self):
+        return self._restype
+
+    @restype.setter
+    def restype(self, value):
+        self.library._request('set', self.name, 'restype', _encode_type(value))
+        self._restype = value
+
+
+class IsolatedLibrary(object):
+    """Library wrapper that loads the library in a worker process.
+
+    A blocking call only blocks the calling thread, libraries of different
+    instances run in different processes (and therefore in parallel) and a
+    crash of the library does not take down the interpreter.
+
+    Arguments are sent to the worker process by value and ctypes arrays
+    (e.g. RetStr, RetTuple) are copied back after the call. RetArray
+    buffers are in shared memory and are not copied. argtypes and restype
+    can use pointer and array types.
+
+    Each instance has its own worker process, so that libraries
+    that are not thread safe are never called concurrently.
+
+    :param names: names of the library to try in order.
+    :param prefix: prefix of the function names.
+    :param wrapper: callable that takes two arguments the name of the function
+                    and the function itself. It should return a callable.
+    """
+
+    def __init__(self, names, prefix='', wrapper=None):
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn, ),
+                                       name='lantz-library', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._lock = threading.Lock()
+        self.wrapper = wrapper
+        self.prefix = prefix
+        self.library_name = None
+        self.library_name = self._request('load', list(names), prefix)
+
+    def _request(self, *message):
+        with self._lock:
+            try:
+                self._conn.send(message)
+                status, value = self._conn.recv()
+            except (EOFError, OSError):
+                self.process.join(.1)
+                raise OSError('The worker process of {} died (exit code {})'.format(self.library_name or 'the library',
+                                                                                    self.process.exitcode))
+        if status == 'error':
+            raise value
+        return value
+
+    def _call(self, name, args):
+        payload = []
+        for arg in args:
+            shared = _SHARED.get(id(arg))
+            if shared is not None and shared.buffer is arg:
+                payload.append(('shared', (shared.shm.name, shared.type, shared.length)))
+            elif isinstance(arg, ctypes.Array):
+                payload.append(('buffer', (arg._type_, arg._length_, bytes(arg))))
+            else:
+                payload.append(('value', arg))
+
+        ret, returned = self._request('call', name, payload)
+
+        for arg, data in zip(args, returned):
+            if data is not None:
+                ctypes.memmove(arg, data, len(data))
+        return ret
+
+    def __getattr__(self, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+
+        func = IsolatedFunction(self, name)
+
+        if self.wrapper:
+            func = Wrapper(name, func, self.wrapper)
+
+        setattr(self, name, func)
+        return func
+
+    def close(self):
+        """Stop the worker process.
+        """
+        if not self.process.is_alive():
+            return
+        with self._lock:
+            try:
+                self._conn.send(('close', ))
+            except OSError:
+                pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
 class LibraryDriver(Driver):
     """Base class for drivers that communicate with instruments
     calling a library (dll or others)
 
     To use this class you must override LIBRARY_NAME
+
+    If instantiated with isolated=True (or ISOLATED is True), the library is
+    loaded in a worker process (see IsolatedLibrary).
     """
 
     #: Name of the library
     LIBRARY_NAME = ''
     LIBRARY_PREFIX = ''
 
+    #: Load the library in a worker process.
+    ISOLATED = False
+
     def __init__(self, *args, **kwargs):
         library_name = kwargs.pop('library_name', None)
+        isolated = kwargs.pop('isolated', self.ISOLATED)
         super().__init__(*args, **kwargs)
 
         folder = os.path.dirname(inspect.getfile(self.__class__))
-        for name in chain(iter_lib(library_name, folder), iter_lib(self.LIBRARY_NAME, folder)):
-            if name is None:
-                continue
-            self.log_debug('Trying to open library: {}'.format(name))
+        names = [name for name in chain(iter_lib(library_name, folder), iter_lib(self.LIBRARY_NAME, folder))
+                 if name is not None]
+        if isolated:
+            self.log_debug('Trying to open library in a worker process: {}'.format(names))
             try:
-                self.lib = Library(name, self.LIBRARY_PREFIX, self._wrapper)
-                break
+                self.lib = IsolatedLibrary(names, self.LIBRARY_PREFIX, self._wrapper)
             except OSError:
-                pass
+                raise OSError('While instantiating {}: library not found'.format(self.__class__.__name__))
+            weakref.finalize(self, self.lib.close)
+            name = self.lib.library_name
         else:
-            raise OSError('While instantiating {}: library not found'.format(self.__class__.__name__))
+            for name in names:
+                self.log_debug('Trying to open library: {}'.format(name))
+                try:
+                    self.lib = Library(name, self.LIBRARY_PREFIX, self._wrapper)
+                    break
+                except OSError:
+                    pass
+            else:
+                raise OSError('While instantiating {}: library not found'.format(self.__class__.__name__))
 
         self.log_info('LibraryDriver created with {}', name)
         self._add_types()
@@ -208,7 +526,7 @@ class LibraryDriver(Driver):
         new_args = []
         collect = []
         for arg in args:
-            if isinstance(arg, (RetStr, RetTuple, RetValue)):
+            if isinstance(arg, (RetStr, RetTuple, RetValue, RetArray)):
                 collect.append(arg)
                 new_args.append(arg.buffer)
             elif isinstance(arg, str):
@@ -243,7 +561,7 @@ class LibraryDriver(Driver):
 
 def iter_lib(library_name, folder=''):
     if not library_name:
-        raise StopIteration
+        return
     if isinstance(library_name, str):
         if folder:
             yield os.path.join(folder, library_name)
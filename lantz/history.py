@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.history
+    ~~~~~~~~~~~~~
+
+    Implements a preallocated ring buffer to keep the recent history of
+    values of a Feat.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import numpy as np
+
+from . import units as lantz_units
+
+
+class RingBuffer(object):
+    """Fixed size buffer of (timestamp, value) pairs.
+
+    Each sample is written twice (at i and i + size) so that the last
+    `size` samples are always available as a contiguous slice, and therefore
+    can be returned as numpy views without copying.
+
+    Quantities are stored as magnitudes and the units are kept once.
+
+    :param size: maximum number of samples to keep.
+    """
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError('size must be a positive integer, not {}'.format(size))
+        self.size = int(size)
+        self.units = None
+        self._times = np.zeros(2 * self.size)
+        self._values = None
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _dtype(value):
+        """Return the dtype used to store a value.
+
+        Real numbers are stored as float (even if the first one is an int
+        or a bool, so that later values are not truncated), complex numbers
+        as complex and anything else as object.
+        """
+        arr = np.asarray(value)
+        if arr.ndim or arr.dtype.kind not in 'biufc':
+            return np.dtype(object)
+        return np.dtype(complex if arr.dtype.kind == 'c' else float)
+
+    def _allocate(self, value):
+        self._values = np.zeros(2 * self.size, dtype=self._dtype(value))
+
+    def append(self, timestamp, value):
+        """Add a sample to the buffer, overwriting the oldest one if full.
+
+        :param timestamp: time of the sample.
+        :param value: value of the sample.
+        """
+        if isinstance(value, lantz_units.Q_):
+            if self.units is None:
+                self.units = value.units
+            value = value.m_as(self.units)
+
+        if self._values is None:
+            self._allocate(value)
+        elif self._values.dtype != object:
+            dtype = self._dtype(value)
+            if not np.can_cast(dtype, self._values.dtype):
+                # e.g. a complex value in a float buffer.
+                self._values = self._values.astype(np.promote_types(self._values.dtype, dtype))
+
+        ndx = self._next
+        self._times[ndx] = self._times[ndx + self.size] = timestamp
+        self._values[ndx] = self._values[ndx + self.size] = value
+        self._next = (ndx + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def view(self):
+        """Return the stored samples in chronological order.
+
+        :return: (timestamps, values) as numpy views of the internal buffer,
+                 values are wrapped in a Quantity if the units are known.
+        """
+        if self._values is None:
+            return self._times[:0], np.zeros(0)
+        stop = self._next + self.size
+        start = stop - self._count
+        values = self._values[start:stop]
+        if self.units is not None:
+            values = lantz_units.Q_(values, self.units)
+        return self._times[start:stop], values
+
+    def resized(self, size):
+        """Return a new buffer with the given size containing
+        the most recent samples of this one.
+        """
+        new = self.__class__(size)
+        new.units = self.units
+        if self._values is not None:
+            new._values = np.zeros(2 * new.size, dtype=self._values.dtype)
+            stop = self._next + self.size
+            start = stop - min(self._count, new.size)
+            for timestamp, value in zip(self._times[start:stop], self._values[start:stop]):
+                new.append(timestamp, value)
+        return new
+
+    def clear(self):
+        """Remove all samples.
+        """
+        self._next = 0
+        self._count = 0
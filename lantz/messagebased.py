@@ -14,6 +14,7 @@ import types
 
 import visa
 
+from . import trace
 from .errors import NotSupportedError
 from .driver import Driver
 from .log import LOGGER
@@ -29,6 +30,13 @@ _PARSERS_CACHE = {}
 _resource_manager = None
 
 
+def _count(written, command):
+    """Return the number of bytes written, as reported by the resource
+    or estimated from the command.
+    """
+    return written if isinstance(written, int) else len(command)
+
+
 def get_resource_manager():
     """Return the PyVISA Resource Manager, creating an instance if necessary.
 
@@ -73,6 +81,15 @@ class MessageBasedDriver(Driver):
     #: :type: str | list | tuple | None
     MODEL_CODE = None
 
+    #: If not None, the commands written while committing a batch
+    #: (see Driver.batch) are joined with this separator and sent as a
+    #: single message. For example, ';:' for SCPI instruments.
+    #: :type: str | None
+    BATCH_SEPARATOR = None
+
+    #: Commands waiting to be sent while committing a batch.
+    _write_buffer = None
+
     #: Stores a reference to a PyVISA ResourceManager.
     #: :type: visa.ResourceManager
     __resource_manager = None
@@ -284,12 +301,13 @@ class MessageBasedDriver(Driver):
         resource_name = 'GPIB::%s::INSTR' % address
         return cls(resource_name, name, **kwargs)
 
-    def __init__(self, resource_name, name=None, **kwargs):
+    def __init__(self, resource_name, name=None, executor=None, **kwargs):
         """
         :param resource_name: The resource name
         :type resource_name: str
         :params name: easy to remember identifier given to the instance for logging
                       purposes.
+        :params executor: executor in which the asynchronous tasks of this driver run.
         :param kwargs: keyword arguments passed to the resource during initialization.
         """
 
@@ -331,6 +349,33 @@ class MessageBasedDriver(Driver):
         self.resource.close()
         super().finalize()
 
+    def set_batch(self, items):
+        if not self.BATCH_SEPARATOR:
+            return super().set_batch(items)
+
+        self._write_buffer = []
+        try:
+            super().set_batch(items)
+        except Exception:
+            self._write_buffer = None
+            raise
+        self._flush_writes()
+
+    def _join_writes(self, commands):
+        """Return the single message that sends the buffered commands.
+        """
+        return self.BATCH_SEPARATOR.join(commands)
+
+    def _flush_writes(self, keep_buffering=False):
+        """Send the buffered commands as a single message.
+        """
+        buffer, self._write_buffer = self._write_buffer, [] if keep_buffering else None
+        if buffer:
+            command = self._join_writes(buffer)
+            self.log_debug('Writing {!r}', command)
+            with trace.span(self, 'write', 'write', command):
+                trace.add_bytes(_count(self.resource.write(command), command))
+
     def query(self, command, *, send_args=(None, None), recv_args=(None, None)):
         """Send query to the instrument and return the answer
 
@@ -372,8 +417,18 @@ class MessageBasedDriver(Driver):
         :return: number of bytes sent.
 
         """
+        if self._write_buffer is not None:
+            if termination is None and encoding is None:
+                self.log_debug('Buffering {!r}', command)
+                self._write_buffer.append(command)
+                return 0
+            self._flush_writes(keep_buffering=True)
+
         self.log_debug('Writing {!r}', command)
-        return self.resource.write(command, termination, encoding)
+        with trace.span(self, 'write', 'write', command):
+            ret = self.resource.write(command, termination, encoding)
+            trace.add_bytes(_count(ret, command))
+        return ret
 
     def read(self, termination=None, encoding=None):
         """Receive string from instrument.
@@ -383,6 +438,10 @@ class MessageBasedDriver(Driver):
         :param encoding: encoding to transform bytes to string (overrides class default)
         :return: string encoded from received bytes
         """
-        ret =  self.resource.read(termination, encoding)
+        if self._write_buffer:
+            self._flush_writes(keep_buffering=True)
+        with trace.span(self, 'read', 'read'):
+            ret = self.resource.read(termination, encoding)
+            trace.add_bytes(len(ret))
         self.log_debug('Read {!r}', ret)
         return ret
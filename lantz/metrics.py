@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.metrics
+    ~~~~~~~~~~~~~
+
+    Implements a registry of live drivers to export their timing
+    statistics and counters in OpenMetrics/Prometheus text format or JSON.
+
+        >>> server = MetricsServer(('localhost', 8000))
+        >>> server.start()
+
+    makes the metrics of all drivers available at http://localhost:8000/metrics
+    (and http://localhost:8000/metrics.json).
+
+    For each driver member (e.g. get_<feat>, set_<feat>, <action>) the
+    following metrics are exported:
+
+    - lantz_calls_total: number of calls.
+    - lantz_errors_total: number of calls that raised an exception.
+    - lantz_cache_hits_total: number of reads answered by the cache.
+    - lantz_cache_hit_ratio: cache hits / (cache hits + calls).
+    - lantz_latency_seconds: summary with the quantiles 0.5, 0.9, 0.99 and 0.999.
+
+    Other timing categories (e.g. lock wait and hold times, poll lag) are
+    exported with their name as `kind` label.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import json
+import weakref
+import threading
+
+from .stats import stats, percentiles
+
+_DRIVERS = weakref.WeakSet()
+
+#: Prefixes of the timing keys and the corresponding kind, longest first.
+_KINDS = (('poll_missed_', 'poll_missed'),
+          ('poll_lag_', 'poll_lag'),
+          ('lock_wait_', 'lock_wait'),
+          ('lock_hold_', 'lock_hold'),
+          ('get_', 'get'),
+          ('set_', 'set'))
+
+_QUANTILES = (('0.5', 'p50'), ('0.9', 'p90'), ('0.99', 'p99'), ('0.999', 'p999'))
+
+
+def register(driver):
+    """Add a driver to the registry. The registry keeps only a weak
+    reference to the driver. Drivers register themselves on creation.
+    """
+    _DRIVERS.add(driver)
+
+
+def unregister(driver):
+    """Remove a driver from the registry.
+    """
+    _DRIVERS.discard(driver)
+
+
+def drivers():
+    """Return the live drivers in the registry.
+    """
+    return list(_DRIVERS)
+
+
+def _split(driver, key):
+    """Return the (kind, member) corresponding to a timing key.
+    """
+    for prefix, kind in _KINDS:
+        if key.startswith(prefix):
+            return kind, key[len(prefix):]
+    if key in driver._lantz_actions:
+        return 'call', key
+    return 'other', key
+
+
+def collect(instances=None):
+    """Return the metrics of the given drivers.
+
+    :param instances: iterable of drivers. Default None, all registered drivers.
+    :return: a list with a dict for each driver.
+    """
+    out = []
+    for driver in (drivers() if instances is None else instances):
+        members = {}
+
+        def _member(key):
+            kind, member = _split(driver, key)
+            return members.setdefault((kind, member),
+                                      {'kind': kind, 'member': member,
+                                       'count': 0, 'errors': 0, 'cache_hits': 0})
+
+        for key, state in list(driver.timing.items()):
+            item = _member(key)
+            item.update(stats(state)._asdict())
+            item.update(percentiles(state)._asdict())
+            item['sum'] = item['mean'] * item['count']
+
+        for key, value in list(driver.counters.items()):
+            if key.startswith('error_'):
+                _member(key[len('error_'):])['errors'] = value
+            elif key.startswith('cache_hit_'):
+                _member(key[len('cache_hit_'):])['cache_hits'] = value
+
+        for item in members.values():
+            total = item['count'] + item['cache_hits']
+            item['cache_hit_ratio'] = item['cache_hits'] / total if total else 0.
+
+        out.append({'driver': driver.name,
+                    'class': driver.__class__.__name__,
+                    'members': sorted(members.values(), key=lambda item: (item['member'], item['kind']))})
+    return out
+
+
+def render_json(instances=None):
+    """Return the metrics as JSON.
+    """
+    return json.dumps(collect(instances), default=float)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_text(instances=None, openmetrics=False):
+    """Return the metrics in Prometheus text format.
+
+    :param openmetrics: use OpenMetrics text format instead.
+    """
+    collected = collect(instances)
+
+    samples = {'calls': [], 'errors': [], 'cache_hits': [],
+               'cache_hit_ratio': [], 'latency': []}
+    for driver in collected:
+        for item in driver['members']:
+            labels = 'driver="{}",class="{}",member="{}",kind="{}"'.format(
+                _escape(driver['driver']), _escape(driver['class']),
+                _escape(item['member']), _escape(item['kind']))
+            samples['calls'].append((labels, item['count']))
+            samples['errors'].append((labels, item['errors']))
+            if item['kind'] == 'get':
+                samples['cache_hits'].append((labels, item['cache_hits']))
+                samples['cache_hit_ratio'].append((labels, item['cache_hit_ratio']))
+            if item['count']:
+                samples['latency'].append((labels, item))
+
+    lines = []
+
+    def _counter(name, help, values):
+        family = name if openmetrics else name + '_total'
+        lines.append('# HELP {} {}'.format(family, help))
+        lines.append('# TYPE {} counter'.format(family))
+        for labels, value in values:
+            lines.append('{}_total{{{}}} {}'.format(name, labels, value))
+
+    _counter('lantz_calls', 'Number of calls.', samples['calls'])
+    _counter('lantz_errors', 'Number of calls that raised an exception.', samples['errors'])
+    _counter('lantz_cache_hits', 'Number of reads answered by the cache.', samples['cache_hits'])
+
+    lines.append('# HELP lantz_cache_hit_ratio Fraction of reads answered by the cache.')
+    lines.append('# TYPE lantz_cache_hit_ratio gauge')
+    for labels, value in samples['cache_hit_ratio']:
+        lines.append('lantz_cache_hit_ratio{{{}}} {}'.format(labels, value))
+
+    lines.append('# HELP lantz_latency_seconds Time taken by each call.')
+    lines.append('# TYPE lantz_latency_seconds summary')
+    for labels, item in samples['latency']:
+        for quantile, field in _QUANTILES:
+            lines.append('lantz_latency_seconds{{{},quantile="{}"}} {}'.format(labels, quantile, item[field]))
+        lines.append('lantz_latency_seconds_sum{{{}}} {}'.format(labels, item['sum']))
+        lines.append('lantz_latency_seconds_count{{{}}} {}'.format(labels, item['count']))
+
+    if openmetrics:
+        lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def _make_server(address):
+    """Return a threading HTTP server for the metrics.
+    http.server is slow to import and only needed to serve.
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+    class _Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/metrics':
+                if 'application/openmetrics-text' in self.headers.get('Accept', ''):
+                    body = render_text(openmetrics=True)
+                    content_type = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+                else:
+                    body = render_text()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif path == '/metrics.json':
+                body = render_json()
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+
+            body = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class _HTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    return _HTTPServer(tuple(address), _Handler)
+
+
+class MetricsServer(object):
+    """Serve the metrics of all registered drivers over HTTP
+    in a background thread.
+
+    :param address: (host, port) tuple. Use port 0 to pick a free port.
+    """
+
+    def __init__(self, address=('localhost', 0)):
+        self._server = _make_server(address)
+        self._thread = None
+
+    @property
+    def address(self):
+        """Address in which the server is listening.
+        """
+        return self._server.server_address
+
+    def start(self):
+        """Serve in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name='lantz-metrics')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def shutdown(self):
+        """Stop serving and close the socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.poller
+    ~~~~~~~~~~~~
+
+    Implements a scheduler to periodically read feats from multiple drivers.
+
+    Requests for the same feat are merged, each driver is polled sequentially
+    (as it would be anyway due to its lock) while different drivers are
+    polled in parallel.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from concurrent import futures
+
+from .feat import MISSING, DictFeat
+
+
+class Subscription(object):
+    """A request to poll a feat at a given rate.
+
+    :param job: the job that polls the feat.
+    :param rate: polling rate in Hz.
+    :param priority: higher values are polled first when several
+                     feats are due at the same time.
+    :param callback: called with the value after each read.
+    """
+
+    def __init__(self, job, rate, priority, callback):
+        self.job = job
+        self.rate = rate
+        self.priority = priority
+        self.callback = callback
+
+
+class _Job(object):
+    """Polls a (driver, feat, key) with the merged rate and priority
+    of all its subscriptions.
+    """
+
+    def __init__(self, driver, feat_name, key):
+        self.driver = driver
+        self.feat_name = feat_name
+        self.key = key
+        self.feat = driver._lantz_features[feat_name]
+        self.name = feat_name if key is MISSING else '{}[{!r}]'.format(feat_name, key)
+        self.subscriptions = []
+        self.deadline = 0.
+        self.period = 0.
+        self.priority = 0
+
+    def update(self):
+        self.period = 1. / max(sub.rate for sub in self.subscriptions)
+        self.priority = max(sub.priority for sub in self.subscriptions)
+
+    def read(self):
+        if isinstance(self.feat, DictFeat):
+            return self.feat.getitem(self.driver, self.key)
+        return self.feat.get(self.driver)
+
+
+class Poller(object):
+    """Periodically read feats from drivers.
+
+        >>> poller = Poller()
+        >>> poller.register(fungen, 'frequency', rate=10)
+        >>> poller.register(voltmeter, 'voltage', rate=100, priority=1)
+        >>> poller.start()
+
+    Values are delivered through the usual `<feat>_changed` signals or
+    the callback given to `register`. For each polled feat, the delay between
+    the scheduled and the actual time of the read is added to
+    `driver.timing` as `poll_lag_<feat>` and missed deadlines (reads delayed
+    more than a full period) as `poll_missed_<feat>`.
+
+    :param max_workers: maximum number of drivers polled simultaneously.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or 8
+        self._executor = None
+        self._jobs = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        #: driver: deque of jobs ready to be polled
+        self._ready = {}
+        #: drivers being polled
+        self._busy = set()
+
+    def register(self, driver, feat_name, rate, priority=0, key=MISSING, callback=None):
+        """Register a feat to be polled.
+
+        :param driver: driver instance.
+        :param feat_name: name of the feat.
+        :param rate: polling rate in Hz.
+        :param priority: higher values are polled first when several
+                         feats are due at the same time.
+        :param key: key to poll (only for DictFeat).
+        :param callback: called with the value after each read.
+        :return: a Subscription that can be used to unregister.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive, not {}'.format(rate))
+        if feat_name not in driver._lantz_features:
+            raise KeyError('{} is not a feat of {}'.format(feat_name, driver))
+
+        with self._condition:
+            job_key = (driver, feat_name, key)
+            job = self._jobs.get(job_key)
+            new = job is None
+            if new:
+                job = self._jobs[job_key] = _Job(driver, feat_name, key)
+            subscription = Subscription(job, rate, priority, callback)
+            job.subscriptions.append(subscription)
+            job.update()
+            if new:
+                job.deadline = time.monotonic()
+                self._push(job)
+            self._condition.notify()
+
+        return subscription
+
+    def unregister(self, subscription):
+        """Remove a subscription. The feat is no longer polled
+        if it has no more subscriptions.
+        """
+        with self._condition:
+            job = subscription.job
+            job.subscriptions.remove(subscription)
+            if job.subscriptions:
+                job.update()
+            else:
+                del self._jobs[(job.driver, job.feat_name, job.key)]
+
+    @property
+    def subscriptions(self):
+        return [sub for job in self._jobs.values() for sub in job.subscriptions]
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.deadline, -job.priority, next(self._counter), job))
+
+    def start(self):
+        """Start polling in a background thread.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            self._thread = threading.Thread(target=self._run, name='lantz-poller')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, wait=True):
+        """Stop polling.
+
+        :param wait: wait for the reads in progress to finish.
+        """
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    job = heapq.heappop(self._heap)[-1]
+                    if self._jobs.get((job.driver, job.feat_name, job.key)) is not job:
+                        continue
+                    self._ready.setdefault(job.driver, deque()).append(job)
+                    self._dispatch(job.driver)
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._condition.wait(timeout)
+
+    def _dispatch(self, driver):
+        """Submit the next ready job of a driver if the driver is idle.
+        Must be called with the condition acquired.
+        """
+        if driver in self._busy:
+            return
+        ready = self._ready.get(driver)
+        while ready:
+            job = max(ready, key=lambda item: (item.priority, -item.deadline))
+            ready.remove(job)
+            # Skip the jobs unregistered while they were waiting.
+            if self._jobs.get((driver, job.feat_name, job.key)) is job:
+                self._busy.add(driver)
+                self._executor.submit(self._poll, job)
+                return
+
+    def _poll(self, job):
+        driver = job.driver
+        start = time.monotonic()
+        lag = start - job.deadline
+        driver.timing.add('poll_lag_' + job.name, lag)
+        if lag > job.period:
+            driver.timing.add('poll_missed_' + job.name, lag)
+
+        try:
+            value = job.read()
+        except Exception as e:
+            driver.log_error('While polling {}: {}', job.name, e)
+        else:
+            for sub in list(job.subscriptions):
+                if sub.callback is not None:
+                    try:
+                        sub.callback(value)
+                    except Exception as e:
+                        driver.log_error('In poll callback for {}: {}', job.name, e)
+        finally:
+            with self._condition:
+                self._busy.discard(driver)
+                if self._jobs.get((driver, job.feat_name, job.key)) is job:
+                    # Keep the phase unless the deadline has been missed.
+                    job.deadline += job.period
+                    now = time.monotonic()
+                    if job.deadline < now:
+                        job.deadline = now
+                    self._push(job)
+                if self._running:
+                    self._dispatch(driver)
+                self._condition.notify()
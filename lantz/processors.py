@@ -7,11 +7,14 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import sys
 import warnings
 
+from stringparser import Parser
+
 from . import Q_
+from . import units as lantz_units
 from .log import LOGGER as _LOG
-from stringparser import Parser
 
 
 class DimensionalityWarning(Warning):
@@ -22,6 +25,24 @@ def _do_nothing(value):
     return value
 
 
+def _is_array(value):
+    """Return True if value is a non-scalar numpy array.
+
+    numpy is slow to import and therefore only looked up: if nobody
+    imported it, value cannot be an array.
+    """
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(value, np.ndarray) and value.ndim > 0
+
+
+def _to_float(value):
+    """Convert a scalar or an array to float.
+    """
+    if _is_array(value):
+        return value.astype(float)
+    return float(value)
+
+
 def _getitem(a, b):
     """Return a[b] or if not found a[type(b)]
     """
@@ -32,6 +53,57 @@ def _getitem(a, b):
 
 getitem = _getitem
 
+
+#: Cache of (factor, offset) to convert between units. None indicates
+#: that the conversion is not affine and must be done by pint.
+#: (source units, target units): (factor, offset) or None
+_CONVERSION_FACTORS = {}
+
+
+def _conversion_factor(source, target):
+    """Return (factor, offset) such that converting a magnitude `m` from
+    `source` units to `target` units is `m * factor + offset`, or None if
+    the conversion cannot be expressed in this way.
+
+    Results are cached for each (source, target) pair.
+
+    :param source: UnitsContainer of the source units.
+    :param target: UnitsContainer of the target units.
+    :raises: DimensionalityError if the units are incompatible.
+    """
+    try:
+        return _CONVERSION_FACTORS[(source, target)]
+    except KeyError:
+        pass
+
+    offset = Q_(0., source).to(target).magnitude
+    factor = Q_(1., source).to(target).magnitude - offset
+    check = Q_(10., source).to(target).magnitude
+    if abs(check - (10. * factor + offset)) > 1e-9 * max(abs(check), 1.):
+        result = None
+    else:
+        result = (factor, offset)
+
+    _CONVERSION_FACTORS[(source, target)] = result
+    return result
+
+
+def _to_magnitude(value, units):
+    """Return the magnitude of quantity `value` expressed in `units`
+    (a UnitsContainer), using cached conversion factors when possible.
+    """
+    # _units is the UnitsContainer, hashable and cheaper than .units
+    source = value._units
+    if source == units:
+        return value.magnitude
+    conversion = _conversion_factor(source, units)
+    if conversion is None:
+        return value.to(units).magnitude
+    factor, offset = conversion
+    if offset:
+        return value.magnitude * factor + offset
+    return value.magnitude * factor
+
 def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                return_float=False):
     """Return a function that convert a Quantity to to another units.
@@ -66,12 +138,16 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
         raise ValueError("{} is not a valid value for 'units'. "
                          "It should be either str or Quantity")
 
+    target = units._units
+    # The registry exists now, so use the Quantity class itself in the hot path.
+    quantity = lantz_units.Q_
+
     if return_float:
         def _inner(value):
-            if isinstance(value, Q_):
+            if isinstance(value, quantity):
                 try:
-                    return value.to(units).magnitude
-                except ValueError as e:
+                    return _to_magnitude(value, target)
+                except (ValueError, lantz_units.DimensionalityError) as e:
                     if on_incompatible == 'raise':
                         raise ValueError(e)
                     elif on_incompatible == 'warn':
@@ -91,14 +167,14 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                         _LOG.warn(msg)
 
                 # on_incompatible == 'ignore'
-                return float(value)
+                return _to_float(value)
         return _inner
     else:
         def _inner(value):
-            if isinstance(value, Q_):
+            if isinstance(value, quantity):
                 try:
-                    return value.to(units)
-                except ValueError as e:
+                    return quantity(_to_magnitude(value, target), target)
+                except (ValueError, lantz_units.DimensionalityError) as e:
                     if on_incompatible == 'raise':
                         raise ValueError(e)
                     elif on_incompatible == 'warn':
@@ -107,7 +183,7 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                         _LOG.warn(msg)
 
                 # on_incompatible == 'ignore'
-                return float(value.magnitude) * units
+                return quantity(_to_float(value.magnitude), target)
             else:
                 if not units.dimensionless:
                     if on_dimensionless == 'raise':
@@ -118,7 +194,7 @@ def convert_to(units, on_dimensionless='warn', on_incompatible='raise',
                         _LOG.warn(msg)
 
                 # on_incompatible == 'ignore'
-                return float(value) * units
+                return quantity(_to_float(value), target)
         return _inner
 
 
@@ -348,8 +424,23 @@ def check_range_and_coerce_step(low, high, step=None):
         >>> checker(1), checker(5.4), checker(10)
         (1, 5, 10)
 
+    numpy arrays are checked and coerced as a whole::
+
+        >>> checker(np.array([1, 5.4, 10]))
+        array([ 1.,  5., 10.])
+
     """
     def _inner(value):
+        if _is_array(value):
+            import numpy as np
+            outside = (value < low) | (value > high)
+            if np.any(outside):
+                raise ValueError('{} values (e.g. {}) not in range ({}, {})'.format(
+                    np.count_nonzero(outside), value[outside][0], low, high))
+            if step:
+                value = np.round((value - low) / step) * step + low
+            return value
+
         if not (low <= value <= high):
             raise ValueError('{} not in range ({}, {})'.format(value, low, high))
         if step:
@@ -376,6 +467,13 @@ def check_membership(container):
     """
 
     def _inner(value):
+        if _is_array(value):
+            import numpy as np
+            invalid = ~np.isin(value, list(container))
+            if np.any(invalid):
+                raise ValueError('{!r} not in {}'.format(value[invalid][0], container))
+            return value
+
         if value not in container:
             raise ValueError('{!r} not in {}'.format(value, container))
         return value
@@ -392,9 +490,24 @@ def get_mapping(container):
         ...
         ValueError: 0 not in ('A', 'B')
 
+    numpy arrays are mapped element-wise, looking up each distinct value once::
+
+        >>> getter(np.array(['A', 'B', 'A']))
+        array([42, 43, 42])
+
     """
 
     def _inner(key):
+        if _is_array(key):
+            import numpy as np
+            unique, inverse = np.unique(key, return_inverse=True)
+            mapped = []
+            for item in unique.tolist():
+                if item not in container:
+                    raise ValueError("{!r} not in {}".format(item, tuple(container.keys())))
+                mapped.append(container[item])
+            return np.asarray(mapped)[inverse].reshape(key.shape)
+
         if key not in container:
             raise ValueError("{!r} not in {}".format(key, tuple(container.keys())))
         return container[key]
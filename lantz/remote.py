@@ -0,0 +1,579 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.remote
+    ~~~~~~~~~~~~
+
+    Implements a server to share a driver among several processes
+    and a proxy driver to use it.
+
+    The server owns the driver (and therefore the instrument) and
+    clients get a proxy driver with the same feats and actions::
+
+        >>> server = DriverServer(fungen, ('localhost', 5678), authkey='secret')
+        >>> server.start()
+
+    and in another process::
+
+        >>> fungen = connect(('localhost', 5678), authkey='secret')
+        >>> fungen.frequency = 10 * kHz
+
+    The cache of the proxy is kept in sync by the server, which pushes
+    every change of a feat of the served driver (`<feat>_changed`) to all
+    clients. Requests are pipelined: a client can send several requests
+    without waiting for the answers, which arrive in order.
+
+    Server and client authenticate each other with a shared key (HMAC
+    challenge and response) before any message is unpickled. The key
+    defaults to the LANTZ_AUTHKEY environment variable. Messages are not
+    encrypted, and the default address is only reachable from the local machine.
+    A string address is interpreted as the path of a Unix domain socket.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import io
+import os
+import hmac
+import time
+import socket
+import struct
+import pickle
+import functools
+import itertools
+import threading
+import socketserver
+from concurrent import futures
+
+from . import Q_
+from .driver import Driver
+from .feat import Feat, DictFeat, MISSING
+from .action import Action
+from .log import get_logger
+
+logger = get_logger('lantz.remote', False)
+
+_HEADER = struct.Struct('!I')
+
+_CHALLENGE_SIZE = 32
+_MAX_HANDSHAKE_SIZE = 256
+_HANDSHAKE_TIMEOUT = 10
+_WELCOME = b'#WELCOME#'
+_FAILURE = b'#FAILURE#'
+
+
+class RemoteError(Exception):
+    """Raised in the client when an exception raised in the server
+    cannot be transferred.
+    """
+
+
+class AuthenticationError(ConnectionError):
+    """Raised when the other end does not know the authentication key.
+    """
+
+
+def _make_quantity(magnitude, units):
+    return Q_(magnitude, units)
+
+
+class _Pickler(pickle.Pickler):
+    """Pickle Quantities by magnitude and units so they are unpickled
+    in the lantz unit registry.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, Q_):
+            return _make_quantity, (obj.magnitude, str(obj.units))
+        return NotImplemented
+
+
+def _dumps(obj):
+    buffer = io.BytesIO()
+    _Pickler(buffer, pickle.HIGHEST_PROTOCOL).dump(obj)
+    data = buffer.getvalue()
+    return _HEADER.pack(len(data)) + data
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv(sock):
+    size, = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return pickle.loads(_recv_exactly(sock, size))
+
+
+def _authkey(authkey):
+    """Return the authentication key as bytes, taken from LANTZ_AUTHKEY if None.
+    """
+    if authkey is None:
+        authkey = os.environ.get('LANTZ_AUTHKEY')
+    if isinstance(authkey, str):
+        authkey = authkey.encode('utf-8')
+    return authkey
+
+
+def _send_bytes(sock, data):
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_bytes(sock):
+    # Used before authentication, so the size is bounded and nothing is unpickled.
+    size, = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if size > _MAX_HANDSHAKE_SIZE:
+        raise AuthenticationError('Handshake message too long ({} bytes)'.format(size))
+    return _recv_exactly(sock, size)
+
+
+def _digest(authkey, message):
+    return hmac.new(authkey, message, 'sha256').digest()
+
+
+def _deliver_challenge(sock, authkey):
+    """Check that the other end knows the key.
+    """
+    message = os.urandom(_CHALLENGE_SIZE)
+    _send_bytes(sock, message)
+    if hmac.compare_digest(_recv_bytes(sock), _digest(authkey, message)):
+        _send_bytes(sock, _WELCOME)
+    else:
+        _send_bytes(sock, _FAILURE)
+        raise AuthenticationError('Digest received was wrong')
+
+
+def _answer_challenge(sock, authkey):
+    """Prove to the other end that we know the key.
+    """
+    message = _recv_bytes(sock)
+    _send_bytes(sock, _digest(authkey, message))
+    if _recv_bytes(sock) != _WELCOME:
+        raise AuthenticationError('Digest sent was rejected')
+
+
+def describe(driver):
+    """Return a description of the feats and actions of a driver
+    to build a proxy.
+    """
+    feats = {}
+    for name, feat in driver._lantz_features.items():
+        keys = driver.feats[name].keys if isinstance(feat, DictFeat) else None
+        feats[name] = {'dict': isinstance(feat, DictFeat),
+                       'readable': feat.fget is not None and feat.fget is not MISSING,
+                       'writable': feat.fset is not None,
+                       'keys': list(keys) if keys else None,
+                       'doc': feat.__doc__}
+    actions = {name: {'args': tuple(action.args[1:]), 'doc': action.__doc__}
+               for name, action in driver._lantz_actions.items()
+               if name not in ('initialize', 'finalize')}
+    return {'class': driver.__class__.__name__,
+            'name': driver.name,
+            'feats': feats,
+            'actions': actions}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves the driver to a client.
+
+    Requests are executed in order in the driver strand and the replies
+    sent as soon as they are ready, so the next request can be read while
+    the previous one is being executed.
+    """
+
+    def setup(self):
+        self.driver = self.server.driver
+        self.send_lock = threading.Lock()
+        self.slots = []
+
+    def connect_slots(self):
+        """Push the changes of the driver to the client.
+        """
+        for name, feat in self.driver._lantz_features.items():
+            keys = self.driver.feats[name].keys if isinstance(feat, DictFeat) else None
+            # The proxy knows the keys of the user, not those sent to the instrument.
+            mapping = {ikey: key for key, ikey in keys.items()} if isinstance(keys, dict) else None
+            slot = self._event_slot(name, mapping)
+            getattr(self.driver, name + '_changed').connect(slot)
+            self.slots.append((name, slot))
+
+    def finish(self):
+        for name, slot in self.slots:
+            try:
+                getattr(self.driver, name + '_changed').disconnect(slot)
+            except Exception:
+                pass
+
+    def _event_slot(self, name, mapping=None):
+        def _inner(new, old, extra=None):
+            extra = dict(extra or {})
+            if mapping is not None and 'key' in extra:
+                extra['key'] = mapping.get(extra['key'], extra['key'])
+            self._send(('event', name, new, old, extra))
+        return _inner
+
+    def _send(self, message):
+        try:
+            data = _dumps(message)
+        except Exception as e:
+            if message[0] != 'reply':
+                logger.error('Could not send {}: {}', message, e)
+                return
+            data = _dumps(('reply', message[1], False, RemoteError(repr(message[3]))))
+        with self.send_lock:
+            try:
+                self.request.sendall(data)
+            except OSError:
+                pass
+
+    def _reply(self, request_id):
+        def _inner(fut):
+            ex = fut.exception()
+            if ex is None:
+                self._send(('reply', request_id, True, fut.result()))
+            else:
+                self._send(('reply', request_id, False, ex))
+        return _inner
+
+    def execute(self, op, args):
+        driver = self.driver
+        if op == 'get':
+            name, key = args
+            feat = driver._lantz_features[name]
+            if key is MISSING:
+                return feat.get(driver)
+            return feat.getitem(driver, key)
+        elif op == 'get_many':
+            name, keys = args
+            return driver._lantz_features[name].get_many(driver, keys)
+        elif op == 'set':
+            name, value, key, force = args
+            feat = driver._lantz_features[name]
+            if key is MISSING:
+                return feat.set(driver, value, force)
+            return feat.setitem(driver, key, value, force)
+        elif op == 'call':
+            name, call_args, call_kwargs = args
+            return driver._lantz_actions[name].call(driver, *call_args, **call_kwargs)
+        raise ValueError('Unknown operation {!r}'.format(op))
+
+    def authenticate(self):
+        """Mutual authentication with the client,
+        before any message is unpickled.
+        """
+        self.request.settimeout(_HANDSHAKE_TIMEOUT)
+        try:
+            _deliver_challenge(self.request, self.server.authkey)
+            _answer_challenge(self.request, self.server.authkey)
+        except (ConnectionError, OSError) as e:
+            logger.warning('Rejected connection from {}: {}', self.client_address, e)
+            return False
+        self.request.settimeout(None)
+        return True
+
+    def handle(self):
+        if not self.authenticate():
+            return
+        self.connect_slots()
+        while True:
+            try:
+                request_id, op, args = _recv(self.request)
+            except (ConnectionError, OSError, EOFError):
+                return
+
+            if op == 'describe':
+                self._send(('reply', request_id, True, describe(self.driver)))
+                continue
+
+            fut = self.driver._submit(self.execute, op, args)
+            fut.add_done_callback(self._reply(request_id))
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None
+
+
+class DriverServer(object):
+    """Serve a driver to other processes.
+
+    :param driver: driver instance to serve. The server does not
+                   initialize or finalize it.
+    :param address: (host, port) tuple for TCP or a path for a Unix
+                    domain socket. Use port 0 to pick a free port.
+    :param authkey: key (bytes or str) that clients must know to connect.
+                    If None, LANTZ_AUTHKEY is used or, if not set,
+                    a random key (see `authkey` attribute).
+    """
+
+    def __init__(self, driver, address=('localhost', 0), authkey=None):
+        #: Key that clients must know to connect.
+        self.authkey = _authkey(authkey) or os.urandom(_CHALLENGE_SIZE)
+        if isinstance(address, str):
+            if _UnixServer is None:
+                raise ValueError('Unix domain sockets are not available in this platform')
+            self._server = _UnixServer(address, _Handler)
+        else:
+            self._server = _TCPServer(tuple(address), _Handler)
+        self._server.driver = driver
+        self._server.authkey = self.authkey
+        self.driver = driver
+        self._thread = None
+
+    @property
+    def address(self):
+        """Address in which the server is listening.
+        """
+        return self._server.server_address
+
+    def serve_forever(self):
+        """Serve until shutdown is called.
+        """
+        self._server.serve_forever()
+
+    def start(self):
+        """Serve in a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='lantz-server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def shutdown(self):
+        """Stop serving and close the socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+class Client(object):
+    """Connection to a DriverServer.
+
+    Requests can be sent without waiting for previous answers (pipelining),
+    each one returns a future.
+
+    :param address: (host, port) tuple for TCP or a path for a Unix domain socket.
+    :param on_event: called with (feat name, new value, old value, extra)
+                     for each change pushed by the server.
+    :param timeout: timeout in seconds to connect.
+    :param authkey: key (bytes or str) of the server. If None, LANTZ_AUTHKEY is used.
+    """
+
+    def __init__(self, address, on_event=None, timeout=None, authkey=None):
+        authkey = _authkey(authkey)
+        if not authkey:
+            raise ValueError('An authentication key is required to connect to {}. '
+                             'Use authkey or set LANTZ_AUTHKEY'.format(address))
+        if isinstance(address, str):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            address = tuple(address)
+        self._socket.settimeout(timeout if timeout is not None else _HANDSHAKE_TIMEOUT)
+        try:
+            self._socket.connect(address)
+            _answer_challenge(self._socket, authkey)
+            _deliver_challenge(self._socket, authkey)
+        except Exception:
+            self._socket.close()
+            raise
+        self._socket.settimeout(None)
+
+        self.address = address
+        self.on_event = on_event
+        self._counter = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._read, name='lantz-client')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, op, *args):
+        """Send a request to the server.
+
+        :rtype: concurrent.futures.Future
+        """
+        fut = futures.Future()
+        with self._lock:
+            if self._closed:
+                raise ConnectionError('Connection to {} is closed'.format(self.address))
+            request_id = next(self._counter)
+            self._pending[request_id] = fut
+            self._socket.sendall(_dumps((request_id, op, args)))
+        return fut
+
+    def _read(self):
+        try:
+            while True:
+                message = _recv(self._socket)
+                if message[0] == 'reply':
+                    _, request_id, ok, value = message
+                    with self._lock:
+                        fut = self._pending.pop(request_id)
+                    if ok:
+                        fut.set_result(value)
+                    else:
+                        fut.set_exception(value)
+                elif self.on_event is not None:
+                    try:
+                        self.on_event(*message[1:])
+                    except Exception as e:
+                        logger.error('While handling event {}: {}', message, e)
+        except (ConnectionError, OSError, EOFError):
+            pass
+        finally:
+            with self._lock:
+                self._closed = True
+                pending, self._pending = self._pending, {}
+            for fut in pending.values():
+                fut.set_exception(ConnectionError('Connection to {} closed'.format(self.address)))
+
+    def close(self):
+        """Close the connection.
+        """
+        with self._lock:
+            self._closed = True
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+        self._thread.join()
+
+
+class _RemoteAction(Action):
+    """Action executed in the served driver.
+    """
+
+    def __init__(self, name, args, doc):
+        super().__init__()
+        self.args = ('self', ) + tuple(args)
+        self.__name__ = name
+        self.__doc__ = doc
+
+    def call(self, instance, *args, **kwargs):
+        name = self.__name__
+        instance.log_info('Calling {} with ({}, {}))', name, args, kwargs)
+        try:
+            tic = time.time()
+            out = instance._client.request('call', name, args, kwargs).result()
+            instance.timing.add(name, time.time() - tic)
+        except Exception as e:
+            instance.log_error('While calling {} with ({}, {}). {}', name, args, kwargs, e)
+            raise e
+        instance.log_info('{} returned {}', name, out)
+        return out
+
+
+def _remote_feat(name, description):
+    if description['dict']:
+        fget = (lambda self, key: self._client.request('get', name, key).result()) \
+            if description['readable'] else None
+        fset = (lambda self, key, value: self._client.request('set', name, value, key, True).result()) \
+            if description['writable'] else None
+        fget_many = (lambda self, keys: self._client.request('get_many', name, keys).result()) \
+            if description['readable'] else None
+        return DictFeat(fget, fset, doc=description['doc'], keys=description['keys'],
+                        fget_many=fget_many)
+
+    fget = (lambda self: self._client.request('get', name, MISSING).result()) \
+        if description['readable'] else None
+    fset = (lambda self, value: self._client.request('set', name, value, MISSING, True).result()) \
+        if description['writable'] else None
+    return Feat(fget, fset, doc=description['doc'])
+
+
+class RemoteDriver(Driver):
+    """Base class of the proxies created by `connect`.
+
+    Values are processed (e.g. units, limits) in the server
+    and the proxy only keeps the cache.
+    """
+
+    def __init__(self, client, name=None):
+        super().__init__()
+        self._client = client
+        client.on_event = self._on_event
+
+    def _on_event(self, name, new, old, extra):
+        feat = self._lantz_features.get(name)
+        if feat is None:
+            return
+        feat.set_cache(self, new, extra.get('key', MISSING))
+
+    def _refresh_plan(self, max_age=None):
+        # All reads are requested at once and then collected.
+        plan = super()._refresh_plan(max_age)
+        requests = []
+        for name, getter in plan:
+            feat = self._lantz_features[name]
+            if getter.func != feat.get or (feat.get_cache(self) is not MISSING and
+                                           max_age is not None and
+                                           feat.cache_age(self) <= max_age):
+                requests.append((name, getter))
+                continue
+            fut = self._client.request('get', name, MISSING)
+            requests.append((name, functools.partial(self._collect, name, fut)))
+        return requests
+
+    def _collect(self, name, fut):
+        value = fut.result()
+        self._lantz_features[name].set_cache(self, value)
+        return value
+
+    def set_batch(self, items):
+        # All writes are requested at once and then waited for.
+        futs = [self._client.request('set', feat.name, value, key, True)
+                for feat, key, value in items]
+        for fut in futs:
+            fut.result()
+
+    @Action()
+    def finalize(self):
+        self._client.close()
+
+
+def connect(address, timeout=None, authkey=None):
+    """Connect to a DriverServer and return a proxy driver.
+
+    :param address: (host, port) tuple for TCP or a path for a Unix domain socket.
+    :param timeout: timeout in seconds to connect.
+    :param authkey: key (bytes or str) of the server. If None, LANTZ_AUTHKEY is used.
+    :rtype: RemoteDriver
+    """
+    client = Client(address, timeout=timeout, authkey=authkey)
+    description = client.request('describe').result()
+
+    class_dict = {'__doc__': 'Proxy of {} served at {}'.format(description['class'], address)}
+    for name, feat_description in description['feats'].items():
+        class_dict[name] = _remote_feat(name, feat_description)
+    for name, action_description in description['actions'].items():
+        class_dict[name] = _RemoteAction(name, action_description['args'],
+                                         action_description['doc'])
+
+    cls = type(description['class'], (RemoteDriver, ), class_dict)
+    return cls(client, name=description['name'])
@@ -3,17 +3,24 @@
     lantz.stats
     ~~~~~~~~~~~
 
-    Implements an statistical accumulator
+    Implements statistical accumulators (cumulative, sliding window and
+    exponentially weighted) and a log bucketed histogram to estimate
+    percentiles with fixed memory.
 
     :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
     :license: BSD, see LICENSE for more details.
 """
 
-from collections import namedtuple
+import math
+import time
+from collections import namedtuple, deque
 
 #: Data structure
 Stats = namedtuple('Stats', 'last count mean std min max')
 
+#: Percentiles 50, 90, 99 and 99.9
+Percentiles = namedtuple('Percentiles', 'p50 p90 p99 p999')
+
 
 def stats(state):
     """Return the statistics for given state.
@@ -27,10 +34,77 @@ def stats(state):
     if not state.count:
         return Stats(0, 0, 0, 0, 0, 0)
 
-    mean = state.sum / state.count
-    std = (float(state.sum2 - 2.0 * state.sum * mean + state.count * mean ** 2.0) / float(state.count)) ** 0.5
     return Stats(state.last, state.count,
-                 mean, std, state.min, state.max)
+                 state.mean, state.variance ** 0.5, state.min, state.max)
+
+
+def percentiles(state):
+    """Return the percentiles for given state.
+
+    :param state: state
+    :type state: RunningState
+    :return: percentiles
+    :rtype: Percentiles named tuple
+    """
+    if not state.count:
+        return Percentiles(0, 0, 0, 0)
+
+    return Percentiles(*(state.percentile(q) for q in (50, 90, 99, 99.9)))
+
+
+class Histogram(object):
+    """Log bucketed histogram (HDR-style) of non negative values.
+
+    Each power of two is divided in `sub_buckets` linear buckets, so values
+    (and percentiles) are known with a relative error smaller than
+    1 / sub_buckets. Only the used buckets are stored, which are bounded by
+    the range of the values (a few hundred for timings from ns to hours).
+
+    :param sub_buckets: number of buckets per power of two.
+    """
+
+    def __init__(self, sub_buckets=32):
+        self.sub_buckets = sub_buckets
+        self.buckets = {}
+        self.count = 0
+
+    def _index(self, value):
+        if value <= 0:
+            return float('-inf')
+        mantissa, exponent = math.frexp(value)
+        return exponent * self.sub_buckets + int((mantissa - .5) * 2 * self.sub_buckets)
+
+    def _value(self, index):
+        """Return the center of a bucket.
+        """
+        if index == float('-inf'):
+            return 0.
+        exponent, sub = divmod(index, self.sub_buckets)
+        return math.ldexp(.5 + (sub + .5) / (2 * self.sub_buckets), exponent)
+
+    def add(self, value):
+        """Add to the histogram.
+
+        :param value: value to be added.
+        """
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def percentile(self, q):
+        """Return the value below which q percent of the values fall.
+
+        :param q: percentile (between 0 and 100).
+        """
+        if not self.count:
+            return 0.
+        threshold = q / 100. * self.count
+        accumulated = 0
+        for index in sorted(self.buckets):
+            accumulated += self.buckets[index]
+            if accumulated >= threshold:
+                return self._value(index)
+        return self._value(index)
 
 
 class RunningState(object):
@@ -40,11 +114,12 @@ class RunningState(object):
     """
 
     def __init__(self, value=None):
+        self.histogram = Histogram()
         if value is not None:
             self.add(value)
 
     def __getattr__(self, key):
-        if key in ('last', 'count', 'sum', 'sum2'):
+        if key in ('last', 'count', 'sum', 'sum2', 'mean', 'm2'):
             return 0
         if key == 'min':
             return float('inf')
@@ -61,14 +136,166 @@ class RunningState(object):
         self.count += 1
         self.sum += value
         self.sum2 += value * value
+        # Welford's algorithm, numerically stable unlike sum2.
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.histogram.add(value)
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0
+
+    def percentile(self, q):
+        """Return the value below which q percent of the values fall.
+        """
+        return min(max(self.histogram.percentile(q), self.min), self.max)
+
+
+class WindowState(object):
+    """Accumulator for the events of the last `window` seconds.
+
+    The values are kept in a ring buffer and the statistics are
+    calculated when requested.
+
+    :param window: length of the window in seconds.
+    :param maxlen: maximum number of events kept.
+    :param value: first value to add.
+    """
+
+    def __init__(self, window, maxlen=10000, value=None):
+        self.window = window
+        self.last = 0
+        self.times = deque(maxlen=maxlen)
+        self.values = deque(maxlen=maxlen)
+        if value is not None:
+            self.add(value)
+
+    def add(self, value):
+        """Add to the accumulator.
+
+        :param value: value to be added.
+        """
+        self.last = value
+        self.times.append(time.monotonic())
+        self.values.append(value)
+
+    def _current(self):
+        cutoff = time.monotonic() - self.window
+        times, values = self.times, self.values
+        while times and times[0] < cutoff:
+            times.popleft()
+            values.popleft()
+        return values
+
+    @property
+    def count(self):
+        return len(self._current())
+
+    @property
+    def mean(self):
+        values = self._current()
+        return sum(values) / len(values) if values else 0
+
+    @property
+    def variance(self):
+        values = self._current()
+        if not values:
+            return 0
+        mean = sum(values) / len(values)
+        return sum((value - mean) ** 2 for value in values) / len(values)
+
+    @property
+    def min(self):
+        return min(self._current(), default=float('inf'))
+
+    @property
+    def max(self):
+        return max(self._current(), default=float('-inf'))
+
+    def percentile(self, q):
+        """Return the value below which q percent of the values fall.
+        """
+        values = sorted(self._current())
+        if not values:
+            return 0
+        return values[max(int(math.ceil(q / 100. * len(values))) - 1, 0)]
+
+
+class EWMAState(object):
+    """Exponentially weighted accumulator, recent events weigh more.
+
+    The mean and variance are updated with Welford's algorithm
+    using a weight `alpha` for each new event. Min and max are
+    calculated over all events and percentiles are not available (nan).
+
+    :param alpha: weight of each new event (0 < alpha <= 1).
+    :param value: first value to add.
+    """
+
+    def __init__(self, alpha, value=None):
+        if not 0 < alpha <= 1:
+            raise ValueError('alpha must be in (0, 1], not {}'.format(alpha))
+        self.alpha = alpha
+        self.last = 0
+        self.count = 0
+        self.mean = 0
+        self.variance = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+        if value is not None:
+            self.add(value)
+
+    def add(self, value):
+        """Add to the accumulator.
+
+        :param value: value to be added.
+        """
+        self.last = value
+        self.count += 1
         self.min = min(self.min, value)
         self.max = max(self.max, value)
+        if self.count == 1:
+            self.mean = value
+            return
+        delta = value - self.mean
+        self.mean += self.alpha * delta
+        self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta * delta)
+
+    def percentile(self, q):
+        return float('nan')
 
 
 class RunningStats(dict):
     """Accumulator for categorized event statistics.
+
+    By default, statistics are calculated over all the events.
+
+    :param window: if given, only the events of the last `window` seconds
+                   are considered.
+    :param alpha: if given, the mean and variance are exponentially
+                  weighted, each new event with a weight alpha.
+    :param maxlen: maximum number of events per category kept for
+                   the window.
     """
 
+    def __init__(self, window=None, alpha=None, maxlen=10000):
+        super().__init__()
+        if window is not None and alpha is not None:
+            raise ValueError('window and alpha cannot be used together')
+        self.window = window
+        self.alpha = alpha
+        self.maxlen = maxlen
+
+    def _new_state(self, value):
+        if self.window is not None:
+            return WindowState(self.window, self.maxlen, value)
+        if self.alpha is not None:
+            return EWMAState(self.alpha, value)
+        return RunningState(value)
+
     def add(self, key, value):
         """Add an event to a given accumulator.
 
@@ -78,7 +305,7 @@ class RunningStats(dict):
         if key in self:
             super().__getitem__(key).add(value)
         else:
-            super().__setitem__(key, RunningState(value))
+            super().__setitem__(key, self._new_state(value))
 
     def stats(self, key):
         """Return the statistics for the current accumulator.
@@ -86,3 +313,33 @@ class RunningStats(dict):
         :rtype: Stats.
         """
         return stats(super().__getitem__(key))
+
+    def percentiles(self, key):
+        """Return the percentiles 50, 90, 99 and 99.9 for the current accumulator.
+
+        :rtype: Percentiles.
+        """
+        return percentiles(super().__getitem__(key))
+
+    def snapshot(self):
+        """Return the statistics and percentiles of all accumulators.
+
+        :return: for each category, a dict with the fields of Stats and Percentiles.
+        :rtype: dict
+        """
+        out = {}
+        for key, state in list(self.items()):
+            item = stats(state)._asdict()
+            item.update(percentiles(state)._asdict())
+            out[key] = item
+        return out
+
+    def reset(self):
+        """Remove all accumulators, returning their snapshot. Useful
+        to report the statistics of consecutive intervals.
+
+        :rtype: dict
+        """
+        out = self.snapshot()
+        self.clear()
+        return out
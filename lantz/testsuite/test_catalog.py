@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+
+import lantz.drivers
+from lantz.drivers import catalog, find
+
+
+class CatalogTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.index = os.path.join(cls.tmp.name, 'catalog.json')
+        cls.catalog = catalog.load(cls.index)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_default_index(self):
+        # The index is not written in the package folder.
+        folder = os.path.dirname(os.path.abspath(lantz.drivers.__file__))
+        self.assertFalse(os.path.abspath(catalog.INDEX).startswith(folder + os.sep))
+
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = os.path.join(tmp, 'catalog.json')
+            built = catalog.load(index)
+            with open(index, encoding='utf-8') as fp:
+                self.assertIn('scpi.py', json.load(fp)['files'])
+            self.assertEqual(catalog.load(index), built)
+            self.assertEqual(catalog.load(index, rebuild=True), built)
+        self.assertEqual(catalog.load(None), built)
+
+        info = {info.name: info for info in built}
+        self.assertNotIn('_Base', info)
+        self.assertIn('idn', info['SCPIDriver'].feats)
+        self.assertIn('self_test', info['SCPIDriver'].actions)
+        self.assertEqual(info['SCPIDriver'].bases, ('IEEE4882Driver', ))
+        self.assertEqual(info['SR830'].interfaces, ('COMMON', ))
+        # Attributes are inherited as in Python.
+        self.assertEqual(info['ArgonInnova300C'].interfaces, ('ASRL', ))
+
+    def test_find(self):
+        def _find(**kwargs):
+            return find(catalog=self.catalog, **kwargs)
+
+        found = _find(idn='Stanford_Research_Systems,SR830,s/n12345,ver1.07')
+        self.assertEqual(found[0].path, 'lantz.drivers.stanford.sr830.SR830')
+        self.assertEqual(_find(idn='TEKTRONIX,TDS 1012,0,CF:91.1CT')[0].name, 'TDS1012')
+
+        found = _find(manufacturer_id='0x699', model_code=0x346)
+        self.assertEqual([info.name for info in found], ['AFG3021b'])
+        found = _find(resource_name='USB0::0x0699::0x0346::C033250::INSTR')
+        self.assertEqual([info.name for info in found], ['AFG3021b'])
+
+        names = [info.name for info in _find(interface='GPIB')]
+        self.assertNotIn('Innova300C', names)
+        self.assertIn('SR830', names)
+        self.assertIn('SCPIDriver', names)
+        self.assertIn('Innova300C', [info.name for info in _find(interface='ASRL')])
+
+        self.assertEqual(_find(idn='ACME,NOTHING,0,0'), [])
+
+    def test_lazy(self):
+        code = ('import sys, lantz.drivers; '
+                'lantz.drivers.find(idn="Stanford_Research_Systems,SR830,0,0"); '
+                'print("lantz.drivers.stanford" in sys.modules, "lantz.drivers.scpi" in sys.modules); '
+                'lantz.drivers.SCPIDriver; '
+                'print("lantz.drivers.scpi" in sys.modules)')
+        env = dict(os.environ, LANTZ_CATALOG=self.index)
+        out = subprocess.check_output([sys.executable, '-c', code], env=env).split()
+        self.assertEqual(out, [b'False', b'False', b'True'])
+
+        from lantz.drivers.scpi import SCPIDriver
+        with mock.patch.object(catalog, '_CATALOG', self.catalog):
+            self.assertIs(lantz.drivers.SCPIDriver, SCPIDriver)
+            self.assertIs(catalog.get('lantz.drivers.scpi.SCPIDriver'), SCPIDriver)
+            self.assertIn('SR830', dir(lantz.drivers))
+            self.assertRaises(AttributeError, getattr, lantz.drivers, 'NotADriver')
+
+
+if __name__ == '__main__':
+    unittest.main()
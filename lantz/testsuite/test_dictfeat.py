@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 
+import time
 import logging
 import unittest
 
@@ -273,6 +274,137 @@ class DictFeatTest(unittest.TestCase):
         self.assertEqual(obj.recall("eggs")[1], 0)
         self.assertEqual(obj2.recall("eggs"), {})
 
+    def test_max_age(self):
+
+        class Spam(Driver):
+
+            def __init__(self_):
+                super().__init__()
+                self_._reads = 0
+
+            @DictFeat(max_age=10)
+            def eggs(self_, key):
+                self_._reads += 1
+                return self_._reads
+
+        obj = Spam()
+        self.assertEqual(obj.eggs[1], 1)
+        self.assertEqual(obj.eggs[1], 1)
+        self.assertEqual(obj.eggs[2], 2)
+        obj.feats.eggs[1].max_age = None
+        self.assertEqual(obj.eggs[1], 3)
+        self.assertEqual(obj.eggs[2], 2)
+        self.assertEqual(obj.recall('eggs', max_age=10), {1: 3, 2: 2})
+        self.assertEqual(obj.recall('eggs', max_age=-1), {})
+
+    def test_get_set_many(self):
+
+        class Ham(Driver):
+
+            def __init__(self_):
+                super().__init__()
+                self_._eggs = {1: 9, 2: 10, 3: 11}
+                self_.calls = []
+
+            @DictFeat(keys={'a': 1, 'b': 2, 'c': 3}, units='ms')
+            def eggs(self_, key):
+                self_.calls.append(('get', key))
+                return self_._eggs[key]
+
+            @eggs.setter
+            def eggs(self_, key, value):
+                self_.calls.append(('set', key))
+                self_._eggs[key] = value
+
+            @eggs.getter_many
+            def eggs(self_, keys):
+                self_.calls.append(('get_many', tuple(keys)))
+                return [self_._eggs[key] for key in keys]
+
+            @eggs.setter_many
+            def eggs(self_, values):
+                self_.calls.append(('set_many', tuple(sorted(values))))
+                self_._eggs.update(values)
+
+        obj = Ham()
+        changed = []
+        obj.eggs_changed.connect(lambda new, old, other: changed.append(other['key']))
+
+        self.assertEqual(obj.eggs.get_many(('a', 'c')),
+                         {'a': Q_(9, 'ms'), 'c': Q_(11, 'ms')})
+        self.assertEqual(obj.calls, [('get_many', (1, 3))])
+        self.assertEqual(sorted(changed), [1, 3])
+        self.assertEqual(obj.timing.stats('get_eggs[1]').count, 1)
+        self.assertEqual(obj.timing.stats('get_eggs[3]').count, 1)
+
+        obj.calls = []
+        obj.eggs.set_many({'a': Q_(9, 'ms'), 'b': Q_(1, 's')})
+        self.assertEqual(obj.calls, [('set_many', (2, ))])
+        self.assertEqual(obj._eggs[2], 1000)
+        self.assertEqual(obj.recall('eggs')[2], Q_(1, 's'))
+
+        obj.calls = []
+        obj.eggs = {'a': Q_(1, 'ms'), 'c': Q_(2, 'ms')}
+        self.assertEqual(obj.calls, [('set_many', (1, 3))])
+        self.assertRaises(KeyError, obj.eggs.get_many, ('a', 'd'))
+
+    def test_get_many_result(self):
+
+        class Ham(Driver):
+
+            values = [1, 2]
+
+            @DictFeat(keys=(1, 2, 3))
+            def eggs(self_, key):
+                return key
+
+            @eggs.getter_many
+            def eggs(self_, keys):
+                return self_.values
+
+        obj = Ham()
+        self.assertRaises(ValueError, obj.eggs.get_many, (1, 2, 3))
+        obj.values = {1: 1, 3: 3}
+        self.assertRaises(ValueError, obj.eggs.get_many, (1, 2, 3))
+        obj.values = {1: 1, 2: 2, 3: 3}
+        self.assertEqual(obj.eggs.get_many((1, 2, 3)), {1: 1, 2: 2, 3: 3})
+
+    def test_set_many_min_interval(self):
+
+        class Ham(Driver):
+
+            def __init__(self_):
+                super().__init__()
+                self_.calls = []
+
+            @DictFeat(keys=(1, 2), min_interval=0.2)
+            def eggs(self_, key):
+                return 0
+
+            @eggs.setter
+            def eggs(self_, key, value):
+                self_.calls.append((key, value))
+
+            @eggs.setter_many
+            def eggs(self_, values):
+                self_.calls.extend(sorted(values.items()))
+
+        obj = Ham()
+        obj.eggs.set_many({1: 1, 2: 1})
+        obj.eggs[1] = 2
+        obj.eggs.set_many({1: 3, 2: 2})
+        self.assertEqual(obj.calls, [(1, 1), (2, 1)])
+
+        time.sleep(0.6)
+        self.assertEqual(sorted(obj.calls[2:]), [(1, 3), (2, 2)])
+        self.assertEqual(obj.recall('eggs'), {1: 3, 2: 2})
+
+        obj.eggs[2] = 3
+        self.assertEqual(obj.calls[-1], (2, 3))
+        obj.eggs.set_many({2: 4})
+        self.assertEqual(obj.calls[-1], (2, 3))
+        time.sleep(0.4)
+        self.assertEqual(obj.calls[-1], (2, 4))
 
     def test_in_instance(self):
 
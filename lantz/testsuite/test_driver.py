@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+import asyncio
 import unittest
-from time import sleep
+import subprocess
+from time import sleep, time
 
-from lantz import Driver, Feat, Action, Q_
-from lantz.driver import Self
+from lantz import Driver, Feat, DictFeat, Action, Q_
+from lantz import initialize_many, finalize_many
+from lantz import ainitialize_many, afinalize_many, refresh_many
+from lantz.driver import Self, InstrumentedLock
+from lantz.utils.headless import Signal, BoundSignal, qt_available
+from lantz.feat import MISSING
 
 SLEEP = .1
 WAIT = .2
@@ -169,6 +177,127 @@ class DriverTest(unittest.TestCase):
         fut = obj.refresh_async({'eggs': None, 'ham': None})
         self.assertEqual(fut.result(), {'eggs': 3, 'ham': 23})
 
+    def test_refresh_plan(self):
+
+        class X(aDriver):
+
+            reads = 0
+
+            @Feat(read_once=True)
+            def serial(self):
+                self.reads += 1
+                return 'S1'
+
+            wo = Feat(None)
+
+            @wo.setter
+            def wo(self, value):
+                pass
+
+            @DictFeat(keys=('a', 'b'))
+            def spam(self, key):
+                raise Exception('should read all keys at once')
+
+            @spam.getter_many
+            def spam(self, keys):
+                self.reads += 1
+                return [key * 2 for key in keys]
+
+        obj = X()
+        obj._eggs = 1
+        seen = []
+        out = obj.refresh(callback=lambda name, value: seen.append(name))
+        self.assertEqual(out, {'eggs': 1, 'ham': None, 'serial': 'S1',
+                               'spam': {'a': 'aa', 'b': 'bb'}})
+        self.assertEqual(sorted(seen), ['eggs', 'ham', 'serial', 'spam'])
+        self.assertEqual(obj.reads, 2)
+        obj.refresh()
+        self.assertEqual(obj.reads, 3)
+
+    def test_refresh_many(self):
+        drivers = [aDriver(True, name='refresh_many{}'.format(n)) for n in range(4)]
+        for n, driver in enumerate(drivers):
+            driver._eggs = n
+        seen = []
+        tic = time()
+        out = refresh_many(drivers, on_value=lambda d, name, value: seen.append((d.name, name)))
+        self.assertLess(time() - tic, 4 * SLEEP)
+        self.assertEqual(out, {driver.name: {'eggs': n, 'ham': None}
+                               for n, driver in enumerate(drivers)})
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(refresh_many(drivers, 'eggs', concurrent=False),
+                         {driver.name: n for n, driver in enumerate(drivers)})
+
+    def test_batch(self):
+
+        class X(aDriver):
+
+            @Feat(limits=(10, ))
+            def volts(self):
+                return self._volts
+
+            @volts.setter
+            def volts(self, value):
+                self._volts = value
+
+            @DictFeat(keys=(1, 2))
+            def channel(self, key):
+                return 0
+
+            @channel.setter
+            def channel(self, key, value):
+                self.written.append(('channel', key, value))
+
+        obj = X()
+        obj.written = []
+        batches = []
+
+        def set_batch(items):
+            batches.append([(feat.name, key, value) for feat, key, value in items])
+            Driver.set_batch(obj, items)
+
+        obj.set_batch = set_batch
+        changed = []
+        obj.eggs_changed.connect(lambda value, old: changed.append(value))
+
+        with obj.batch():
+            obj.eggs = 1
+            obj.volts = 3
+            obj.channel[2] = 4
+            obj.eggs = 2
+            # Nothing is written or cached until the batch is committed.
+            self.assertEqual(obj._eggs, None)
+            self.assertEqual(changed, [])
+        self.assertEqual(batches, [[('eggs', MISSING, 2), ('volts', MISSING, 3), ('channel', 2, 4)]])
+        self.assertEqual(obj._eggs, 2)
+        self.assertEqual(obj.written, [('channel', 2, 4)])
+        self.assertEqual(changed, [2])
+        self.assertEqual(obj.recall('volts'), 3)
+
+        # A value failing validation aborts the whole batch.
+        del batches[:]
+        with self.assertRaises(ValueError):
+            with obj.batch():
+                obj.eggs = 3
+                obj.volts = 20
+        self.assertEqual(batches, [])
+        self.assertEqual(obj._eggs, 2)
+        self.assertEqual(obj.recall('eggs'), 2)
+
+        # So does an exception in the block.
+        with self.assertRaises(KeyError):
+            with obj.batch():
+                obj.eggs = 3
+                raise KeyError
+        self.assertEqual(obj.recall('eggs'), 2)
+
+        # update is transactional and skips unchanged values.
+        obj.update(eggs=2, ham=5, channel={1: 1})
+        self.assertEqual(batches, [[('ham', MISSING, 5), ('channel', 1, 1)]])
+        with self.assertRaises(ValueError):
+            obj.update(ham=6, volts=-1)
+        self.assertEqual(obj._ham, 5)
+
     def test_derived_class(self):
 
         class X(Driver):
@@ -372,6 +501,319 @@ class DriverTest(unittest.TestCase):
         self.assertEqual(x.feats.a_value.units, 'ms')
         self.assertEqual(x.a_value, Q_(1, 'ms'))
 
+    def test_update_Self(self):
+
+        class X(Driver):
+
+            def __init__(self):
+                super().__init__()
+                self.written = []
+
+            level = Feat(None, units=Self.mode('V'))
+
+            @level.setter
+            def level(self, value):
+                self.written.append(('level', value))
+
+            mode = Feat(None)
+
+            @mode.setter
+            def mode(self, value):
+                self.written.append(('mode', value))
+
+        x = X()
+        x.update(level=Q_(2, 'A'), mode='A')
+        self.assertEqual(x.written, [('mode', 'A'), ('level', 2)])
+        x.update(mode='V', level=Q_(3, 'V'))
+        self.assertEqual(x.written[2:], [('mode', 'V'), ('level', 3)])
+        self.assertRaises(ValueError, x.update, level=Q_(4, 'A'))
+
+    def test_snapshot_restore(self):
+
+        import json
+
+        class X(Driver):
+
+            def __init__(self):
+                super().__init__()
+                self.written = []
+                self._units = 's'
+                self._delay = 1
+                self._gain = {'low': 1, 'high': 10}
+
+            @Feat(units=Self.delay_units('s'))
+            def delay(self):
+                return self._delay
+
+            @delay.setter
+            def delay(self, value):
+                self.written.append(('delay', value))
+                self._delay = value
+
+            @Feat()
+            def delay_units(self):
+                return self._units
+
+            @delay_units.setter
+            def delay_units(self, value):
+                self.written.append(('delay_units', value))
+                self._units = value
+
+            @DictFeat(keys={'low': 0, 'high': 1})
+            def gain(self, key):
+                return self._gain[('low', 'high')[key]]
+
+            @gain.setter
+            def gain(self, key, value):
+                self.written.append(('gain', key, value))
+
+            @Feat()
+            def status(self):
+                return 'ok'
+
+        x = X()
+        snap = x.snapshot()
+        self.assertEqual(snap, json.loads(json.dumps(snap)))
+        self.assertEqual(snap['feats'], {'delay': {'magnitude': 1, 'units': 'second'},
+                                         'delay_units': 's'})
+        self.assertEqual(sorted(snap['dictfeats']['gain']), [['high', 10], ['low', 1]])
+
+        # Nothing changed, nothing is written.
+        self.assertEqual(x.restore(snap), {})
+        self.assertEqual(x.written, [])
+
+        snap['feats']['delay_units'] = 'ms'
+        snap['feats']['delay'] = {'magnitude': 3, 'units': 'ms'}
+        snap['dictfeats']['gain'] = [['low', 1], ['high', 5]]
+        changed = x.restore(snap)
+        self.assertEqual(set(changed), {'delay', 'delay_units', 'gain'})
+        self.assertEqual(changed['gain'], {'high': 5})
+        # delay units are set before delay.
+        self.assertEqual(x.written, [('delay_units', 'ms'), ('gain', 1, 5), ('delay', 3)])
+        self.assertEqual(x.recall('delay'), Q_(3, 'ms'))
+
+    def test_asyncio(self):
+
+        class X(aDriver):
+
+            @DictFeat()
+            def spam(self, key):
+                return key * 2
+
+        async def main():
+            obj = X(True)
+            await obj.aset('eggs', 3)
+            self.assertEqual(obj._eggs, 3)
+            self.assertEqual(await obj.aget('eggs'), 3)
+            self.assertEqual(await obj.aget('spam', 4), 8)
+            self.assertEqual(await obj.acall('run2', 2), 84)
+            self.assertEqual(await obj.acall('run4', Q_(1, 's')), 1000)
+
+            # Tasks for the same driver are serialized,
+            # a task that did not start can be cancelled.
+            first = asyncio.ensure_future(obj.aset('ham', 1))
+            second = asyncio.ensure_future(obj.aset('ham', 2))
+            await asyncio.sleep(SLEEP / 2)
+            second.cancel()
+            await first
+            await asyncio.sleep(SLEEP + WAIT)
+            self.assertEqual(obj._ham, 1)
+
+            async with X() as obj2:
+                self.assertEqual(await obj2.acall('run'), 42)
+
+        asyncio.run(main())
+
+    def test_initialize_many(self):
+
+        log = []
+
+        class X(aDriver):
+
+            @Action()
+            def initialize(self):
+                log.append(('start', self.name))
+                if self.name == 'e':
+                    raise ValueError('e failed')
+                sleep(SLEEP if self.slow else 0)
+                log.append(('end', self.name))
+
+            @Action()
+            def finalize(self):
+                log.append(('fin', self.name))
+
+        a = X(True, name='a')
+        b = X(name='b')
+        c = X(name='c')
+        d = X(name='d')
+        deps = {'c': ('b', ), 'd': ('a', )}
+        report = initialize_many((a, b, c, d), register_finalizer=False,
+                                 concurrent=True, dependencies=deps)
+        # c does not wait for a, which is in the same level as b.
+        self.assertLess(log.index(('start', 'c')), log.index(('end', 'a')))
+        self.assertLess(log.index(('end', 'a')), log.index(('start', 'd')))
+        self.assertEqual(report.critical_path, ['a', 'd'])
+        self.assertEqual(set(report.times), {'a', 'b', 'c', 'd'})
+        self.assertIn('a:', str(report))
+
+        del log[:]
+        report = finalize_many((a, b, c, d), concurrent=True, dependencies=deps)
+        self.assertLess(log.index(('fin', 'c')), log.index(('fin', 'b')))
+        self.assertLess(log.index(('fin', 'd')), log.index(('fin', 'a')))
+
+        # Drivers depending on a failed one are skipped.
+        e = X(name='e')
+        errors = []
+        deps = {'c': ('e', ), 'b': ('a', )}
+        report = initialize_many((a, b, c, e), register_finalizer=False,
+                                 on_exception=lambda driver, ex: errors.append(driver.name),
+                                 dependencies=deps)
+        self.assertEqual(errors, ['e'])
+        self.assertEqual(report.skipped, ['c'])
+        self.assertEqual(set(report.times), {'a', 'b', 'e'})
+
+        # Without on_exception, the first exception is raised.
+        del log[:]
+        with self.assertRaises(ValueError):
+            initialize_many((e, a), register_finalizer=False)
+        self.assertNotIn(('start', 'a'), log)
+
+        report = initialize_many((e, a), register_finalizer=False, policy='continue',
+                                 on_exception=lambda driver, ex: None)
+        self.assertIn('a', report.times)
+
+        with self.assertRaises(TimeoutError):
+            initialize_many((a, d), register_finalizer=False, concurrent=True,
+                            dependencies={'d': ('a', )}, timeout=SLEEP / 2)
+
+        with self.assertRaises(ValueError):
+            initialize_many((a, d), register_finalizer=False,
+                            dependencies={'d': ('a', ), 'a': ('d', )})
+
+    def test_ainitialize_many(self):
+
+        log = []
+
+        class X(aDriver):
+
+            @Action()
+            def initialize(self):
+                sleep(SLEEP if self.slow else 0)
+                log.append(('init', self.name))
+
+            @Action()
+            def finalize(self):
+                log.append(('fin', self.name))
+
+        a = X(True, name='a')
+        b = X(name='b')
+        c = X(name='c')
+        deps = {'c': ('a', )}
+        asyncio.run(ainitialize_many((a, b, c), register_finalizer=False, dependencies=deps))
+        self.assertEqual(log, [('init', 'b'), ('init', 'a'), ('init', 'c')])
+
+        del log[:]
+        report = asyncio.run(afinalize_many((a, b, c), dependencies=deps))
+        self.assertLess(log.index(('fin', 'c')), log.index(('fin', 'a')))
+        self.assertEqual(report.critical_path, ['c', 'a'])
+
+        # Errors are handled as in initialize_many.
+        class Y(X):
+
+            @Action()
+            def initialize(self):
+                raise ValueError(self.name)
+
+        d = Y(name='d')
+        errors = []
+        report = asyncio.run(ainitialize_many((b, d, c), register_finalizer=False,
+                                              dependencies={'c': ('d', )},
+                                              on_exception=lambda driver, ex: errors.append(driver.name)))
+        self.assertEqual(errors, ['d'])
+        self.assertEqual(report.skipped, ['c'])
+        self.assertIn('b', report.times)
+        self.assertRaises(ValueError, asyncio.run,
+                          ainitialize_many((d, ), register_finalizer=False))
+
+    def test_instrumented_lock(self):
+
+        class Slow(Driver):
+
+            @Feat()
+            def eggs(self):
+                return 1
+
+            @Action()
+            def wait(self, seconds):
+                self.holders.append(self._lock.holder)
+                sleep(seconds)
+
+        obj = Slow()
+        obj.holders = []
+        lock = obj._lock
+        self.assertIs(obj.instrument_lock(threshold=.05).lock, lock)
+        self.assertIsInstance(obj._lock, InstrumentedLock)
+
+        fut = obj.wait_async(.2)
+        while not obj.holders:
+            sleep(.01)
+        self.assertEqual(obj.eggs, 1)
+        fut.result()
+
+        self.assertEqual(obj.holders[0][1], 'wait')
+        self.assertIsNone(obj._lock.holder)
+        self.assertGreater(obj.timing.stats('lock_hold_wait').mean, .15)
+        self.assertGreater(obj.timing.stats('lock_wait_eggs').mean, .1)
+        self.assertEqual(obj.counters['lock_long_hold_wait'], 1)
+        self.assertEqual(obj.counters['lock_long_hold_eggs'], 0)
+
+        self.assertIs(obj.instrument_lock(False), lock)
+
+    def test_headless_signal(self):
+
+        class Emitter(object):
+            changed = Signal(object, object)
+
+        self.assertIsInstance(Emitter.changed, Signal)
+        obj, other = Emitter(), Emitter()
+        self.assertIsInstance(obj.changed, BoundSignal)
+        self.assertIs(obj.changed, obj.changed)
+        self.assertIsNot(obj.changed, other.changed)
+
+        received = []
+        slot = lambda new, old: received.append((new, old))
+        obj.changed.connect(slot)
+        obj.changed.connect(lambda new, old: 1 / 0)
+        obj.changed.connect(slot)
+        self.assertEqual(obj.changed.receivers(), 3)
+        self.assertEqual(other.changed.receivers(), 0)
+        obj.changed.emit(1, 2)
+        other.changed.emit(3, 4)
+        self.assertEqual(received, [(1, 2), (1, 2)])
+
+        obj.changed.disconnect(slot)
+        obj.changed.emit(5, 6)
+        self.assertEqual(received[-1], (5, 6))
+        self.assertEqual(len(received), 3)
+        obj.changed.disconnect()
+        obj.changed.emit(7, 8)
+        self.assertEqual(len(received), 3)
+        self.assertRaises(RuntimeError, obj.changed.disconnect, slot)
+
+    def test_headless_import(self):
+        env = dict(os.environ)
+        env.pop('QT_API', None)
+        env['LANTZ_HEADLESS'] = '1'
+        code = 'import sys, lantz.driver; print(lantz.driver.HEADLESS, "lantz.utils.qt" in sys.modules)'
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(out.split(), [b'True', b'False'])
+
+        # Without LANTZ_HEADLESS, Qt is used if installed.
+        env.pop('LANTZ_HEADLESS')
+        code = 'import lantz.driver; print(lantz.driver.HEADLESS)'
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(out.split(), [str(not qt_available()).encode()])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+import threading
+from concurrent import futures
+
+from lantz import Driver, Action, initialize_many, refresh_many
+from lantz import executor
+from lantz.executor import Strand
+
+
+class aDriver(Driver):
+
+    @Action()
+    def run(self, value, log, delay=.02):
+        log.append(('start', self.name, value))
+        time.sleep(delay)
+        log.append(('end', self.name, value))
+        return value
+
+
+class StrandTest(unittest.TestCase):
+
+    def test_order(self):
+        pool = futures.ThreadPoolExecutor(max_workers=4)
+        strand = Strand(pool)
+        log = []
+
+        def task(value):
+            log.append(('start', value))
+            time.sleep(.01)
+            log.append(('end', value))
+            return value
+
+        futs = [strand.submit(task, n) for n in range(5)]
+        self.assertEqual([fut.result() for fut in futs], list(range(5)))
+        expected = []
+        for n in range(5):
+            expected += [('start', n), ('end', n)]
+        self.assertEqual(log, expected)
+        pool.shutdown()
+
+    def test_exception(self):
+        strand = Strand()
+
+        def fail():
+            raise ValueError('spam')
+
+        fut1 = strand.submit(fail)
+        fut2 = strand.submit(lambda: 42)
+        self.assertRaises(ValueError, fut1.result)
+        self.assertEqual(fut2.result(), 42)
+
+    def test_drivers_share_executor(self):
+        pool = futures.ThreadPoolExecutor(max_workers=2)
+        executor.set_executor(pool)
+        try:
+            drivers = [aDriver() for n in range(10)]
+            log = []
+            futs = [driver.run_async(n, log) for driver in drivers for n in range(3)]
+            futures.wait(futs)
+            self.assertEqual([fut.result() for fut in futs], [0, 1, 2] * 10)
+            self.assertTrue(len(pool._threads) <= 2)
+            for driver in drivers:
+                entries = [(what, value) for what, name, value in log if name == driver.name]
+                self.assertEqual(entries, [('start', 0), ('end', 0), ('start', 1),
+                                           ('end', 1), ('start', 2), ('end', 2)])
+        finally:
+            executor.set_executor(None)
+            pool.shutdown()
+
+    def test_nested_wait(self):
+        # A task waiting for other drivers must not wait for a free worker.
+        pool = futures.ThreadPoolExecutor(max_workers=1)
+        executor.set_executor(pool)
+        try:
+            children = [aDriver() for n in range(3)]
+
+            class Parent(Driver):
+
+                @Action()
+                def initialize(self):
+                    initialize_many(children, register_finalizer=False, concurrent=True)
+                    return refresh_many(children)
+
+            self.assertFalse(executor.in_task())
+            parent = Parent()
+            fut = parent.initialize_async()
+            self.assertEqual(fut.result(timeout=5), {child.name: {} for child in children})
+            self.assertFalse(executor.in_task())
+        finally:
+            executor.set_executor(None)
+            pool.shutdown()
+
+    def test_driver_executor(self):
+
+        class Ham(Driver):
+
+            @Action()
+            def thread(self):
+                return threading.current_thread().name
+
+        own = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='own')
+        other = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='other')
+        try:
+            driver = Ham(executor=own)
+            self.assertIs(driver.executor, own)
+            self.assertTrue(driver.thread_async().result().startswith('own'))
+
+            driver.executor = other
+            self.assertIs(driver.executor, other)
+            self.assertTrue(driver.thread_async().result().startswith('other'))
+
+            driver = Ham()
+            self.assertIsNone(driver.executor)
+            driver.executor = own
+            self.assertTrue(driver.thread_async().result().startswith('own'))
+        finally:
+            own.shutdown()
+            other.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
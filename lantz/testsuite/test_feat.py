@@ -3,10 +3,15 @@
 import time
 import logging
 import unittest
+from unittest import mock
 
+import numpy as np
+
+import lantz.driver
 from lantz import Driver, Feat, Q_
-from lantz.feat import MISSING
+from lantz.feat import MISSING, _compose, _identity
 from lantz.log import get_logger
+from lantz.utils.headless import BoundSignal
 
 class MemHandler(logging.Handler):
 
@@ -126,6 +131,39 @@ class FeatTest(unittest.TestCase):
         self.assertEqual(obj.serialno, 23199292)
         self.assertEqual(obj.serialno, 23199292)
 
+    def test_max_age(self):
+
+        class Ham(Driver):
+
+            _reads = 0
+
+            @Feat(max_age=.2)
+            def eggs(self_):
+                self_._reads += 1
+                return self_._reads
+
+            @Feat()
+            def ham(self_):
+                self_._reads += 1
+                return self_._reads
+
+        obj = Ham()
+        self.assertEqual(obj.eggs, 1)
+        self.assertEqual(obj.eggs, 1)
+        self.assertEqual(obj.refresh('eggs', max_age=0), 2)
+        self.assertEqual(obj.recall('eggs', max_age=10), 2)
+        time.sleep(.25)
+        self.assertEqual(obj.recall('eggs', max_age=.2), MISSING)
+        self.assertEqual(obj.recall('eggs'), 2)
+        self.assertEqual(obj.eggs, 3)
+
+        self.assertEqual(obj.ham, 4)
+        self.assertEqual(obj.ham, 5)
+        self.assertEqual(obj.refresh('ham', max_age=10), 5)
+        obj.feats.ham.max_age = 10
+        self.assertEqual(obj.ham, 5)
+        self.assertEqual(Ham().ham, 1)
+
     def test_limits(self):
 
         class Spam(Driver):
@@ -146,6 +184,27 @@ class FeatTest(unittest.TestCase):
         self.assertRaises(ValueError, setattr, obj, "eggs", 11)
         self.assertRaises(ValueError, setattr, obj, "eggs", 0)
 
+    def test_array(self):
+
+        class Ham(Driver):
+
+            _eggs = None
+
+            @Feat(limits=(0, 10, .5), units='V')
+            def eggs(self_):
+                return self_._eggs
+
+            @eggs.setter
+            def eggs(self_, value):
+                self_._eggs = value
+
+        obj = Ham()
+        obj.eggs = Q_(np.array([100., 2010., 9990.]), 'mV')
+        np.testing.assert_array_almost_equal(obj._eggs, [0., 2., 10.])
+        obj.eggs = Q_(np.array([0., 2., 10.]), 'V')
+        np.testing.assert_array_almost_equal(obj.eggs.magnitude, [0., 2., 10.])
+        self.assertRaises(ValueError, setattr, obj, 'eggs', Q_(np.array([1., 11.]), 'V'))
+
     def test_limits_units(self):
 
         class Spam(Driver):
@@ -261,7 +320,7 @@ class FeatTest(unittest.TestCase):
         obj.eggs = x
         obj.eggs = x + 1
 
-        self.assertEqual(hdl.history, ['Created Spam17',
+        self.assertEqual(hdl.history, ['Created ' + obj.name,
                                        'Getting eggs',
                                        '(raw) Got 9 for eggs',
                                        'Got 9 for eggs',
@@ -456,6 +515,187 @@ class FeatTest(unittest.TestCase):
         self.assertNotEqual(x.eggs, y.eggs)
         self.assertEqual(str(x.eggs.units), 'second')
 
+    def test_deadband(self):
+
+        class Ham(Driver):
+
+            def __init__(self_):
+                super().__init__()
+                self_.writes = []
+
+            eggs = Feat(None, units='mW', deadband=0.5)
+
+            @eggs.setter
+            def eggs(self_, value):
+                self_.writes.append(value)
+
+            ham = Feat(None, deadband='1%')
+
+            @ham.setter
+            def ham(self_, value):
+                self_.writes.append(value)
+
+        obj = Ham()
+        obj.eggs = Q_(10, 'mW')
+        obj.eggs = Q_(10.3, 'mW')
+        obj.eggs = Q_(0.0104, 'W')
+        obj.eggs = Q_(10.6, 'mW')
+        obj.feats.eggs.set(obj, Q_(10.7, 'mW'), force=True)
+        self.assertEqual(obj.writes, [10, 10.6, 10.7])
+
+        # The deadband is in the units of the feat, not of the value.
+        obj.writes = []
+        obj.eggs = Q_(1, 'W')
+        obj.eggs = Q_(1.3, 'W')
+        obj.eggs = Q_(1.3004, 'W')
+        self.assertEqual(obj.writes, [1000, 1300])
+
+        obj.writes = []
+        obj.ham = 100
+        obj.ham = 100.9
+        obj.ham = 98.5
+        self.assertEqual(obj.writes, [100, 98.5])
+
+    def test_min_interval(self):
+
+        class Ham(Driver):
+
+            def __init__(self_):
+                super().__init__()
+                self_.writes = []
+
+            eggs = Feat(None, min_interval=.1)
+
+            @eggs.setter
+            def eggs(self_, value):
+                self_.writes.append(value)
+
+        obj = Ham()
+        for n in range(20):
+            obj.eggs = n
+            time.sleep(.01)
+        time.sleep(.2)
+        self.assertEqual(obj.writes[0], 0)
+        self.assertEqual(obj.writes[-1], 19)
+        self.assertTrue(3 <= len(obj.writes) <= 5, obj.writes)
+        self.assertEqual(obj.recall('eggs'), 19)
+
+        # A value equal to the cached one cancels the deferred one.
+        time.sleep(.2)
+        obj.writes = []
+        obj.eggs = 2
+        obj.eggs = 3
+        obj.eggs = 2
+        time.sleep(.2)
+        self.assertEqual(obj.writes, [2])
+        self.assertEqual(obj.recall('eggs'), 2)
+
+    def test_notify(self):
+
+        class Ham(Driver):
+
+            _eggs = 0
+
+            @Feat(notify=10)
+            def eggs(self_):
+                self_._eggs += 1
+                return self_._eggs
+
+            @Feat(notify='off')
+            def ham(self_):
+                return time.time()
+
+        obj = Ham()
+        eggs, ham = [], []
+        obj.eggs_changed.connect(lambda new, old: eggs.append((new, old)))
+        obj.ham_changed.connect(lambda new, old: ham.append(new))
+
+        for n in range(20):
+            obj.eggs
+            obj.ham
+        self.assertEqual(eggs, [(1, MISSING)])
+        time.sleep(.2)
+        self.assertEqual(eggs, [(1, MISSING), (20, 1)])
+        self.assertEqual(ham, [])
+
+        obj.feats.eggs.notify = 'immediate'
+        obj.eggs
+        self.assertEqual(eggs[-1], (21, 20))
+
+    @unittest.skipUnless(lantz.driver.HEADLESS, 'requires the headless backend')
+    def test_notify_unconnected(self):
+
+        class Ham(Driver):
+
+            _eggs = 0
+
+            @Feat()
+            def eggs(self_):
+                self_._eggs += 1
+                return self_._eggs
+
+        obj = Ham()
+        with mock.patch.object(BoundSignal, 'emit') as emit:
+            obj.eggs
+            obj.eggs
+            self.assertEqual(emit.call_count, 0)
+            received = []
+            obj.eggs_changed.connect(received.append)
+            obj.eggs
+            self.assertEqual(emit.call_count, 1)
+            obj.eggs_changed.disconnect()
+            obj.eggs
+            self.assertEqual(emit.call_count, 1)
+        self.assertEqual(obj.eggs, 5)
+
+    def test_pipeline_invalidation(self):
+
+        class Ham(Driver):
+
+            _eggs = 8
+
+            @Feat(units='s', limits=(0, 10))
+            def eggs(self_):
+                return self_._eggs
+
+            @eggs.setter
+            def eggs(self_, value):
+                self_._eggs = value
+
+        x = Ham()
+        y = Ham()
+        self.assertEqual(x.eggs, Q_(8, 's'))
+        x.eggs = Q_(5000, 'ms')
+        self.assertEqual(x._eggs, 5)
+        self.assertRaises(ValueError, setattr, x, 'eggs', Q_(11, 's'))
+
+        # Changing a modifier through the proxy must rebuild the fused pipeline
+        # of that instance only.
+        x.feats.eggs.limits = (0, 20)
+        x.feats.eggs.units = 'ms'
+        x.eggs = Q_(0.015, 's')
+        self.assertEqual(x._eggs, 15)
+        self.assertEqual(x.eggs, Q_(15, 'ms'))
+        self.assertRaises(ValueError, setattr, y, 'eggs', Q_(11, 's'))
+        self.assertEqual(y.eggs, Q_(8, 's'))
+
+        # The per instance settings (e.g. max_age) are invalidated together.
+        reads = lambda: x.timing.stats('get_eggs').count
+        count = reads()
+        x.eggs
+        self.assertEqual(reads(), count + 1)
+        x.feats.eggs.max_age = 10
+        x.eggs
+        self.assertEqual(reads(), count + 1)
+        y.eggs
+        self.assertEqual(y.timing.stats('get_eggs').count, 2)
+
+    def test_compose(self):
+        self.assertIs(_compose([]), _identity)
+        self.assertIs(_compose([_identity, float]), float)
+        fused = _compose([lambda v: v + 1, lambda v: v * 2, str, len, _identity, lambda v: v * 10])
+        self.assertEqual(fused(4), 20)
+
 
 
 if __name__ == '__main__':
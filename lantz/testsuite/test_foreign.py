@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import os
 import ctypes
+import pickle
 import unittest
 
 from array import array
 
-from lantz.foreign import LibraryDriver, RetStr, RetTuple, RetValue, TYPES
+from lantz.foreign import LibraryDriver, RetStr, RetTuple, RetValue, RetArray, TYPES
+from lantz.foreign import _encode_type, _decode_type
 
 class Array(array):
 
@@ -108,3 +111,67 @@ class ForeignTest(unittest.TestCase):
         self.assertEqual((ret, value, type(value)), (1, 7., float))
 
 
+class IsolatedTypesTest(unittest.TestCase):
+
+    def test_encode_type(self):
+        for ctype in (ctypes.c_int, ctypes.c_char_p, None, ctypes.POINTER(ctypes.c_double),
+                      ctypes.c_double * 3, ctypes.POINTER(ctypes.c_int * 2)):
+            description = pickle.loads(pickle.dumps(_encode_type(ctype)))
+            self.assertIs(_decode_type(description), ctype)
+
+
+class IsolatedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = MyDriver(isolated=True)
+
+    def tearDown(self):
+        self.driver.lib.close()
+
+    def test_raise(self):
+        self.assertRaises(OSError, MyWrongDriver, isolated=True)
+
+    def test_simple_return(self):
+        self.assertEqual(self.driver.lib.sumi13(5), 18)
+        self.assertNotEqual(self.driver.lib.process.pid, os.getpid())
+
+    def test_return_buffers(self):
+        ret, value = self.driver.lib.write_in_charp(RetStr(20), 20)
+        self.assertEqual((ret, value), (1, '28G11AC10T32'))
+
+        ret, value = self.driver.lib.double_param(RetValue('d'))
+        self.assertEqual((ret, value), (1, 7.))
+
+        value = (ctypes.c_double * 3)()
+        ret = self.driver.lib.double_array_param(value)
+        self.assertEqual((ret, tuple(value)), (1, (1, 2, 3)))
+
+        self.driver.lib.sum_double_array_length.restype = ctypes.c_double
+        ret = self.driver.lib.sum_double_array_length((ctypes.c_double * 3)(1, 2, 3), 3)
+        self.assertEqual(ret, 6.)
+
+    def test_pointer_argtypes(self):
+        func = self.driver.lib.sum_double_array_length
+        func.argtypes = [ctypes.POINTER(ctypes.c_double), ctypes.c_int]
+        func.restype = ctypes.c_double
+        self.assertEqual(func((ctypes.c_double * 3)(1, 2, 3), 3), 6.)
+
+    def test_shared_array(self):
+        shared = RetArray('d', 1000)
+        ret, value = self.driver.lib.double_array_length_param(*shared)
+        self.assertEqual(ret, 1)
+        self.assertEqual(list(value[:5]), [0, 1, 2, 3, 4])
+        self.assertEqual(value[999], 999)
+
+    def test_parallel(self):
+        other = MyDriver(isolated=True)
+        try:
+            self.assertNotEqual(other.lib.process.pid, self.driver.lib.process.pid)
+            self.assertEqual(other.lib.returni10(), 10)
+        finally:
+            other.lib.close()
+
+    def test_dead_worker(self):
+        self.driver.lib.process.terminate()
+        self.driver.lib.process.join()
+        self.assertRaisesRegex(Exception, 'died', self.driver.lib.returni10)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from lantz import Driver, Feat, DictFeat, Q_
+from lantz.history import RingBuffer
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_wrap(self):
+        buf = RingBuffer(4)
+        for n in range(10):
+            buf.append(n, 10 * n)
+            times, values = buf.view()
+            expected = np.arange(max(0, n - 3), n + 1)
+            np.testing.assert_array_equal(times, expected)
+            np.testing.assert_array_equal(values, 10 * expected)
+        self.assertEqual(len(buf), 4)
+
+    def test_view_is_not_a_copy(self):
+        buf = RingBuffer(3)
+        for n in range(5):
+            buf.append(n, float(n))
+        times, values = buf.view()
+        self.assertFalse(values.flags.owndata)
+        self.assertFalse(times.flags.owndata)
+
+    def test_quantity(self):
+        buf = RingBuffer(3)
+        buf.append(0, Q_(1, 's'))
+        buf.append(1, Q_(2000, 'ms'))
+        times, values = buf.view()
+        self.assertEqual(values.units, Q_(1, 's').units)
+        np.testing.assert_array_almost_equal(values.magnitude, [1, 2])
+
+    def test_dtype(self):
+        buf = RingBuffer(4)
+        buf.append(0, 0)
+        buf.append(1, 1.5)
+        buf.append(2, True)
+        np.testing.assert_array_equal(buf.view()[1], [0, 1.5, 1])
+        buf.append(3, 1j)
+        np.testing.assert_array_equal(buf.view()[1], [0, 1.5, 1, 1j])
+        buf.append(4, 'spam')
+        self.assertEqual(list(buf.view()[1]), [1.5, 1, 1j, 'spam'])
+
+    def test_resized(self):
+        buf = RingBuffer(5)
+        for n in range(7):
+            buf.append(n, n)
+        small = buf.resized(2)
+        np.testing.assert_array_equal(small.view()[1], [5, 6])
+        large = buf.resized(10)
+        np.testing.assert_array_equal(large.view()[1], [2, 3, 4, 5, 6])
+
+
+class FeatHistoryTest(unittest.TestCase):
+
+    def test_feat(self):
+
+        class Spam(Driver):
+
+            _eggs = 0
+
+            @Feat(units='V', history=3)
+            def eggs(self_):
+                self_._eggs += 1
+                return self_._eggs
+
+            @Feat()
+            def ham(self_):
+                return 1
+
+        obj = Spam()
+        for n in range(5):
+            obj.eggs
+        times, values = obj.history('eggs')
+        self.assertEqual(len(times), 3)
+        self.assertTrue(np.all(np.diff(times) >= 0))
+        np.testing.assert_array_equal(values.magnitude, [3, 4, 5])
+
+        obj.ham
+        self.assertRaises(ValueError, obj.history, 'ham')
+
+        obj.feats.eggs.history = 5
+        obj.eggs
+        np.testing.assert_array_equal(obj.history('eggs')[1].magnitude, [3, 4, 5, 6])
+
+    def test_dictfeat(self):
+
+        class Spam(Driver):
+
+            @DictFeat(keys={'a': 1, 'b': 2}, history=2)
+            def eggs(self_, key):
+                return key * 10
+
+        obj = Spam()
+        obj.eggs['a']
+        obj.eggs['b']
+        obj.eggs['a']
+        np.testing.assert_array_equal(obj.history('eggs', 'a')[1], [10, 10])
+        np.testing.assert_array_equal(obj.history('eggs', 'b')[1], [20])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import types
+import unittest
+
+from lantz import Feat
+
+try:
+    from lantz import messagebased
+    from lantz.messagebased import MessageBasedDriver
+    from lantz.drivers.scpi import SCPIDriver
+except ImportError:
+    messagebased = None
+    MessageBasedDriver = SCPIDriver = object
+
+
+class FakeResource(object):
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, command, termination=None, encoding=None):
+        self.written.append(command)
+        return len(command)
+
+    def read(self, termination=None, encoding=None):
+        return '1'
+
+    def close(self):
+        pass
+
+
+class FakeResourceManager(object):
+
+    def resource_info(self, resource_name):
+        return types.SimpleNamespace(interface_type=types.SimpleNamespace(name='tcpip'),
+                                     resource_class='SOCKET')
+
+    def open_resource(self, resource_name, **kwargs):
+        return FakeResource()
+
+
+class BatchDriver(MessageBasedDriver):
+
+    BATCH_SEPARATOR = ';'
+
+    @Feat()
+    def volts(self):
+        return float(self.query('VOLT?'))
+
+    @volts.setter
+    def volts(self, value):
+        self.write('VOLT {}'.format(value))
+
+    @Feat()
+    def freq(self):
+        return float(self.query('FREQ?'))
+
+    @freq.setter
+    def freq(self, value):
+        self.write('FREQ {}'.format(value))
+
+    @Feat()
+    def fail(self):
+        return 0
+
+    @fail.setter
+    def fail(self, value):
+        raise ValueError('failed')
+
+
+class SCPIBatchDriver(SCPIDriver, MessageBasedDriver):
+
+    @Feat()
+    def volts(self):
+        return float(self.query(':SOUR:VOLT?'))
+
+    @volts.setter
+    def volts(self, value):
+        self.write(':SOUR:VOLT {}'.format(value))
+
+    @Feat()
+    def freq(self):
+        return float(self.query('SOUR:FREQ?'))
+
+    @freq.setter
+    def freq(self, value):
+        self.write('SOUR:FREQ {}'.format(value))
+
+
+@unittest.skipIf(messagebased is None, 'requires PyVISA')
+class MessageBasedTest(unittest.TestCase):
+
+    def setUp(self):
+        self._resource_manager = messagebased._resource_manager
+        messagebased._resource_manager = FakeResourceManager()
+
+    def tearDown(self):
+        messagebased._resource_manager = self._resource_manager
+
+    def test_batch(self):
+        obj = BatchDriver('TCPIP::localhost::5678::SOCKET')
+        obj.initialize()
+        written = obj.resource.written
+
+        with obj.batch():
+            obj.volts = 1
+            obj.freq = 2
+        self.assertEqual(written, ['VOLT 1;FREQ 2'])
+        self.assertIsNone(obj._write_buffer)
+
+        # A failing setter discards the buffered commands.
+        del written[:]
+        with self.assertRaises(ValueError):
+            with obj.batch():
+                obj.volts = 3
+                obj.fail = 1
+        self.assertEqual(written, [])
+        self.assertIsNone(obj._write_buffer)
+
+        # Outside a batch, commands are written right away.
+        obj.volts = 4
+        self.assertEqual(written, ['VOLT 4'])
+        obj.finalize()
+
+    def test_scpi_batch(self):
+        obj = SCPIBatchDriver('TCPIP::localhost::5678::SOCKET')
+        obj.initialize()
+
+        with obj.batch():
+            obj.volts = 1
+            obj.freq = 2
+        self.assertEqual(obj.resource.written, ['SOUR:VOLT 1;:SOUR:FREQ 2'])
+        self.assertEqual(obj._join_writes(['SOUR:VOLT 1', '*CLS', ':SOUR:FREQ 2']),
+                         'SOUR:VOLT 1;*CLS;:SOUR:FREQ 2')
+        obj.finalize()
+
+
+if __name__ == '__main__':
+    unittest.main()
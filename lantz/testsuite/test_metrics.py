@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import json
+import unittest
+from urllib.request import urlopen, Request
+
+from lantz import Driver, Feat, Action
+from lantz import metrics
+from lantz.metrics import MetricsServer
+
+
+class aDriver(Driver):
+
+    @Feat(read_once=True)
+    def idn(self):
+        return 'aDriver'
+
+    @Feat(limits=(10, ))
+    def eggs(self):
+        return 1
+
+    @eggs.setter
+    def eggs(self, value):
+        pass
+
+    @Action()
+    def fail(self):
+        raise ValueError('failed')
+
+
+class MetricsTest(unittest.TestCase):
+
+    def _use(self, obj):
+        for _ in range(3):
+            obj.idn
+        obj.eggs
+        self.assertRaises(ValueError, setattr, obj, 'eggs', 20)
+        self.assertRaises(ValueError, obj.fail)
+
+    def test_registry(self):
+        obj = aDriver()
+        self.assertIn(obj, metrics.drivers())
+        name = obj.name
+        del obj
+        gc.collect()
+        self.assertNotIn(name, [driver.name for driver in metrics.drivers()])
+
+    def test_collect(self):
+        obj = aDriver()
+        self._use(obj)
+        members = {(item['kind'], item['member']): item
+                   for item in metrics.collect([obj])[0]['members']}
+        idn = members[('get', 'idn')]
+        self.assertEqual((idn['count'], idn['cache_hits']), (1, 2))
+        self.assertAlmostEqual(idn['cache_hit_ratio'], 2 / 3)
+        self.assertIn('p99', idn)
+        self.assertEqual(members[('set', 'eggs')]['errors'], 1)
+        self.assertEqual(members[('call', 'fail')]['errors'], 1)
+
+    def test_scrape(self):
+        obj = aDriver(name='scraped')
+        self._use(obj)
+        with MetricsServer() as server:
+            url = 'http://{}:{}/metrics'.format(*server.address)
+            text = urlopen(url).read().decode('utf-8')
+            labels = 'driver="scraped",class="aDriver",member="idn",kind="get"'
+            self.assertIn('lantz_calls_total{%s} 1' % labels, text)
+            self.assertIn('lantz_cache_hits_total{%s} 2' % labels, text)
+            self.assertIn('lantz_latency_seconds{%s,quantile="0.99"}' % labels, text)
+            self.assertIn('# TYPE lantz_calls_total counter', text)
+
+            request = Request(url, headers={'Accept': 'application/openmetrics-text'})
+            text = urlopen(request).read().decode('utf-8')
+            self.assertIn('# TYPE lantz_calls counter', text)
+            self.assertTrue(text.endswith('# EOF\n'))
+
+            data = json.loads(urlopen(url + '.json').read().decode('utf-8'))
+            self.assertIn('scraped', [item['driver'] for item in data])
+
+
+if __name__ == '__main__':
+    unittest.main()
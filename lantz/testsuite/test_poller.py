@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import unittest
+
+from lantz import Driver, Feat, DictFeat
+from lantz.poller import Poller
+
+
+class aDriver(Driver):
+
+    def __init__(self, delay=0., *args, **kwargs):
+        super().__init__()
+        self.delay = delay
+        self.reads = []
+        self.active = 0
+        self.max_active = 0
+
+    def _read(self, name):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        self.reads.append((name, threading.current_thread().name))
+        self.active -= 1
+        return len(self.reads)
+
+    @Feat()
+    def eggs(self):
+        return self._read('eggs')
+
+    @Feat()
+    def ham(self):
+        return self._read('ham')
+
+    @DictFeat(keys=(1, 2))
+    def spam(self, key):
+        return self._read(('spam', key))
+
+
+class PollerTest(unittest.TestCase):
+
+    def test_rate(self):
+        obj = aDriver()
+        values = []
+        tic = time.monotonic()
+        with Poller() as poller:
+            poller.register(obj, 'eggs', rate=20, callback=values.append)
+            time.sleep(.5)
+        elapsed = time.monotonic() - tic
+        # Polls can be delayed in a loaded machine, but never come faster than the rate.
+        self.assertTrue(2 <= len(values) <= elapsed * 20 + 2, (len(values), elapsed))
+        self.assertTrue(obj.timing.stats('poll_lag_eggs').count >= len(values))
+
+    def test_merge(self):
+        obj = aDriver()
+        poller = Poller()
+        sub1 = poller.register(obj, 'eggs', rate=5)
+        sub2 = poller.register(obj, 'eggs', rate=20, priority=2)
+        self.assertIs(sub1.job, sub2.job)
+        self.assertEqual(sub1.job.period, 1. / 20)
+        self.assertEqual(sub1.job.priority, 2)
+        poller.unregister(sub2)
+        self.assertEqual(sub1.job.period, 1. / 5)
+        poller.unregister(sub1)
+        self.assertEqual(poller.subscriptions, [])
+        self.assertRaises(KeyError, poller.register, obj, 'bacon', 1)
+        self.assertRaises(ValueError, poller.register, obj, 'eggs', 0)
+
+    def test_unregister_ready(self):
+        obj = aDriver(.2)
+        poller = Poller()
+        poller.register(obj, 'ham', rate=1, priority=1)
+        eggs = poller.register(obj, 'eggs', rate=1)
+        with poller:
+            # eggs waits for ham, which is polled first.
+            time.sleep(.05)
+            poller.unregister(eggs)
+            time.sleep(.3)
+        self.assertEqual([name for name, thread in obj.reads], ['ham'])
+
+    def test_serialized_per_driver(self):
+        obj1 = aDriver(.05)
+        obj2 = aDriver(.05)
+        with Poller() as poller:
+            for obj in (obj1, obj2):
+                poller.register(obj, 'eggs', rate=50)
+                poller.register(obj, 'ham', rate=50)
+                poller.register(obj, 'spam', rate=50, key=1)
+            time.sleep(.5)
+        for obj in (obj1, obj2):
+            self.assertEqual(obj.max_active, 1)
+            self.assertTrue(len(obj.reads) >= 6)
+            self.assertIn(('spam', 1), [name for name, thread in obj.reads])
+            self.assertTrue(obj.timing.stats('poll_missed_eggs').count > 0)
+
+        # Both drivers are polled at the same time from different threads.
+        threads1 = {thread for name, thread in obj1.reads}
+        threads2 = {thread for name, thread in obj2.reads}
+        self.assertTrue(len(threads1 | threads2) >= 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
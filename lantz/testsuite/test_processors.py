@@ -3,6 +3,8 @@
 import unittest
 import doctest
 
+import numpy as np
+
 from lantz import Q_
 
 import lantz.processors as processors
@@ -45,5 +47,39 @@ class TestProcessors(unittest.TestCase):
 
         self.assertRaises(ValueError, processors.convert_to(V, on_dimensionless='raise'), 1000)
 
+    def test_cached_factors(self):
+        to_mv = processors.convert_to('mV', return_float=True)
+        self.assertEqual(to_mv(Q_(2, 'V')), 2000.)
+        self.assertEqual(to_mv(Q_(3, 'V')), 3000.)
+        self.assertEqual(to_mv(Q_(4, 'mV')), 4)
+        self.assertAlmostEqual(to_mv(Q_(5, 'kV')), 5e6)
+
+        to_celsius = processors.convert_to('degC')
+        self.assertAlmostEqual(to_celsius(Q_(300., 'kelvin')).magnitude, 26.85)
+        self.assertAlmostEqual(to_celsius(Q_(32., 'degF')).magnitude, 0.)
+
+        self.assertRaises(ValueError, to_mv, Q_(1, 'Hz'))
+
+    def test_arrays(self):
+        values = np.linspace(0, 1, 11)
+
+        checker = processors.check_range_and_coerce_step(0, 1, .25)
+        np.testing.assert_array_almost_equal(checker(values),
+                                             np.round(values / .25) * .25)
+        self.assertRaises(ValueError, checker, np.array([0.5, 1.5]))
+
+        checker = processors.check_membership({1, 2, 3})
+        np.testing.assert_array_equal(checker(np.array([1, 3])), [1, 3])
+        self.assertRaises(ValueError, checker, np.array([1, 4]))
+
+        getter = processors.get_mapping({'on': 1, 'off': 0})
+        np.testing.assert_array_equal(getter(np.array(['on', 'off', 'on'])), [1, 0, 1])
+        self.assertRaises(ValueError, getter, np.array(['on', 'spam']))
+
+        np.testing.assert_array_almost_equal(
+            processors.convert_to(mv, return_float=True)(values * V), values * 1000)
+        np.testing.assert_array_almost_equal(
+            processors.convert_to(mv, on_dimensionless='ignore')(values).magnitude, values)
+
 if __name__ == '__main__':
     unittest.main()
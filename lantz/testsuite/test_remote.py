@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+from lantz import Driver, Feat, DictFeat, Action, Q_
+from lantz.remote import DriverServer, AuthenticationError, connect
+
+
+class aDriver(Driver):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._volts = 1
+        self._gain = {1: 10, 2: 20}
+        self.writes = []
+
+    @Feat(units='V', limits=(10, ))
+    def volts(self):
+        return self._volts
+
+    @volts.setter
+    def volts(self, value):
+        self.writes.append(('volts', value))
+        self._volts = value
+
+    @DictFeat(keys=(1, 2))
+    def gain(self, key):
+        return self._gain[key]
+
+    @gain.setter
+    def gain(self, key, value):
+        self.writes.append(('gain', key, value))
+        self._gain[key] = value
+
+    @Feat()
+    def idn(self):
+        return 'aDriver'
+
+    @Action(units='s')
+    def wait(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    @Action()
+    def fail(self):
+        raise ValueError('failed')
+
+
+class MappedDriver(Driver):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._range = {0: 1, 1: 2}
+
+    @DictFeat(keys={'low': 0, 'high': 1})
+    def range(self, key):
+        return self._range[key]
+
+    @range.setter
+    def range(self, key, value):
+        self._range[key] = value
+
+
+def _wait_for(condition, timeout=2.):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(.01)
+
+
+class RemoteTest(unittest.TestCase):
+
+    def _check(self, address):
+        obj = aDriver(name='remote')
+        with DriverServer(obj, address) as server:
+            proxy = connect(server.address, authkey=server.authkey)
+            self.assertEqual(proxy.name, 'remote')
+            self.assertEqual(set(proxy._lantz_features), {'volts', 'gain', 'idn'})
+            self.assertIn('wait', proxy._lantz_actions)
+
+            self.assertEqual(proxy.volts, Q_(1, 'V'))
+            proxy.volts = Q_(2000, 'mV')
+            self.assertEqual(obj._volts, 2)
+            self.assertEqual(proxy.gain[2], 20)
+            proxy.gain[1] = 5
+            self.assertEqual(obj._gain[1], 5)
+            self.assertRaises(ValueError, setattr, proxy, 'volts', Q_(20, 'V'))
+            self.assertAlmostEqual(proxy.wait(Q_(10, 'ms')), .01)
+            self.assertRaises(ValueError, proxy.fail)
+
+            # Changes in the server are pushed to the proxy cache.
+            changed = []
+            proxy.volts_changed.connect(lambda new, old: changed.append(new))
+            obj.volts = Q_(3, 'V')
+            _wait_for(lambda: changed)
+            self.assertEqual(changed, [Q_(3, 'V')])
+            self.assertEqual(proxy.recall('volts'), Q_(3, 'V'))
+
+            # Batches and refresh are pipelined.
+            del obj.writes[:]
+            proxy.update(volts=Q_(4, 'V'), gain={2: 7})
+            self.assertEqual(obj.writes, [('volts', 4), ('gain', 2, 7)])
+            self.assertEqual(proxy.refresh(), {'volts': Q_(4, 'V'), 'gain': {1: 5, 2: 7},
+                                               'idn': 'aDriver'})
+
+            proxy.finalize()
+            self.assertRaises(ConnectionError, lambda: proxy.idn)
+
+    def test_mapped_keys(self):
+        obj = MappedDriver()
+        with DriverServer(obj) as server:
+            proxy = connect(server.address, authkey=server.authkey)
+            self.assertEqual(proxy.range['high'], 2)
+            proxy.range['low'] = 3
+            self.assertEqual(obj._range[0], 3)
+
+            # Events carry the key of the user, not the one of the instrument.
+            obj.range['high'] = 5
+            _wait_for(lambda: proxy.recall('range').get('high') == 5)
+            self.assertEqual(proxy.recall('range'), {'low': 3, 'high': 5})
+            proxy.finalize()
+
+    def test_authentication(self):
+        obj = aDriver()
+        with DriverServer(obj, authkey='secret') as server:
+            self.assertEqual(server.authkey, b'secret')
+            self.assertRaises(AuthenticationError, connect, server.address, authkey='wrong')
+            self.assertFalse(obj.writes)
+
+            with mock.patch.dict(os.environ):
+                os.environ.pop('LANTZ_AUTHKEY', None)
+                self.assertRaises(ValueError, connect, server.address)
+                os.environ['LANTZ_AUTHKEY'] = 'secret'
+                proxy = connect(server.address)
+            self.assertEqual(proxy.idn, 'aDriver')
+            proxy.finalize()
+
+    def test_tcp(self):
+        self._check(('localhost', 0))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires Unix domain sockets')
+    def test_unix(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self._check(os.path.join(tmp, 'lantz.sock'))
+
+
+if __name__ == '__main__':
+    unittest.main()
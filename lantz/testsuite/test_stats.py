@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import time
 import unittest
 
 import numpy as np
@@ -30,3 +31,69 @@ class StatsTest(unittest.TestCase):
                 self.assertAlmostEqual(s.std, np.std(values[:ndx]))
                 self.assertAlmostEqual(s.min, np.min(values[:ndx]))
                 self.assertAlmostEqual(s.max, np.max(values[:ndx]))
+
+    def test_stable_std(self):
+        x = RunningStats()
+        values = 1e9 + np.random.random(1000)
+        for value in values:
+            x.add('key', value)
+        self.assertAlmostEqual(x.stats('key').std, np.std(values), places=5)
+
+    def test_percentiles(self):
+        x = RunningStats()
+        values = np.random.RandomState(0).lognormal(-7, 1, 10000)
+        for value in values:
+            x.add('get_eggs', value)
+        p = x.percentiles('get_eggs')
+        for q, value in zip((50, 90, 99, 99.9), p):
+            expected = np.percentile(values, q)
+            self.assertLess(abs(value - expected) / expected, .05)
+        self.assertLessEqual(p.p999, values.max())
+        self.assertLess(len(x['get_eggs'].histogram.buckets), 500)
+
+        x.add('zero', 0)
+        self.assertEqual(x.percentiles('zero'), (0, 0, 0, 0))
+
+    def test_window(self):
+        x = RunningStats(window=.2)
+        for value in (10., 20.):
+            x.add('key', value)
+        time.sleep(.3)
+        for value in (1., 2., 3.):
+            x.add('key', value)
+        s = x.stats('key')
+        self.assertEqual(s.count, 3)
+        self.assertEqual(s.last, 3.)
+        self.assertAlmostEqual(s.mean, 2.)
+        self.assertAlmostEqual(s.std, np.std([1., 2., 3.]))
+        self.assertEqual((s.min, s.max), (1., 3.))
+        self.assertEqual(x.percentiles('key').p50, 2.)
+        time.sleep(.3)
+        self.assertEqual(x.stats('key').count, 0)
+
+    def test_ewma(self):
+        self.assertRaises(ValueError, RunningStats, window=1, alpha=.1)
+        x = RunningStats(alpha=.5)
+        for value in (1., 1., 1., 5.):
+            x.add('key', value)
+        s = x.stats('key')
+        self.assertEqual(s.count, 4)
+        self.assertAlmostEqual(s.mean, 3.)
+        self.assertAlmostEqual(s.std, 2.)
+
+        # Old values are forgotten.
+        for _ in range(100):
+            x.add('key', 5.)
+        self.assertAlmostEqual(x.stats('key').mean, 5.)
+        self.assertAlmostEqual(x.stats('key').std, 0.)
+
+    def test_snapshot_reset(self):
+        x = RunningStats()
+        x.add('get_eggs', 1.)
+        x.add('get_eggs', 3.)
+        snapshot = x.snapshot()
+        self.assertEqual(snapshot['get_eggs']['count'], 2)
+        self.assertEqual(snapshot['get_eggs']['mean'], 2.)
+        self.assertIn('p99', snapshot['get_eggs'])
+        self.assertEqual(x.reset(), snapshot)
+        self.assertEqual(x.snapshot(), {})
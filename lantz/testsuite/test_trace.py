@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import unittest
+
+from lantz import Driver, Feat, Action
+from lantz import trace
+from lantz.trace import Tracer
+
+
+class aDriver(Driver):
+
+    @Feat()
+    def eggs(self):
+        trace.add_bytes(4)
+        return 1
+
+    @eggs.setter
+    def eggs(self, value):
+        trace.add_bytes(2)
+
+    @Action()
+    def scan(self, value):
+        self.eggs = value
+        return self.eggs
+
+    @Action()
+    def fail(self):
+        raise ValueError('failed')
+
+
+class TraceTest(unittest.TestCase):
+
+    def test_disabled(self):
+        self.assertIsNone(trace.current())
+        obj = aDriver()
+        obj.scan(3)
+        with trace.span(obj, 'call', 'scan') as span:
+            self.assertIsNone(span)
+
+    def test_nested(self):
+        obj = aDriver(name='traced')
+        with Tracer() as tracer:
+            self.assertIs(trace.current(), tracer)
+            obj.scan(3)
+            self.assertRaises(ValueError, obj.fail)
+        self.assertIsNone(trace.current())
+
+        spans = {(span.kind, span.member): span for span in tracer.spans}
+        self.assertEqual(len(spans), 4)
+        scan, get, set_ = spans[('call', 'scan')], spans[('get', 'eggs')], spans[('set', 'eggs')]
+        self.assertEqual((scan.depth, get.depth, set_.depth), (0, 1, 1))
+        self.assertEqual((scan.bytes, get.bytes, set_.bytes), (6, 4, 2))
+        self.assertIn('3', scan.args)
+        self.assertEqual(scan.driver, 'traced')
+        self.assertTrue(scan.start <= set_.start <= get.start)
+        self.assertTrue(get.start + get.duration <= scan.start + scan.duration)
+        self.assertIn('failed', spans[('call', 'fail')].error)
+
+        fp = io.StringIO()
+        tracer.export(fp)
+        events = [event for event in json.loads(fp.getvalue())['traceEvents']
+                  if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in events],
+                         ['traced.scan', 'traced.eggs', 'traced.eggs', 'traced.fail'])
+        self.assertEqual(events[0]['args']['bytes'], 6)
+
+    def test_bounded(self):
+        obj = aDriver()
+        with Tracer(maxlen=5) as tracer:
+            for value in range(10):
+                obj.scan(value)
+        self.assertEqual(len(tracer.spans), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
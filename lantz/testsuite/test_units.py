@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+
+import lantz
+from lantz import Q_, ureg
+from lantz import units
+
+
+def _run(code, **env):
+    environ = dict(os.environ)
+    environ.update(env)
+    return subprocess.check_output([sys.executable, '-c', code], env=environ).decode('utf-8').split()
+
+
+class UnitsTest(unittest.TestCase):
+
+    def test_import(self):
+        # Importing lantz must not create the registry nor import slow modules
+        # that are only needed by some features.
+        # The Qt backend is not part of this measure.
+        modules = ('pint', 'pkg_resources', 'numpy', 'http.server')
+        code = ('import sys, time; tic = time.perf_counter(); import lantz; '
+                'print(time.perf_counter() - tic); '
+                'print(lantz.units.is_loaded(), *(m in sys.modules for m in {!r}))'.format(modules))
+        elapsed, *loaded = _run(code, LANTZ_HEADLESS='1')
+        self.assertEqual(loaded, ['False'] * (len(modules) + 1))
+        self.assertLess(float(elapsed), .5)
+
+    def test_lazy(self):
+        value = Q_(1, 'V')
+        self.assertTrue(units.is_loaded())
+        self.assertIsInstance(value, Q_)
+        self.assertIsInstance(value, units.get_registry().Quantity)
+        self.assertNotIsInstance(1, Q_)
+        self.assertIsInstance(value, (str, Q_))
+        self.assertEqual(value.to('mV').magnitude, 1000)
+        self.assertEqual(1 * ureg.volt, value)
+        self.assertEqual(ureg('2 V'), 2 * value)
+        self.assertRaises(RuntimeError, units.set_cache_folder, None)
+        self.assertIsInstance(lantz.__version__, str)
+
+        # Once created, Q_ is the Quantity class itself (fast instance checks).
+        self.assertIs(units.Q_, units.get_registry().Quantity)
+        self.assertIs(lantz.Q_, units.Q_)
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            code = 'from lantz import Q_; print(Q_(1, "V").to("mV").magnitude)'
+            self.assertEqual(_run(code, LANTZ_UNITS_CACHE=tmp), ['1000.0'])
+            self.assertTrue(os.listdir(tmp))
+            self.assertEqual(_run(code, LANTZ_UNITS_CACHE=tmp), ['1000.0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
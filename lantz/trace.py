@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.trace
+    ~~~~~~~~~~~
+
+    Implements an opt-in tracer that records nested spans for actions,
+    feat gets/sets and message based reads/writes.
+
+        >>> with Tracer() as tracer:
+        ...     inst.scan()
+        >>> tracer.export('scan.json')
+
+    The exported file can be opened with chrome://tracing or
+    https://ui.perfetto.dev
+
+    Tracing is disabled by default and costs a single function call per
+    span in that case.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import json
+import time
+import reprlib
+import threading
+from collections import deque
+
+_repr = reprlib.Repr()
+_repr.maxstring = 60
+_repr.maxother = 60
+
+#: Active tracer or None.
+_TRACER = None
+
+
+class Span(object):
+    """A timed call to a driver member.
+
+    :param driver: name of the driver.
+    :param kind: 'call', 'get', 'set', 'write', 'read'.
+    :param member: name of the member.
+    :param args: summary of the arguments.
+    """
+
+    __slots__ = ('driver', 'kind', 'member', 'args', 'thread', 'depth',
+                 'start', 'duration', 'bytes', 'error')
+
+    def __init__(self, driver, kind, member, args, thread, depth):
+        self.driver = driver
+        self.kind = kind
+        self.member = member
+        self.args = args
+        self.thread = thread
+        self.depth = depth
+        self.start = 0.
+        self.duration = 0.
+        #: bytes moved by this span and its children.
+        self.bytes = 0
+        self.error = None
+
+    def __repr__(self):
+        return '<Span {}.{} ({}) {:.6f} s>'.format(self.driver, self.member, self.kind, self.duration)
+
+
+class _SpanContext(object):
+
+    __slots__ = ('tracer', 'span', 'stack')
+
+    def __init__(self, tracer, span, stack):
+        self.tracer = tracer
+        self.span = span
+        self.stack = stack
+
+    def __enter__(self):
+        self.stack.append(self.span)
+        self.span.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        span = self.span
+        span.duration = time.perf_counter() - span.start
+        if exc_value is not None:
+            span.error = repr(exc_value)
+        self.stack.pop()
+        if self.stack:
+            self.stack[-1].bytes += span.bytes
+        self.tracer.spans.append(span)
+
+
+class _NullContext(object):
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        pass
+
+_NULL = _NullContext()
+
+
+class Tracer(object):
+    """Record nested spans per thread in a bounded buffer.
+
+    :param maxlen: maximum number of spans kept. Oldest are discarded first.
+    """
+
+    def __init__(self, maxlen=100000):
+        self.spans = deque(maxlen=maxlen)
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+        self._threads = {}
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            thread = threading.current_thread()
+            self._threads[thread.ident] = thread.name
+            stack = self._local.stack = []
+            return stack
+
+    def span(self, driver, kind, member, args=None):
+        """Return a context manager that records a span.
+        """
+        stack = self._stack()
+        name = getattr(driver, 'name', driver)
+        summary = None if args is None else _repr.repr(args)
+        span = Span(name, kind, member, summary, threading.get_ident(), len(stack))
+        return _SpanContext(self, span, stack)
+
+    def add_bytes(self, count):
+        """Add the number of bytes to the current span of this thread.
+        """
+        stack = self._stack()
+        if stack:
+            stack[-1].bytes += count
+
+    def clear(self):
+        self.spans.clear()
+
+    def events(self):
+        """Return the spans as Chrome trace events.
+        """
+        pid = os.getpid()
+        out = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                'args': {'name': name}}
+               for tid, name in list(self._threads.items())]
+        for span in sorted(list(self.spans), key=lambda span: span.start):
+            args = {'driver': span.driver, 'member': span.member, 'bytes': span.bytes}
+            if span.args is not None:
+                args['args'] = span.args
+            if span.error is not None:
+                args['error'] = span.error
+            out.append({'name': '{}.{}'.format(span.driver, span.member),
+                        'cat': span.kind,
+                        'ph': 'X',
+                        'pid': pid,
+                        'tid': span.thread,
+                        'ts': (span.start - self.origin) * 1e6,
+                        'dur': span.duration * 1e6,
+                        'args': args})
+        return out
+
+    def export(self, file=None):
+        """Export the spans in Chrome/Perfetto trace format.
+
+        :param file: filename or file object. If None, the trace is returned as dict.
+        """
+        trace = {'traceEvents': self.events(), 'displayTimeUnit': 'ms'}
+        if file is None:
+            return trace
+        if isinstance(file, str):
+            with open(file, 'w', encoding='utf-8') as fp:
+                json.dump(trace, fp)
+        else:
+            json.dump(trace, file)
+
+    def __enter__(self):
+        enable(self)
+        return self
+
+    def __exit__(self, *args):
+        disable()
+
+
+def enable(tracer=None):
+    """Start tracing all drivers.
+
+    :param tracer: Tracer to use. If None, a new one is created.
+    :return: the active tracer.
+    """
+    global _TRACER
+    _TRACER = Tracer() if tracer is None else tracer
+    return _TRACER
+
+
+def disable():
+    """Stop tracing.
+
+    :return: the tracer that was active (or None).
+    """
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+    return tracer
+
+
+def current():
+    """Return the active tracer (or None).
+    """
+    return _TRACER
+
+
+def span(driver, kind, member, args=None):
+    """Return a context manager that records a span in the active tracer
+    (or does nothing if tracing is disabled).
+    """
+    tracer = _TRACER
+    if tracer is None:
+        return _NULL
+    return tracer.span(driver, kind, member, args)
+
+
+def add_bytes(count):
+    """Add the number of bytes to the current span (if tracing).
+    """
+    tracer = _TRACER
+    if tracer is not None:
+        tracer.add_bytes(count)
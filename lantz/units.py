@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.units
+    ~~~~~~~~~~~
+
+    Implements the lazily created unit registry used by Lantz.
+
+    Importing pint and parsing the unit definitions is slow, so the
+    registry is only created when first used (e.g. `Q_(1, 'V')` or
+    `ureg.volt`). `ureg` and `Q_` behave like the registry and its
+    Quantity class (including `isinstance(value, Q_)`). Once the registry
+    is created, `lantz.Q_` and `lantz.units.Q_` are replaced by the
+    Quantity class itself, so code in the hot paths looks up
+    `lantz.units.Q_` instead of keeping a reference to the lazy one.
+
+    The parsed definitions can be cached on disk (requires pint >= 0.18)
+    by setting the LANTZ_UNITS_CACHE environment variable to a folder
+    (or to ':auto:' to use the pint default cache folder) or by calling
+    `set_cache_folder` before the registry is used.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import sys
+import threading
+
+_REGISTRY = None
+_LOCK = threading.Lock()
+
+#: Folder to cache the parsed unit definitions or None.
+_CACHE_FOLDER = os.environ.get('LANTZ_UNITS_CACHE') or None
+
+
+def set_cache_folder(folder):
+    """Set the folder in which the parsed unit definitions are cached.
+
+    :param folder: a path, ':auto:' for pint default or None to disable the cache.
+    :raises RuntimeError: if the registry was already created.
+    """
+    global _CACHE_FOLDER
+    if _REGISTRY is not None:
+        raise RuntimeError('The unit registry was already created.')
+    _CACHE_FOLDER = folder
+
+
+def get_registry():
+    """Return the unit registry, creating it if necessary.
+    """
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _LOCK:
+            if _REGISTRY is None:
+                from pint import UnitRegistry
+                if _CACHE_FOLDER:
+                    try:
+                        registry = UnitRegistry(cache_folder=_CACHE_FOLDER)
+                    except TypeError:
+                        # pint without cache support.
+                        registry = UnitRegistry()
+                else:
+                    registry = UnitRegistry()
+                _REGISTRY = registry
+                _bind_quantity(registry.Quantity)
+    return _REGISTRY
+
+
+def _bind_quantity(quantity):
+    """Replace the lazy Q_ by the Quantity class of the registry,
+    as instance checks through the metaclass are much slower.
+    """
+    global Q_, Quantity
+    Q_ = Quantity = quantity
+    package = sys.modules.get('lantz')
+    if package is not None and package.__dict__.get('Q_') is _LazyQuantity:
+        package.Q_ = quantity
+
+
+def is_loaded():
+    """Return True if the registry was already created.
+    """
+    return _REGISTRY is not None
+
+
+class _LazyRegistry(object):
+    """Proxy to the unit registry that creates it on first use.
+    """
+
+    def __getattr__(self, item):
+        return getattr(get_registry(), item)
+
+    def __getitem__(self, item):
+        return get_registry()[item]
+
+    def __call__(self, *args, **kwargs):
+        return get_registry()(*args, **kwargs)
+
+    def __dir__(self):
+        return dir(get_registry())
+
+    def __repr__(self):
+        return '<lazy {!r}>'.format(get_registry()) if is_loaded() else '<lazy UnitRegistry>'
+
+
+class _QuantityType(type):
+    """Metaclass for Q_ that forwards calls, attributes and instance checks
+    to the Quantity class of the registry.
+    """
+
+    def __call__(cls, *args, **kwargs):
+        return get_registry().Quantity(*args, **kwargs)
+
+    def __instancecheck__(cls, instance):
+        # No quantity can exist before the registry.
+        registry = _REGISTRY
+        return registry is not None and isinstance(instance, registry.Quantity)
+
+    def __subclasscheck__(cls, subclass):
+        registry = _REGISTRY
+        return registry is not None and issubclass(subclass, registry.Quantity)
+
+    def __getattr__(cls, item):
+        return getattr(get_registry().Quantity, item)
+
+
+class _LazyQuantity(metaclass=_QuantityType):
+    """Quantity class of the unit registry (created on first use).
+    """
+
+
+ureg = _LazyRegistry()
+Q_ = Quantity = _LazyQuantity
+
+
+def __getattr__(name):
+    # pint exceptions (e.g. DimensionalityError) are imported on first use.
+    if name in ('DimensionalityError', 'UndefinedUnitError'):
+        import pint
+        return getattr(pint, name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.utils.headless
+    ~~~~~~~~~~~~~~~~~~~~
+
+    A pure Python replacement of the Qt objects used by the driver core
+    (QObject and Signal) for applications that do not use Qt.
+
+    The backend is selected when lantz.driver is imported (see `use_headless`).
+    The headless backend is used if the LANTZ_HEADLESS environment variable
+    is set to 1 or if no Qt binding is installed. Signals are emitted
+    synchronously in the calling thread.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import sys
+import threading
+import importlib.util
+
+from lantz.log import LOGGER
+
+#: Modules that indicate that a Qt binding was requested if imported.
+_QT_MODULES = ('lantz.utils.qt', 'PySide.QtCore', 'PyQt4.QtCore')
+
+#: Qt bindings supported by lantz.utils.qt
+_QT_BINDINGS = ('PySide', 'PyQt4')
+
+
+def qt_requested():
+    """Return True if a Qt binding was requested, either with the QT_API
+    environment variable or by importing it (or lantz.utils.qt) before
+    the driver core.
+    """
+    if os.environ.get('QT_API'):
+        return True
+    return any(name in sys.modules for name in _QT_MODULES)
+
+
+def qt_available():
+    """Return True if a Qt binding is installed (without importing it).
+    """
+    for name in _QT_BINDINGS:
+        try:
+            if importlib.util.find_spec(name) is not None:
+                return True
+        except (ImportError, ValueError):
+            pass
+    return False
+
+
+def use_headless():
+    """Return True if drivers should use the headless backend.
+
+    The LANTZ_HEADLESS environment variable selects the backend explicitly
+    (1 for headless, 0 for Qt). Otherwise Qt is used if it is requested
+    (see `qt_requested`) or installed.
+    """
+    value = os.environ.get('LANTZ_HEADLESS', '').strip().lower()
+    if value:
+        return value not in ('0', 'false', 'no')
+    return not (qt_requested() or qt_available())
+
+
+class BoundSignal(object):
+    """Signal bound to an instance.
+    """
+
+    __slots__ = ('_slots', '_lock', '__weakref__')
+
+    def __init__(self):
+        self._slots = ()
+        self._lock = threading.Lock()
+
+    def connect(self, slot):
+        """Connect a callable to this signal.
+        """
+        with self._lock:
+            self._slots = self._slots + (slot, )
+
+    def disconnect(self, slot=None):
+        """Disconnect a callable (or all of them if None) from this signal.
+
+        :raises RuntimeError: if the slot is not connected.
+        """
+        with self._lock:
+            if slot is None:
+                self._slots = ()
+                return
+            slots = list(self._slots)
+            try:
+                slots.remove(slot)
+            except ValueError:
+                raise RuntimeError('Failed to disconnect signal {!r}'.format(slot))
+            self._slots = tuple(slots)
+
+    def receivers(self):
+        """Return the number of connected callables.
+        """
+        return len(self._slots)
+
+    def emit(self, *args):
+        """Call all connected slots with the given arguments.
+
+        As in Qt, an exception raised in a slot is logged and does not
+        prevent other slots from being called.
+        """
+        for slot in self._slots:
+            try:
+                slot(*args)
+            except Exception as e:
+                LOGGER.exception('While calling slot {!r}: {}', slot, e)
+
+
+class Signal(object):
+    """Pure Python equivalent of QtCore.Signal.
+
+    The bound signal is created on first access and stored in the instance
+    dictionary so that later accesses are plain attribute lookups.
+
+    :param types: types of the arguments (ignored, for compatibility).
+    """
+
+    def __init__(self, *types):
+        self.types = types
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        bound = instance.__dict__[self.name] = BoundSignal()
+        return bound
+
+
+class SuperQObject(object):
+    """Headless equivalent of lantz.utils.qt.SuperQObject.
+    """
+
+    def __init__(self, *args, **kw):
+        # As in the Qt version, arguments are not given to object.__init__
+        mro = self.__class__.mro()
+        init = mro[mro.index(SuperQObject) + 1].__init__
+        if init is object.__init__:
+            init(self)
+        else:
+            init(self, *args, **kw)
+
+
+MetaQObject = type
@@ -18,6 +18,8 @@
 """
 
 import os
+import sys
+import warnings
 
 from lantz.utils.qt_loaders import (load_qt, QT_API_PYSIDE, QT_API_PYQT, QT_MOCK)
 
@@ -32,6 +34,11 @@ else:
 
 QtCore, QtGui, QtSvg, QT_API = load_qt(api_opts)
 
+if getattr(sys.modules.get('lantz.driver'), 'HEADLESS', False):
+    warnings.warn('Drivers use the headless backend (LANTZ_HEADLESS is set): they are '
+                  'not QObjects and their signals are emitted in the calling thread. '
+                  'Unset LANTZ_HEADLESS to use Qt drivers.')
+
 
 class SuperQObject(QtCore.QObject):
     """ Permits the use of super() in class hierarchies that contain QObject.